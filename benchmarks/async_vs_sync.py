@@ -0,0 +1,78 @@
+# Compares requests/sec of the Flask and the async (Quart) controllers.
+#
+# Start both servers against the same database first, e.g. from src/:
+#   python api_controller.py
+#   hypercorn "async_api_controller:create_async_app()" --bind 127.0.0.1:5002
+# then run:
+#   python benchmarks/async_vs_sync.py --duration 10
+
+import argparse
+import json
+import threading
+import time
+
+import requests
+
+CONCURRENCY_LEVELS = [1, 16, 128]
+
+SEED_PATIENT = {
+    "name": "Benchmark Patient",
+    "age": 42,
+    "gender": "Female",
+    "ward": 1,
+    "room": 11,
+    "doctor_name": "Alice",
+}
+
+
+def seed(base_url: str, count: int) -> list:
+    """Creates benchmark patients through the bulk endpoint and returns their ids."""
+    response = requests.post(f"{base_url}/patients/bulk", json=[SEED_PATIENT] * count)
+    response.raise_for_status()
+    return [item["id"] for item in response.json()["results"] if item["status"] == "created"]
+
+
+def run_level(base_url: str, paths: list, concurrency: int, duration: float) -> float:
+    """Drives the given paths with N concurrent clients and returns requests/sec."""
+    deadline = time.perf_counter() + duration
+    counts = [0] * concurrency
+
+    def client(slot: int) -> None:
+        session = requests.Session()
+        i = slot
+        while time.perf_counter() < deadline:
+            session.get(base_url + paths[i % len(paths)])
+            counts[slot] += 1
+            i += 1
+
+    threads = [threading.Thread(target=client, args=(slot,)) for slot in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sum(counts) / (time.perf_counter() - started)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Flask vs async controller throughput.")
+    parser.add_argument("--flask-url", default="http://127.0.0.1:5001")
+    parser.add_argument("--async-url", default="http://127.0.0.1:5002")
+    parser.add_argument("--patients", type=int, default=200)
+    parser.add_argument("--duration", type=float, default=5.0)
+    args = parser.parse_args()
+
+    ids = seed(args.flask_url, args.patients)
+    paths = [f"/patients/{patient_id}" for patient_id in ids] + ["/patients?limit=50"]
+
+    results = {}
+    for name, base_url in (("flask", args.flask_url), ("async", args.async_url)):
+        results[name] = {
+            concurrency: round(run_level(base_url, paths, concurrency, args.duration), 1)
+            for concurrency in CONCURRENCY_LEVELS
+        }
+    print(json.dumps({"requests_per_second": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+# Measures an export/import round trip of the whole patient table, and the
+# peak memory of each side. Run from the repository root:
+#   python benchmarks/export_import.py --rows 200000
+#   python benchmarks/export_import.py --rows 10000000 --format csv --gzip
+#
+# Three child processes run one after the other, each measured on its own
+# (os.wait4): load_test.py seeds a temporary database, an export phase
+# streams GET /patients/export to a file through the Flask test client, and
+# import_patients.py loads that file into a second, empty database with
+# --keep-ids. Peak RSS grows with --rows only until SQLite's page cache and
+# memory map reach their caps (PATIENT_DB_CACHE_SIZE, PATIENT_DB_MMAP_SIZE);
+# the rows themselves are held one chunk at a time.
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+SRC_DIR = os.path.join(BENCHMARKS_DIR, "..", "src")
+
+
+def run_phase(name: str, command: List[str], db_path: str) -> Dict[str, float]:
+    """Runs one phase in a child process and returns its duration and peak RSS."""
+    env = dict(os.environ, PATIENT_DB_URL=f"sqlite:///{db_path}")
+    started = time.perf_counter()
+    process = subprocess.Popen(command, env=env, cwd=SRC_DIR, stdout=subprocess.DEVNULL)
+    _, status, usage = os.wait4(process.pid, 0)
+    elapsed = time.perf_counter() - started
+    if os.waitstatus_to_exitcode(status) != 0:
+        raise SystemExit(f"{name} failed")
+    # ru_maxrss is in kilobytes on Linux.
+    return {"seconds": round(elapsed, 2), "peak_rss_mb": round(usage.ru_maxrss / 1024, 1)}
+
+
+def export(args: argparse.Namespace) -> None:
+    """The export phase: streams the export of the database to args.output."""
+    sys.path.insert(0, SRC_DIR)
+    from api_controller import create_app
+
+    client = create_app({"PATIENT_CACHE_ENABLED": False}).test_client()
+    headers = {"Accept-Encoding": "gzip"} if args.gzip else {}
+    response = client.get(f"/patients/export?format={args.format}", headers=headers, buffered=False)
+    if response.status_code != 200:
+        raise SystemExit(f"export failed: {response.status_code}")
+    with open(args.output, "wb") as output:
+        for chunk in response.response:
+            output.write(chunk)
+    response.close()
+
+
+def count_rows(path: str, export_format: str) -> int:
+    """Counts the patients of an export file."""
+    sys.path.insert(0, SRC_DIR)
+    from patient_export import read_export
+
+    return sum(1 for _ in read_export(path, export_format))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark an export/import round trip.")
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--format", choices=["csv", "ndjson"], default="csv")
+    parser.add_argument("--gzip", action="store_true")
+    parser.add_argument("--seed", type=int, default=1)
+    # Internal: the export phase, run in its own process.
+    parser.add_argument("--export-to", dest="output", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.output:
+        export(args)
+        return
+
+    workdir = tempfile.mkdtemp(prefix="export_import_")
+    try:
+        source_db = os.path.join(workdir, "source.db")
+        target_db = os.path.join(workdir, "target.db")
+        export_file = os.path.join(workdir, f"patients.{args.format}" + (".gz" if args.gzip else ""))
+        python = sys.executable
+        seed_command = [
+            python, os.path.join(BENCHMARKS_DIR, "load_test.py"), "seed",
+            "--count", str(args.rows), "--seed", str(args.seed), "--db-url", f"sqlite:///{source_db}",
+        ]
+        export_command = [python, os.path.abspath(__file__), "--format", args.format, "--export-to", export_file]
+        if args.gzip:
+            export_command.append("--gzip")
+        import_command = [python, "import_patients.py", export_file, "--format", args.format, "--keep-ids"]
+
+        results = {"rows": args.rows, "format": args.format, "gzip": args.gzip}
+        results["seed"] = run_phase("seed", seed_command, source_db)
+        results["export"] = run_phase("export", export_command, source_db)
+        results["export"]["file_mb"] = round(os.path.getsize(export_file) / (1 << 20), 1)
+        results["import"] = run_phase("import", import_command, target_db)
+        exported = count_rows(export_file, args.format)
+        if exported != args.rows:
+            raise SystemExit(f"exported {exported} rows, expected {args.rows}")
+        results["export"]["rows_per_second"] = round(args.rows / results["export"]["seconds"])
+        results["import"]["rows_per_second"] = round(args.rows / results["import"]["seconds"])
+        print(json.dumps(results, indent=2))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
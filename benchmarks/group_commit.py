@@ -0,0 +1,130 @@
+# Measures the inserts/sec of PatientDB.insert_patient from concurrent
+# threads, with each insert committed on its own and with the group-commit
+# queue (PATIENT_GROUP_COMMIT). Run from the repository root:
+#   python benchmarks/group_commit.py --threads 32 --inserts 200
+#   python benchmarks/group_commit.py --synchronous FULL
+#
+# Each mode writes to its own temporary SQLite file (WAL mode). With
+# synchronous=FULL every commit syncs the WAL to disk, which is the cost
+# group commit amortizes most; NORMAL is the storage profile default.
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from typing import Any, Dict, List
+
+SRC_DIR = os.path.join(os.path.dirname(__file__), "..", "src")
+sys.path.insert(0, SRC_DIR)
+
+
+def new_patient(index: int) -> Dict[str, Any]:
+    return {
+        "id": str(uuid.uuid4()),
+        "name": f"Group Commit {index}",
+        "age": 40,
+        "gender": "Female",
+        "checkin": "2026-01-01T00:00:00Z",
+        "checkout": None,
+        "ward": 1,
+        "room": 11,
+        "doctor_name": "Alice",
+        "version": 1,
+    }
+
+
+def percentile(values: List[float], share: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(share * len(ordered)))]
+
+
+def run(patient_db: Any, threads: int, inserts: int) -> Dict[str, Any]:
+    """Inserts threads * inserts patients from concurrent threads."""
+    latencies: List[float] = []
+    failed = 0
+    lock = threading.Lock()
+    start = threading.Barrier(threads + 1)
+
+    def worker() -> None:
+        nonlocal failed
+        own, own_failed = [], 0
+        start.wait()
+        for index in range(inserts):
+            started = time.perf_counter()
+            if patient_db.insert_patient(new_patient(index)) is None:
+                own_failed += 1
+            own.append(time.perf_counter() - started)
+        with lock:
+            latencies.extend(own)
+            failed += own_failed
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    for thread in workers:
+        thread.start()
+    start.wait()
+    started = time.perf_counter()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    return {
+        "inserts_per_second": round(len(latencies) / elapsed),
+        "failed": failed,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark group commit.")
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--inserts", type=int, default=200, help="inserts per thread")
+    parser.add_argument("--synchronous", default="NORMAL", help="SQLite synchronous pragma")
+    args = parser.parse_args()
+
+    # The storage profile is read from the environment at import.
+    os.environ["PATIENT_DB_SYNCHRONOUS"] = args.synchronous
+    from config import GROUP_COMMIT_MAX_BATCH, GROUP_COMMIT_WINDOW_SECONDS
+    from metrics import GROUP_COMMIT_BATCH_SIZE
+    from patient_db import PatientDB
+    from patient_db_config import Storage
+    from write_queue import GroupCommitQueue
+
+    workdir = tempfile.mkdtemp(prefix="group_commit_")
+    results: Dict[str, Any] = {
+        "threads": args.threads,
+        "inserts": args.threads * args.inserts,
+        "synchronous": args.synchronous,
+    }
+    try:
+        for mode in ("per_request", "group_commit"):
+            storage = Storage(f"sqlite:///{os.path.join(workdir, mode)}.db")
+            write_queue = None
+            if mode == "group_commit":
+                write_queue = GroupCommitQueue(
+                    lambda: storage.engine.begin(), GROUP_COMMIT_MAX_BATCH, GROUP_COMMIT_WINDOW_SECONDS
+                )
+            patient_db = PatientDB(storage=storage, write_queue=write_queue)
+            patient_db.table_version()  # connects and creates the schema
+            results[mode] = run(patient_db, args.threads, args.inserts)
+            storage.dispose()
+        batches = {name: value for name, _, value in GROUP_COMMIT_BATCH_SIZE.samples()}
+        results["group_commit"]["mean_batch"] = round(
+            batches["patient_db_group_commit_batch_size_sum"]
+            / batches["patient_db_group_commit_batch_size_count"],
+            1,
+        )
+        results["speedup"] = round(
+            results["group_commit"]["inserts_per_second"] / results["per_request"]["inserts_per_second"], 2
+        )
+        print(json.dumps(results, indent=2))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
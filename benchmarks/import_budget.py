@@ -0,0 +1,87 @@
+# Checks that importing the modules stays fast and free of side effects.
+#
+# Each module is imported in a fresh interpreter, from an empty working
+# directory, and its import time (best of --runs) is compared to its budget.
+# The check also fails if an import creates a database file or pulls in a
+# module it must not depend on (e.g. requests on the server side).
+#
+# Run from the repository root:
+#   python benchmarks/import_budget.py
+# Exits non-zero when a budget is exceeded.
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from typing import Dict, List, Tuple
+
+SRC_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src"))
+
+# (module, budget in milliseconds, modules it must not import)
+BUDGETS: List[Tuple[str, float, Tuple[str, ...]]] = [
+    ("patient", 25, ("requests", "sqlalchemy", "flask")),
+    ("patient_client", 200, ("sqlalchemy", "flask")),
+    ("patient_db", 400, ("requests", "flask")),
+    ("api_controller", 600, ("requests",)),
+    ("async_api_controller", 800, ("requests",)),
+]
+
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - started
+print(json.dumps({{"ms": elapsed * 1000, "modules": sorted(sys.modules)}}))
+"""
+
+
+def measure(module: str, runs: int) -> Dict[str, object]:
+    """
+    Imports a module in fresh interpreters.
+    Returns:
+        The best import time in ms, the imported modules and the files the
+        imports left in the working directory.
+    """
+    best = None
+    with tempfile.TemporaryDirectory() as workdir:
+        env = dict(os.environ, PYTHONPATH=SRC_DIR, PATIENT_DB_FILE=os.path.join(workdir, "patient.db"))
+        env.pop("PATIENT_DB_URL", None)
+        for _ in range(runs):
+            output = subprocess.run(
+                [sys.executable, "-c", PROBE.format(module=module)],
+                cwd=workdir, env=env, capture_output=True, text=True, check=True,
+            ).stdout
+            result = json.loads(output.splitlines()[-1])
+            if best is None or result["ms"] < best["ms"]:
+                best = result
+        best["files"] = sorted(os.listdir(workdir))
+    return best
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Import-time budget check.")
+    parser.add_argument("--runs", type=int, default=5, help="imports per module; the best is kept")
+    parser.add_argument("--scale", type=float, default=1.0, help="multiplies every budget (slow machines)")
+    args = parser.parse_args()
+
+    failures = 0
+    for module, budget, forbidden in BUDGETS:
+        result = measure(module, args.runs)
+        problems = []
+        if result["ms"] > budget * args.scale:
+            problems.append(f"over budget ({budget * args.scale:.0f} ms)")
+        leaked = [name for name in forbidden if name in result["modules"]]
+        if leaked:
+            problems.append(f"imports {', '.join(leaked)}")
+        if result["files"]:
+            problems.append(f"created {', '.join(result['files'])}")
+        failures += bool(problems)
+        status = "FAIL " + "; ".join(problems) if problems else "ok"
+        print(f"{module:>22}: {result['ms']:7.1f} ms  {status}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
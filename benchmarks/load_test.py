@@ -0,0 +1,364 @@
+# Reproducible load test of every Patient API endpoint.
+#
+# 1. Seed a database with synthetic patients (deterministic for a given --seed),
+#    before starting the server so its occupancy index sees them:
+#      python benchmarks/load_test.py seed --count 10000 --db-url sqlite:///src/patient.db
+# 2. Start the server against that database, then drive it:
+#      python benchmarks/load_test.py run --url http://127.0.0.1:5001 \
+#          --concurrency 16 --duration 30 --write-ratio 0.2 --output results.json
+# 3. Keep a run as the baseline, and fail later runs that regress:
+#      python benchmarks/load_test.py run ... --save-baseline benchmarks/baseline.json
+#      python benchmarks/load_test.py run ... --baseline benchmarks/baseline.json
+#
+# Every route of patient_routes.ROUTES (the table PatientAPIController.setup_routes
+# registers) has a scenario below; the run refuses to start if one is missing.
+# Results are JSON: throughput and p50/p95/p99 latency per endpoint.
+
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import requests
+
+SRC_DIR = os.path.join(os.path.dirname(__file__), "..", "src")
+sys.path.insert(0, SRC_DIR)
+
+from config import DOCTORS, GENDERS, WARD_NUMBERS, ROOM_NUMBERS, TIMESTAMP_FORMAT  # noqa: E402
+from patient_routes import ROUTES  # noqa: E402
+
+FIRST_NAMES = ["John", "Jane", "Mario", "Giulia", "Ahmed", "Mei", "Olga", "Carlos", "Aisha", "Liam"]
+LAST_NAMES = ["Smith", "Rossi", "Khan", "Chen", "Ivanova", "Garcia", "Okafor", "Murphy", "Bianchi", "Sato"]
+SEED_CHUNK_SIZE = 10000
+BULK_REQUEST_SIZE = 50
+BATCH_REQUEST_SIZE = 20
+PERCENTILES = (50, 95, 99)
+
+
+def synthetic_patient(rng: random.Random, now: datetime) -> Dict[str, Any]:
+    """Builds a random but valid patient record."""
+    ward = rng.choice(WARD_NUMBERS)
+    checkin = now - timedelta(seconds=rng.randrange(365 * 24 * 3600))
+    checkout = None
+    if rng.random() < 0.3:
+        checkout = (checkin + timedelta(seconds=rng.randrange(30 * 24 * 3600))).strftime(TIMESTAMP_FORMAT)
+    return {
+        "id": str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+        "name": f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+        "age": rng.randint(1, 99),
+        "gender": rng.choice(GENDERS),
+        "checkin": checkin.strftime(TIMESTAMP_FORMAT),
+        "checkout": checkout,
+        "ward": ward,
+        "room": int(rng.choice(ROOM_NUMBERS[ward])),
+        "doctor_name": rng.choice(DOCTORS),
+    }
+
+
+def new_patient_payload(rng: random.Random) -> Dict[str, Any]:
+    """Builds a random POST /patients payload."""
+    ward = rng.choice(WARD_NUMBERS)
+    return {
+        "name": f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+        "age": rng.randint(1, 99),
+        "gender": rng.choice(GENDERS),
+        "ward": ward,
+        "room": int(rng.choice(ROOM_NUMBERS[ward])),
+        "doctor_name": rng.choice(DOCTORS),
+    }
+
+
+def seed(args: argparse.Namespace) -> None:
+    """Inserts --count synthetic patients straight into the database."""
+    if args.db_url:
+        os.environ["PATIENT_DB_URL"] = args.db_url
+    from patient_db import PatientDB
+
+    patient_db = PatientDB()
+    rng = random.Random(args.seed)
+    now = datetime.now(timezone.utc)
+    started = time.perf_counter()
+    for start in range(0, args.count, SEED_CHUNK_SIZE):
+        size = min(SEED_CHUNK_SIZE, args.count - start)
+        patient_db.insert_patients([synthetic_patient(rng, now) for _ in range(size)])
+        print(f"seeded {start + size}/{args.count}", file=sys.stderr)
+    elapsed = time.perf_counter() - started
+    print(json.dumps({"seeded": args.count, "seconds": round(elapsed, 2)}))
+
+
+class Workload:
+    """
+    Builds the requests of each route. Reads pick patients from a sample of
+    the seeded ids; writes create the patients they update and delete, so a
+    run never deletes seeded data.
+    """
+
+    def __init__(self, ids: List[str], rng: random.Random) -> None:
+        self.ids = ids
+        self.rng = rng
+        self.created: List[str] = []
+        self.lock = threading.Lock()
+
+    def any_id(self) -> str:
+        with self.lock:
+            pool = self.created if self.created and self.rng.random() < 0.5 else self.ids
+            return self.rng.choice(pool)
+
+    def some_ids(self, count: int) -> List[str]:
+        with self.lock:
+            return self.rng.sample(self.ids, min(count, len(self.ids)))
+
+    def created_id(self) -> Optional[str]:
+        with self.lock:
+            if not self.created:
+                return None
+            return self.created.pop(self.rng.randrange(len(self.created)))
+
+    def remember(self, response: requests.Response) -> None:
+        if response.status_code == 201:
+            body = response.json()
+            with self.lock:
+                if "results" in body:
+                    self.created.extend(item["id"] for item in body["results"] if "id" in item)
+                else:
+                    self.created.append(body["id"])
+
+    def payload(self) -> Dict[str, Any]:
+        with self.lock:
+            return new_patient_payload(self.rng)
+
+    def pick(self, options: List[Any]) -> Any:
+        with self.lock:
+            return self.rng.choice(options)
+
+
+# A scenario returns (method, path, requests kwargs), or None to skip a turn.
+Scenario = Callable[[Workload], Optional[Tuple[str, str, Dict[str, Any]]]]
+
+
+def _delete(workload: Workload):
+    patient_id = workload.created_id()
+    return None if patient_id is None else ("DELETE", f"/patients/{patient_id}", {})
+
+
+SCENARIOS: Dict[str, Scenario] = {
+    "index": lambda w: ("GET", "/", {}),
+    "get_patients": lambda w: ("GET", "/patients", {"params": {"limit": 100, "ward": w.pick(WARD_NUMBERS)}}),
+    "get_patient": lambda w: ("GET", f"/patients/{w.any_id()}", {}),
+    "create_patient": lambda w: ("POST", "/patients", {"json": w.payload()}),
+    "create_patients_bulk": lambda w: (
+        "POST", "/patients/bulk", {"json": [w.payload() for _ in range(BULK_REQUEST_SIZE)]}
+    ),
+    "update_patients_batch": lambda w: (
+        "PATCH", "/patients/batch",
+        {"json": [{"id": patient_id, "age": w.pick(range(1, 100))} for patient_id in w.some_ids(BATCH_REQUEST_SIZE)]},
+    ),
+    "checkout_patients_batch": lambda w: (
+        "POST", "/patients/batch/checkout", {"json": {"ids": w.some_ids(BATCH_REQUEST_SIZE)}}
+    ),
+    "update_patient": lambda w: ("PUT", f"/patients/{w.any_id()}", {"json": {"age": w.pick(range(1, 100))}}),
+    "delete_patient": _delete,
+    "search_patients_by_name": lambda w: (
+        "GET", "/patients/search", {"params": {"search_name": w.pick(LAST_NAMES), "limit": 20}}
+    ),
+    "get_patient_changes": lambda w: ("GET", "/patients/changes", {"params": {"limit": 100}}),
+    "export_patients": lambda w: (
+        "GET", "/patients/export", {"params": {"format": "csv", "ward": w.pick(WARD_NUMBERS), "active": "true"}}
+    ),
+    "set_patient_room": lambda w: (
+        "PUT", f"/patients/{w.any_id()}/room", {"json": {"ward": 1, "room": w.pick(ROOM_NUMBERS[1])}}
+    ),
+    "checkout_patient_api": lambda w: ("PUT", f"/patients/{w.any_id()}/checkout", {}),
+    "get_doctors": lambda w: ("GET", "/doctors", {}),
+    "get_doctor_stats": lambda w: ("GET", "/doctors/stats", {}),
+    "assign_doctor": lambda w: ("PUT", f"/patients/{w.any_id()}/doctor", {"json": {"doctor_name": w.pick(DOCTORS)}}),
+    "get_wards": lambda w: ("GET", "/wards", {}),
+    "get_ward_stats": lambda w: ("GET", "/wards/stats", {}),
+    "get_ward_rooms": lambda w: ("GET", f"/wards/{w.pick(WARD_NUMBERS)}/rooms", {}),
+    "transfer_ward": lambda w: (
+        "POST", f"/wards/{w.pick(WARD_NUMBERS)}/transfer",
+        {"json": {"ward": 1, "room": w.pick(ROOM_NUMBERS[1]), "ids": w.some_ids(BATCH_REQUEST_SIZE)}},
+    ),
+    "get_metrics": lambda w: ("GET", "/metrics", {}),
+}
+
+
+def endpoints() -> List[Tuple[str, str, bool]]:
+    """
+    Returns the (name, handler, is_write) of every registered route.
+    Raises:
+        SystemExit: If a route has no scenario.
+    """
+    missing = [handler for _, _, handler in ROUTES if handler not in SCENARIOS]
+    if missing:
+        raise SystemExit(f"No load-test scenario for: {', '.join(missing)}")
+    return [
+        (f"{methods[0]} {rule}", handler, methods[0] != "GET")
+        for rule, methods, handler in ROUTES
+    ]
+
+
+def percentile(latencies: List[float], p: int) -> float:
+    """Nearest-rank percentile of sorted latencies."""
+    if not latencies:
+        return 0.0
+    rank = max(0, min(len(latencies) - 1, round(p / 100 * len(latencies)) - 1))
+    return latencies[rank]
+
+
+def sample_ids(base_url: str, count: int) -> List[str]:
+    """Reads the ids of up to count seeded patients."""
+    response = requests.get(f"{base_url}/patients", params={"limit": min(count, 1000)})
+    response.raise_for_status()
+    ids = [patient["id"] for patient in response.json()["patients"]]
+    if not ids:
+        raise SystemExit("The database is empty; run the 'seed' command first")
+    return ids
+
+
+def run(args: argparse.Namespace) -> int:
+    """Drives every endpoint and reports (and checks) the results."""
+    base_url = args.url.rstrip("/")
+    routes = endpoints()
+    reads = [route for route in routes if not route[2]]
+    writes = [route for route in routes if route[2]]
+    rng = random.Random(args.seed)
+    workload = Workload(sample_ids(base_url, args.sample), rng)
+    samples: Dict[str, List[float]] = {name: [] for name, _, _ in routes}
+    errors: Dict[str, int] = {name: 0 for name, _, _ in routes}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + args.duration
+
+    def client(slot: int) -> None:
+        session = requests.Session()
+        local = random.Random(args.seed + slot)
+        turn = 0
+        while time.perf_counter() < deadline:
+            # Round-robin within each class, so every endpoint gets traffic.
+            group = writes if writes and local.random() < args.write_ratio else reads
+            name, handler, _ = group[(turn + slot) % len(group)]
+            turn += 1
+            spec = SCENARIOS[handler](workload)
+            if spec is None:
+                continue
+            method, path, kwargs = spec
+            started = time.perf_counter()
+            try:
+                response = session.request(method, base_url + path, timeout=args.timeout, **kwargs)
+                failed = response.status_code >= 500
+            except requests.RequestException:
+                response, failed = None, True
+            elapsed = time.perf_counter() - started
+            if response is not None and not failed:
+                workload.remember(response)
+            with lock:
+                samples[name].append(elapsed)
+                if failed:
+                    errors[name] += 1
+
+    threads = [threading.Thread(target=client, args=(slot,)) for slot in range(args.concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+
+    results = {
+        "config": {
+            "url": base_url,
+            "concurrency": args.concurrency,
+            "duration": args.duration,
+            "write_ratio": args.write_ratio,
+            "seed": args.seed,
+        },
+        "endpoints": {},
+    }
+    for name, latencies in samples.items():
+        latencies.sort()
+        entry = {
+            "requests": len(latencies),
+            "errors": errors[name],
+            "throughput": round(len(latencies) / wall, 2),
+        }
+        for p in PERCENTILES:
+            entry[f"p{p}_ms"] = round(percentile(latencies, p) * 1000, 3)
+        results["endpoints"][name] = entry
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        results["regressions"] = regressions
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    print(output)
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            f.write(output + "\n")
+    if regressions:
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        return 1
+    return 0
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """
+    Lists the endpoints whose throughput dropped, or whose p95 latency grew,
+    by more than the tolerance compared to the baseline.
+    """
+    regressions = []
+    for name, base in baseline.get("endpoints", {}).items():
+        current = results["endpoints"].get(name)
+        if current is None or not base["requests"]:
+            continue
+        if current["throughput"] < base["throughput"] * (1 - tolerance):
+            regressions.append(f"{name}: throughput {current['throughput']} < baseline {base['throughput']}")
+        if current["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {current['p95_ms']}ms > baseline {base['p95_ms']}ms")
+        if current["errors"] > base["errors"]:
+            regressions.append(f"{name}: {current['errors']} errors > baseline {base['errors']}")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Load test of the Patient API.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    seed_parser = commands.add_parser("seed", help="insert synthetic patients")
+    seed_parser.add_argument("--count", type=int, default=10000)
+    seed_parser.add_argument("--db-url", help="overrides PATIENT_DB_URL")
+    seed_parser.add_argument("--seed", type=int, default=0)
+
+    run_parser = commands.add_parser("run", help="drive every endpoint of a running server")
+    run_parser.add_argument("--url", default="http://127.0.0.1:5001")
+    run_parser.add_argument("--concurrency", type=int, default=16)
+    run_parser.add_argument("--duration", type=float, default=30.0, help="seconds")
+    run_parser.add_argument("--write-ratio", type=float, default=0.2, help="share of write requests")
+    run_parser.add_argument("--sample", type=int, default=1000, help="seeded ids used by reads")
+    run_parser.add_argument("--timeout", type=float, default=30.0)
+    run_parser.add_argument("--seed", type=int, default=0)
+    run_parser.add_argument("--output", help="also write the JSON results to this file")
+    run_parser.add_argument("--baseline", help="fail if the results regress from this file")
+    run_parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative regression")
+    run_parser.add_argument("--save-baseline", help="store the results as a baseline")
+
+    args = parser.parse_args()
+    if args.command == "seed":
+        seed(args)
+    else:
+        sys.exit(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+# Measures the cost of building a GET /patients response for 1k and 100k
+# rows: dictionaries with Flask's default JSON provider (the previous path)
+# against PatientRecord objects with the stdlib and the orjson providers.
+#
+# Run from the repository root; a throwaway database is used:
+#   python benchmarks/serialization_bench.py
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+DB_DIR = tempfile.mkdtemp()
+os.environ.setdefault("PATIENT_DB_URL", f"sqlite:///{os.path.join(DB_DIR, 'bench.db')}")
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from flask import Flask  # noqa: E402
+from flask.json.provider import DefaultJSONProvider  # noqa: E402
+from json_provider import StdlibJSONProvider, OrjsonProvider, orjson  # noqa: E402
+from patient_db import PatientDB  # noqa: E402
+from patient_validation import build_new_patient  # noqa: E402
+
+ROW_COUNTS = [1000, 100000]
+
+SEED_PATIENT = {
+    "name": "Benchmark Patient",
+    "age": 42,
+    "gender": "Female",
+    "ward": 1,
+    "room": 11,
+    "doctor_name": "Alice",
+}
+
+
+def seed(patient_db: PatientDB, count: int) -> None:
+    """Inserts benchmark patients until the table holds count rows."""
+    missing = count - len(patient_db.select_all_patients())
+    for start in range(0, missing, 5000):
+        batch = min(5000, missing - start)
+        patient_db.insert_patients([build_new_patient(SEED_PATIENT) for _ in range(batch)])
+
+
+def time_response(app: Flask, fetch, repeat: int) -> float:
+    """Returns the best time, in seconds, to fetch the rows and build the response."""
+    best = float("inf")
+    with app.app_context():
+        for _ in range(repeat):
+            started = time.perf_counter()
+            app.json.response(fetch()).get_data()
+            best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="GET /patients serialization paths.")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    patient_db = PatientDB()
+    variants = [
+        ("dict + default", DefaultJSONProvider, False),
+        ("record + stdlib", StdlibJSONProvider, True),
+    ]
+    if orjson is not None:
+        variants.append(("record + orjson", OrjsonProvider, True))
+
+    for count in ROW_COUNTS:
+        seed(patient_db, count)
+        print(f"{count} rows")
+        for label, provider, as_records in variants:
+            app = Flask(__name__)
+            app.json = provider(app)
+            seconds = time_response(
+                app, lambda: patient_db.select_all_patients(as_records=as_records), args.repeat
+            )
+            print(f"  {label:>16}: {seconds * 1000:9.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+# Compares the per-request validation cost of the compiled schemas with the
+# previous validation path (list lookups and a Doctor instance per payload).
+#
+# Run from the repository root:
+#   python benchmarks/validation_bench.py --count 100000
+
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from config import GENDERS, WARD_NUMBERS, ROOM_NUMBERS  # noqa: E402
+from doctor import Doctor  # noqa: E402
+from patient_schema import NEW_PATIENT_SCHEMA  # noqa: E402
+
+REQUIRED_FIELDS = ["name", "gender", "age", "ward", "room", "doctor_name"]
+
+PAYLOADS = [
+    {"name": "Valid Patient", "age": 42, "gender": "Female", "ward": 1, "room": 11, "doctor_name": "Alice"},
+    {"name": "Bad Room", "age": 42, "gender": "Male", "ward": 1, "room": 99, "doctor_name": "Alice"},
+    {"name": "Bad Doctor", "age": 42, "gender": "Female", "ward": 2, "room": 21, "doctor_name": "Nobody"},
+    {"name": "", "age": -1, "gender": "Other"},
+]
+
+
+def legacy_validate(request_body):
+    """The first-error validation path the schemas replaced."""
+    if not all(key in request_body for key in REQUIRED_FIELDS):
+        return f"Missing required fields: {', '.join(REQUIRED_FIELDS)}"
+    name = request_body["name"]
+    gender = request_body["gender"]
+    age = request_body["age"]
+    if not isinstance(name, str) or not name.strip():
+        return "Name must be a non-empty string"
+    if gender not in GENDERS:
+        return f"Invalid gender provided. Must be one of: {', '.join(GENDERS)}"
+    if not isinstance(age, int) or age <= 0:
+        return "Age must be a positive integer"
+    ward = request_body.get("ward")
+    room = request_body.get("room")
+    doctor_name = request_body.get("doctor_name")
+    if ward is not None and room is not None:
+        if ward not in WARD_NUMBERS or str(room) not in ROOM_NUMBERS.get(ward, []):
+            return "Invalid ward or room number"
+    elif ward is not None or room is not None:
+        return "Both ward and room must be provided together"
+    if doctor_name:
+        try:
+            Doctor(doctor_name)
+        except ValueError as e:
+            return str(e)
+    return None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Legacy vs compiled schema validation.")
+    parser.add_argument("--count", type=int, default=100000, help="payloads validated per run")
+    args = parser.parse_args()
+
+    payloads = (PAYLOADS * (args.count // len(PAYLOADS) + 1))[: args.count]
+    runs = {
+        "legacy": lambda: [legacy_validate(payload) for payload in payloads],
+        "schema": lambda: [NEW_PATIENT_SCHEMA.validate(payload) for payload in payloads],
+        "schema_batch": lambda: NEW_PATIENT_SCHEMA.validate_many(payloads),
+    }
+    for label, run in runs.items():
+        seconds = min(timeit.repeat(run, number=1, repeat=5))
+        print(f"{label:>12}: {args.count / seconds:12.0f} payloads/s")
+
+
+if __name__ == "__main__":
+    main()
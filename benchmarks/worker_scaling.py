@@ -0,0 +1,135 @@
+# Measures how the throughput of serve.py scales with its worker processes.
+#
+# For each worker count, a server is started on the same SQLite file (WAL
+# mode), driven by concurrent clients with a read-mostly mix, then stopped
+# with SIGTERM (graceful shutdown). Run from the repository root:
+#   python benchmarks/worker_scaling.py --max-workers 8 --duration 10
+# Scaling is bounded by the CPU count: pass --max-workers up to `nproc`.
+
+import argparse
+import json
+import os
+import random
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict, List
+
+import requests
+
+SERVE = os.path.join(os.path.dirname(__file__), "..", "src", "serve.py")
+
+SEED_PATIENT = {
+    "name": "Scaling Patient",
+    "age": 42,
+    "gender": "Female",
+    "ward": 1,
+    "room": 11,
+    "doctor_name": "Alice",
+}
+
+
+def worker_counts(max_workers: int) -> List[int]:
+    """1, 2, 4, ... up to max_workers (included)."""
+    counts, count = [], 1
+    while count < max_workers:
+        counts.append(count)
+        count *= 2
+    return counts + [max_workers]
+
+
+def start_server(workers: int, threads: int, port: int, env: Dict[str, str]) -> subprocess.Popen:
+    """Starts serve.py and waits until it answers."""
+    process = subprocess.Popen(
+        [sys.executable, SERVE, "--workers", str(workers), "--threads", str(threads),
+         "--bind", f"127.0.0.1:{port}"],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            requests.get(f"http://127.0.0.1:{port}/", timeout=1)
+            return process
+        except requests.RequestException:
+            time.sleep(0.2)
+    process.kill()
+    raise SystemExit("serve.py did not start")
+
+
+def stop_server(process: subprocess.Popen) -> None:
+    process.send_signal(signal.SIGTERM)
+    process.wait(timeout=60)
+
+
+def drive(base_url: str, ids: List[str], concurrency: int, duration: float, write_ratio: float) -> float:
+    """Runs the read-mostly mix with N concurrent clients and returns requests/sec."""
+    deadline = time.perf_counter() + duration
+    counts = [0] * concurrency
+
+    def client(slot: int) -> None:
+        session = requests.Session()
+        rng = random.Random(slot)
+        while time.perf_counter() < deadline:
+            patient_id = rng.choice(ids)
+            if rng.random() < write_ratio:
+                session.put(f"{base_url}/patients/{patient_id}", json={"age": rng.randint(1, 99)})
+            elif rng.random() < 0.5:
+                session.get(f"{base_url}/patients/{patient_id}")
+            else:
+                session.get(f"{base_url}/patients", params={"limit": 50, "ward": 1})
+            counts[slot] += 1
+
+    threads = [threading.Thread(target=client, args=(slot,)) for slot in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sum(counts) / (time.perf_counter() - started)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="serve.py throughput from 1 to N workers.")
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--threads", type=int, default=4, help="threads per worker")
+    parser.add_argument("--concurrency", type=int, default=32, help="concurrent clients")
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds per worker count")
+    parser.add_argument("--write-ratio", type=float, default=0.1)
+    parser.add_argument("--patients", type=int, default=1000)
+    parser.add_argument("--port", type=int, default=5091)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        env = dict(os.environ, PATIENT_DB_FILE=os.path.join(workdir, "scaling.db"), PATIENT_DB_JOURNAL_MODE="WAL")
+        env.pop("PATIENT_DB_URL", None)
+        base_url = f"http://127.0.0.1:{args.port}"
+
+        server = start_server(1, args.threads, args.port, env)
+        response = requests.post(f"{base_url}/patients/bulk", json=[SEED_PATIENT] * args.patients)
+        response.raise_for_status()
+        ids = [item["id"] for item in response.json()["results"] if item["status"] == "created"]
+        stop_server(server)
+
+        results = {}
+        for workers in worker_counts(args.max_workers):
+            server = start_server(workers, args.threads, args.port, env)
+            try:
+                rps = drive(base_url, ids, args.concurrency, args.duration, args.write_ratio)
+            finally:
+                stop_server(server)
+            results[workers] = round(rps, 1)
+            print(f"{workers:>3} workers: {rps:10.1f} requests/s", file=sys.stderr)
+
+    baseline = results[1]
+    print(json.dumps({
+        "cpus": os.cpu_count(),
+        "requests_per_second": results,
+        "speedup": {workers: round(rps / baseline, 2) for workers, rps in results.items()},
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
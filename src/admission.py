@@ -0,0 +1,195 @@
+# Admission control in front of the database layer, for both controllers.
+#
+# Without it, a burst sends every request straight into PatientDB, where they
+# pile up on the connection pools and the SQLite write lock, and latency
+# grows for everyone. A gate bounds the requests running at once; the
+# controllers keep one for the reads and one for the writes, so a write burst
+# cannot take the slots of the reads and the other way round. Requests over
+# the budget wait in a short queue, served by priority lane and then in
+# arrival order. A request that finds the queue full, that waits past the
+# deadline, or that is pushed out of a full queue by a more urgent one is
+# rejected at once, for the controller to answer 503 with Retry-After.
+
+import asyncio
+import bisect
+import itertools
+import threading
+import time
+from typing import Any, List
+
+from metrics import ADMISSION_WAIT, ADMISSION_REJECTED, ADMISSION_STATE
+
+# Priority lanes, most urgent first.
+PRIORITY_CLINICAL = 0
+PRIORITY_DEFAULT = 1
+PRIORITY_BULK = 2
+PRIORITY_NAMES = {PRIORITY_CLINICAL: "clinical", PRIORITY_DEFAULT: "default", PRIORITY_BULK: "bulk"}
+
+# Why a request was not admitted.
+REJECT_QUEUE_FULL = "queue_full"
+REJECT_TIMEOUT = "timeout"
+REJECT_SHED = "shed"
+
+
+class _Waiter:
+    """A queued request: ordered by lane, then by arrival."""
+
+    __slots__ = ("key", "priority", "signal", "outcome")
+
+    def __init__(self, priority: int, sequence: int, signal: Any) -> None:
+        self.key = (priority, sequence)
+        self.priority = priority
+        # A threading.Event or an asyncio.Future, set once the outcome is known.
+        self.signal = signal
+        # None while waiting, then True (admitted) or a REJECT_* reason.
+        self.outcome: Any = None
+
+    def __lt__(self, other: "_Waiter") -> bool:
+        return self.key < other.key
+
+
+class _GateState:
+    """
+    The bookkeeping shared by AdmissionGate and AsyncAdmissionGate. Callers
+    serialize access to it: with a lock for threads, by running on the event
+    loop for asyncio.
+    """
+
+    def __init__(self, name: str, concurrency: int, queue_size: int, timeout: float) -> None:
+        """
+        Args:
+            name: The label of the gate in the metrics ("read" or "write").
+            concurrency: The most requests admitted at once.
+            queue_size: The most requests waiting for a slot.
+            timeout: Seconds a request may wait for a slot.
+        """
+        self.name = name
+        self.concurrency = concurrency
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.active = 0
+        self._waiters: List[_Waiter] = []
+        self._sequence = itertools.count()
+        # Keyed by the gate: the gates of other applications in the same
+        # process, with the same name, do not replace it.
+        ADMISSION_STATE.set_callback(self, self._state)
+
+    def close(self) -> None:
+        """Stops exporting the state of the gate, once its application is torn down."""
+        ADMISSION_STATE.remove_callback(self)
+
+    def _state(self):
+        return [
+            ({"gate": self.name, "state": "active"}, self.active),
+            ({"gate": self.name, "state": "queued"}, len(self._waiters)),
+        ]
+
+    def _enter(self, priority: int, signal: Any) -> Any:
+        """
+        Admits a request if there is a free slot, else queues it.
+        Returns:
+            True if admitted, a _Waiter if queued, or REJECT_QUEUE_FULL.
+            A more urgent request may take the place of the least urgent
+            waiter of a full queue, which is then woken up rejected.
+        """
+        if self.active < self.concurrency and not self._waiters:
+            self.active += 1
+            return True
+        if len(self._waiters) >= self.queue_size:
+            if not self._waiters or self._waiters[-1].priority <= priority:
+                return REJECT_QUEUE_FULL
+            self._settle(self._waiters.pop(), REJECT_SHED)
+        waiter = _Waiter(priority, next(self._sequence), signal)
+        bisect.insort(self._waiters, waiter)
+        return waiter
+
+    def _leave(self) -> None:
+        """Hands the slot of a finished request to the next waiter, or frees it."""
+        if self._waiters:
+            self._settle(self._waiters.pop(0), True)
+        else:
+            self.active -= 1
+
+    def _give_up(self, waiter: _Waiter) -> Any:
+        """Ends the wait of a request past its deadline, unless already settled."""
+        if waiter.outcome is None:
+            self._waiters.remove(waiter)
+            waiter.outcome = REJECT_TIMEOUT
+        return waiter.outcome
+
+    def _settle(self, waiter: _Waiter, outcome: Any) -> None:
+        waiter.outcome = outcome
+        self._wake(waiter)
+
+    def _wake(self, waiter: _Waiter) -> None:
+        raise NotImplementedError
+
+    def _record(self, priority: int, outcome: Any, waited: float) -> bool:
+        """Records an admission decision. Returns whether the request was admitted."""
+        if outcome is True:
+            ADMISSION_WAIT.observe(waited, gate=self.name, priority=PRIORITY_NAMES[priority])
+            return True
+        ADMISSION_REJECTED.inc(gate=self.name, priority=PRIORITY_NAMES[priority], reason=outcome)
+        return False
+
+
+class AdmissionGate(_GateState):
+    """Bounds the concurrent requests of a threaded server."""
+
+    def __init__(self, name: str, concurrency: int, queue_size: int, timeout: float) -> None:
+        super().__init__(name, concurrency, queue_size, timeout)
+        self._lock = threading.Lock()
+
+    def acquire(self, priority: int = PRIORITY_DEFAULT) -> bool:
+        """
+        Waits for a slot. Every admitted request must call release() once done.
+        Returns:
+            True if admitted, False if rejected.
+        """
+        started = time.perf_counter()
+        with self._lock:
+            entered = self._enter(priority, threading.Event())
+        if isinstance(entered, _Waiter):
+            entered.signal.wait(self.timeout)
+            with self._lock:
+                entered = self._give_up(entered)
+        return self._record(priority, entered, time.perf_counter() - started)
+
+    def release(self) -> None:
+        with self._lock:
+            self._leave()
+
+    def _wake(self, waiter: _Waiter) -> None:
+        waiter.signal.set()
+
+
+class AsyncAdmissionGate(_GateState):
+    """Bounds the concurrent requests of an asyncio server; used from its event loop only."""
+
+    async def acquire(self, priority: int = PRIORITY_DEFAULT) -> bool:
+        """
+        Waits for a slot. Every admitted request must call release() once done.
+        Returns:
+            True if admitted, False if rejected.
+        """
+        started = time.perf_counter()
+        entered = self._enter(priority, asyncio.get_running_loop().create_future())
+        if isinstance(entered, _Waiter):
+            try:
+                await asyncio.wait_for(asyncio.shield(entered.signal), self.timeout)
+            except asyncio.TimeoutError:
+                pass
+            except asyncio.CancelledError:
+                # The client went away: leave the queue, or pass on the slot.
+                if self._give_up(entered) is True:
+                    self._leave()
+                raise
+            entered = self._give_up(entered)
+        return self._record(priority, entered, time.perf_counter() - started)
+
+    def release(self) -> None:
+        self._leave()
+
+    def _wake(self, waiter: _Waiter) -> None:
+        if not waiter.signal.done():
+            waiter.signal.set_result(None)
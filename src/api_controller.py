@@ -1,318 +1,514 @@
 # Patient API Controller
 
-from flask import Flask, jsonify, request
+import os
+import time
+from typing import Any, Mapping, Optional
+from flask import Flask, Response, g, request, stream_with_context
 from flask_cors import CORS
-from patient_db import PatientDB
-from patient import Patient, Doctor
-from config import GENDERS, WARD_NUMBERS, ROOM_NUMBERS, DOCTORS
+from sqlalchemy.exc import SQLAlchemyError
+from patient_db import PatientDB, VersionConflictError
+from occupancy import OccupancyIndex
+from patient_routes import ROUTES, NDJSON_MIMETYPE
+from admission import AdmissionGate
+from change_feed import SSE_MIMETYPE, ChangeFollower
+from json_provider import select_json_provider
+from write_queue import GroupCommitQueue
+from patient_export import EXPORT_FORMATS, ExportEncoder
+import patient_handlers as handlers
+from config import (
+    EXPORT_CHUNK_ROWS,
+    APP_CONFIG_DEFAULTS,
+    CHANGE_SYNC_INTERVAL_SECONDS,
+    GROUP_COMMIT_MAX_BATCH,
+    GROUP_COMMIT_WINDOW_SECONDS,
+)
 
 class PatientAPIController:
-    def __init__(self):
+    def __init__(self, config: Optional[Mapping[str, Any]] = None):
+        """
+        Builds the application and connects it to its database.
+        Args:
+            config: Settings overriding APP_CONFIG_DEFAULTS (see config.py).
+        """
         self.app = Flask(__name__)
-        self.patient_db = PatientDB()
+        self.app.config.from_mapping(APP_CONFIG_DEFAULTS)
+        if config:
+            self.app.config.from_mapping(config)
+        settings = self.app.config
+        self.app.json = select_json_provider(settings["JSON_PROVIDER"])(self.app)
+        storage = handlers.build_storage(settings)
+        self.occupancy = OccupancyIndex()
+        write_queue = None
+        if settings["PATIENT_GROUP_COMMIT"]:
+            write_queue = GroupCommitQueue(
+                lambda: storage.engine.begin(), GROUP_COMMIT_MAX_BATCH, GROUP_COMMIT_WINDOW_SECONDS
+            )
+        self.patient_db = PatientDB(
+            cache=handlers.build_cache(settings),
+            occupancy=self.occupancy,
+            storage=storage,
+            write_queue=write_queue,
+        )
+        self.patient_db.load_occupancy()
+        self.admission_gates = handlers.build_admission_gates(settings, AdmissionGate)
+        self.change_follower = None
+        if settings["PATIENT_SYNC_CHANGES"]:
+            self.follow_changes()
         CORS(self.app)  # Enable CORS for all routes
         self.setup_routes()
-        
+
+    def follow_changes(self):
+        """
+        Starts replaying the writes of the other processes serving the
+        database into the cache, occupancy index and table version of this
+        one, on a background thread. Pre-fork servers call it in each worker.
+        """
+        if self.change_follower is None:
+            self.change_follower = ChangeFollower(
+                self.patient_db.sync_changes, CHANGE_SYNC_INTERVAL_SECONDS
+            )
+        self.change_follower.start()
+
+    def close(self):
+        """
+        Stops following the change log, closes the pooled connections and
+        the admission gates.
+        """
+        if self.change_follower is not None:
+            self.change_follower.stop()
+        self.patient_db.storage.dispose()
+        handlers.close_admission_gates(self.admission_gates)
 
     def setup_routes(self):
 
         # Sets up the routes for the API endpoints.
-
-        self.app.route("/", methods=["GET"])(self.index)
-        self.app.route("/patients", methods=["GET"])(self.get_patients)
-        self.app.route("/patients/<id>", methods=["GET"])(self.get_patient)
-        self.app.route("/patients", methods=["POST"])(self.create_patient)
-        self.app.route("/patients/<id>", methods=["PUT"])(self.update_patient)
-        self.app.route("/patients/<id>", methods=["DELETE"])(self.delete_patient)
-        self.app.route("/patients/search", methods=["GET"])(
-            self.search_patients_by_name
-        )
-        self.app.route("/patients/<id>/room", methods=["PUT"])(
-            self.set_patient_room
-        )
-        self.app.route("/patients/<id>/checkout", methods=["PUT"])(
-            self.checkout_patient_api
-        )
-        self.app.route("/doctors", methods=["GET"])(self.get_doctors)
-        self.app.route("/patients/<id>/doctor", methods=["PUT"])(self.assign_doctor)
+        # The route table and the handler logic (patient_handlers.py) are
+        # shared with the async controller.
+
+        for rule, methods, handler in ROUTES:
+            self.app.route(rule, methods=methods)(getattr(self, handler))
+        self.app.before_request(self._start_request_timer)
+        self.app.after_request(self._record_request)
+        if self.admission_gates is not None:
+            self.app.before_request(self._admit_request)
+            self.app.after_request(self._hold_admission_for_stream)
+            self.app.teardown_request(self._release_admission)
+
+    def _start_request_timer(self):
+        g.request_started = time.perf_counter()
+
+    def _admit_request(self):
+        """
+        Admits a request through the read or write gate of its route, in its
+        priority lane; over budget, answers 503 at once with Retry-After.
+        """
+        admission = handlers.request_admission(self.admission_gates, request)
+        if admission is None:
+            return None
+        gate, priority = admission
+        if not gate.acquire(priority):
+            return handlers.busy_reply()
+        g.admission_gate = gate
+        return None
+
+    def _release_admission(self, error=None):
+        gate = g.pop("admission_gate", None)
+        if gate is not None:
+            gate.release()
+
+    def _hold_admission_for_stream(self, response):
+        # A streamed body is generated after the request teardown: keep the
+        # slot until the server closes the response.
+        if response.is_streamed:
+            gate = g.pop("admission_gate", None)
+            if gate is not None:
+                response.call_on_close(gate.release)
+        return response
+
+    def _record_request(self, response):
+        handlers.record_request(request, response.status_code, g.pop("request_started", None))
+        return response
 
 
     def index(self):
         """
         Provides a welcome message for the root endpoint.
         """
-        return jsonify({"message": "Welcome to the Patient API!"}), 200
+        return handlers.index_reply()
 
     def get_patients(self):
         """
         Retrieves a list of all patients.
+        Supports keyset pagination with the 'limit' and 'cursor' query
+        parameters, and streams the whole table as NDJSON when requested
+        with '?format=ndjson' or an 'Accept: application/x-ndjson' header.
+        Filters: 'ward', 'room', 'doctor_name', 'gender', 'active=true|false'
+        (still admitted or checked out), 'min_age', 'max_age' and the
+        ISO-8601 ranges 'checkin_from'/'checkin_to' and 'checkout_from'/'checkout_to'.
+        Archived patients are only listed with 'include_archived=true'.
+        Responses carry an ETag derived from the table version; a matching
+        'If-None-Match' is answered with 304 without querying the database.
         """
-        patients = self.patient_db.select_all_patients()
-        return jsonify(patients), 200
+        listing, reply = handlers.parse_listing(request)
+        if reply:
+            return reply
+        headers, reply = handlers.listing_headers(request, listing, self.patient_db.table_version())
+        if reply:
+            return reply
+
+        filters = listing["filters"]
+        if listing["ndjson"]:
+            return Response(
+                stream_with_context(self._stream_patients_ndjson(filters)),
+                mimetype=NDJSON_MIMETYPE,
+                headers=headers,
+            )
+        if listing["limit"] is None:
+            result = self.patient_db.select_all_patients(filters, as_records=True)
+        else:
+            result = self.patient_db.select_patients_page(
+                listing["limit"], listing["cursor"], filters, as_records=True
+            )
+        return handlers.listing_reply(result, headers)
 
-    def get_doctors(self):
+    def _stream_patients_ndjson(self, filters):
         """
-        Retrieves the list of available doctors.
+        Yields every patient as one JSON document per line.
         """
-        return jsonify({"doctors": DOCTORS}), 200
+        for patient in self.patient_db.iter_patients(filters=filters, as_records=True):
+            yield self.app.json.dumps(patient) + "\n"
 
-    def get_patient(self, id):
+    def export_patients(self):
         """
-        Retrieves a single patient by their ID.
+        Exports every patient, or those matching the GET /patients filters,
+        as CSV or NDJSON ('?format=csv|ndjson', NDJSON by default). The rows
+        are read through a server-side cursor and encoded a chunk at a time,
+        so the export streams in constant memory whatever the table size. It
+        is gzip-compressed when the client sends 'Accept-Encoding: gzip'.
         """
-        patient = self.patient_db.select_patient(id)
-        if patient:
-            return jsonify(patient), 200
-        else:
-            return jsonify({"message": "Patient not found"}), 404
+        export, reply = handlers.parse_export(request)
+        if reply:
+            return reply
+        encoder = ExportEncoder(export["format"], self.app.json.dumps, export["compress"])
+        return Response(
+            stream_with_context(self._stream_export(encoder, export["filters"])),
+            mimetype=EXPORT_FORMATS[export["format"]],
+            headers=handlers.export_headers(export),
+        )
 
-    def create_patient(self):
+    def _stream_export(self, encoder, filters):
         """
-        Creates a new patient.
-        Expects a JSON body with 'name', 'gender', and 'age'.
-        """
-        request_body = request.get_json()
-        if not request_body:
-            return jsonify({"message": "Request body cannot be empty"}), 400
-
-        required_fields = ["name", "gender", "age", "ward", "room", "doctor_name"]
-        if not all(key in request_body for key in required_fields):
-            return (
-                jsonify(
-                    {"message": f"Missing required fields: {', '.join(required_fields)}"}
-                ),
-                400,
-            )
+        Yields the encoded chunks of an export.
+        """
+        yield encoder.header()
+        for rows in self.patient_db.iter_patient_chunks(EXPORT_CHUNK_ROWS, filters):
+            yield encoder.encode(rows)
+        yield encoder.finish()
 
-        name = request_body["name"]
-        gender = request_body["gender"]
-        age = request_body["age"]
+    def get_metrics(self):
+        """
+        Exports the request, database and cache metrics in the Prometheus text format.
+        """
+        return handlers.metrics_reply()
 
+    def get_doctors(self):
+        """
+        Retrieves the list of available doctors.
+        """
+        return handlers.doctors_reply()
 
-        # --- Enhanced Validation ---
-        if not isinstance(name, str) or not name.strip():
-            return jsonify({"message": "Name must be a non-empty string"}), 400
+    def get_doctor_stats(self):
+        """
+        Retrieves the number of admitted and checked-out patients of every
+        doctor, read from counters maintained by the writes.
+        """
+        return handlers.doctor_stats_reply(self.patient_db.doctor_stats())
 
-        if gender not in GENDERS:
-            return (
-                jsonify(
-                    {
-                        "message": f"Invalid gender provided. Must be one of: {', '.join(GENDERS)}"
-                    }
-                ),
-                400,
-            )
+    def get_wards(self):
+        """
+        Retrieves the occupancy of every ward.
+        Served from the occupancy index, without querying the database.
+        """
+        return handlers.wards_reply(self.occupancy)
 
-        if not isinstance(age, int) or age <= 0:
-            return jsonify({"message": "Age must be a positive integer"}), 400
-        # --- End of Validation ---
-        
-        ward = request_body.get("ward")
-        room = request_body.get("room")
-        doctor_name = request_body.get("doctor_name")
-
-        # Optional validation for ward and room if they are provided
-        if ward is not None and room is not None:
-            if ward not in WARD_NUMBERS or str(room) not in ROOM_NUMBERS.get(ward, []):
-                return jsonify({"message": "Invalid ward or room number"}), 400
-        elif ward is not None or room is not None:
-            return jsonify({"message": "Both ward and room must be provided together"}), 400
-        
-        # Optional validation for doctor
-        if doctor_name:
-            try:
-                Doctor(doctor_name) # Use Doctor class for validation
-            except ValueError as e:
-                return jsonify({"message": str(e)}), 400
+    def get_ward_stats(self):
+        """
+        Retrieves the number of admitted and checked-out patients of every
+        ward, read from counters maintained by the writes.
+        """
+        return handlers.ward_stats_reply(self.patient_db.ward_stats())
 
+    def get_ward_rooms(self, ward):
+        """
+        Retrieves the rooms of a ward with their number of admitted patients.
+        Use '?free=true' to only list the free rooms.
+        """
+        return handlers.ward_rooms_reply(self.occupancy, ward, request)
 
-        new_patient = Patient(name=name, gender=gender, age=age, ward=ward, room=room, doctor_name=doctor_name)
-        patient_data = new_patient.to_dict()
+    def get_patient(self, id):
+        """
+        Retrieves a single patient by their ID; archived patients are only
+        found with '?include_archived=true'.
+        The ETag is the patient's version; a matching 'If-None-Match' is
+        answered with 304 without serializing the patient.
+        """
+        include_archived = handlers.is_flag_set(request.args, "include_archived")
+        patient = self.patient_db.select_patient(id, include_archived)
+        return handlers.patient_reply(request, patient)
 
-        # Insert the patient data into the database
-        result = self.patient_db.insert_patient(patient_data)
+    def create_patient(self):
+        """
+        Creates a new patient.
+        Expects a JSON body with 'name', 'gender', 'age', 'ward', 'room' and 'doctor_name'.
+        """
+        patient_data, reply = handlers.parse_new_patient(request.get_json())
+        if reply:
+            return reply
+        return handlers.created_reply(patient_data, self.patient_db.insert_patient(patient_data))
 
-        if result:
-            # Return the created patient object for better API practice
-            return jsonify(patient_data), 201
+    def create_patients_bulk(self):
+        """
+        Creates many patients in one request.
+        Expects either a JSON array of patient objects or, with the
+        'application/x-ndjson' content type, one patient object per line.
+        Valid patients are inserted in chunked transactions; invalid ones are
+        reported per item without aborting the rest of the batch.
+        """
+        if request.mimetype == NDJSON_MIMETYPE:
+            items = self._iter_ndjson_body()
         else:
-            return jsonify({"message": "Failed to create patient"}), 500
+            items, reply = handlers.parse_bulk_body(request.get_json(silent=True))
+            if reply:
+                return reply
+
+        creation = handlers.BulkCreation()
+        for item in items:
+            if creation.add(item):
+                self._insert_bulk_chunk(creation)
+        self._insert_bulk_chunk(creation)
+        return creation.reply()
+
+    def _iter_ndjson_body(self):
+        """
+        Yields the decoded objects of an NDJSON request body, line by line.
+        Lines that are not valid JSON are yielded as the ValueError raised.
+        """
+        for line in request.stream:
+            if line.strip():
+                yield handlers.decode_ndjson_line(self.app.json.loads, line)
+
+    def _insert_bulk_chunk(self, creation):
+        """
+        Validates the pending items of a bulk creation in a single batch and
+        inserts the valid patients.
+        """
+        chunk = creation.take_chunk()
+        if chunk:
+            creation.inserted(self.patient_db.insert_patients(chunk))
+
+    def update_patients_batch(self):
+        """
+        Updates many patients in one transaction.
+        Expects a JSON array of objects, each with the 'id' of a patient, the
+        fields to update and optionally the 'version' the patient must still
+        be at. Invalid items are reported without aborting the others.
+        """
+        batch, reply = handlers.parse_batch_update(request.get_json(silent=True))
+        if reply:
+            return reply
+        patients, conflicts = [], {}
+        if batch["updates"]:
+            try:
+                patients, conflicts = self.patient_db.update_patients_returning(
+                    batch["updates"], batch["expected_versions"]
+                )
+            except SQLAlchemyError:
+                return handlers.message_reply("Failed to update patients", 500)
+        return handlers.batch_update_reply(batch, patients, conflicts)
+
+    def checkout_patients_batch(self):
+        """
+        Checks many patients out in one transaction.
+        Expects a JSON body with the 'ids' of the patients.
+        """
+        patient_ids, reply = handlers.parse_checkout_batch(request.get_json(silent=True))
+        if reply:
+            return reply
+        try:
+            patients = self.patient_db.checkout_patients(patient_ids)
+        except SQLAlchemyError:
+            return handlers.message_reply("Failed to checkout patients", 500)
+        return handlers.checkout_batch_reply(patient_ids, patients)
+
+    def transfer_ward(self, ward):
+        """
+        Moves the admitted patients of a ward to another ward in one transaction.
+        Expects a JSON body with the destination 'ward' and either a 'room'
+        for every patient or a 'rooms' object mapping the rooms of this ward
+        to rooms of the destination; 'ids' restricts the transfer to some
+        patients.
+        """
+        params, reply = handlers.parse_transfer(self.occupancy, ward, request.get_json(silent=True))
+        if reply:
+            return reply
+        try:
+            patients = self.patient_db.transfer_ward(ward, **params)
+        except SQLAlchemyError:
+            return handlers.message_reply("Failed to transfer patients", 500)
+        return handlers.transfer_reply(params, patients)
 
     def update_patient(self, id):
         """
         Updates an existing patient.
         Expects a JSON body with fields to update (e.g., 'name', 'age', 'gender').
         """
-        update_data = request.get_json()
-        if not update_data:
-            return jsonify({"message": "Request body cannot be empty"}), 400
-
-        # --- Enhanced Validation ---
-        if "name" in update_data and (
-            not isinstance(update_data["name"], str) or not update_data["name"].strip()
-        ):
-            return jsonify({"message": "Name must be a non-empty string"}), 400
-
-        if "gender" in update_data and update_data["gender"] not in GENDERS:
-            return (
-                jsonify(
-                    {
-                        "message": f"Invalid gender provided. Must be one of: {', '.join(GENDERS)}"
-                    }
-                ),
-                400,
-            )
-
-        if "age" in update_data and (
-            not isinstance(update_data["age"], int) or update_data["age"] <= 0
-        ):
-            return jsonify({"message": "Age must be a positive integer"}), 400
-        # --- End of Validation ---
-        
-        if "doctor_name" in update_data:
-            try:
-                Doctor(update_data["doctor_name"]) # Validate doctor name
-            except ValueError as e:
-                return jsonify({"message": str(e)}), 400
-
-        allowed_updates = {
-            k: v for k, v in update_data.items() if k in ["name", "age", "gender", "room", "ward", "doctor_name"]
-        }
-
-        if not allowed_updates:
-            return jsonify({"message": "No valid fields provided for update"}), 400
-
-        rows_affected = self.patient_db.update_patient(id, allowed_updates)
-
-        if rows_affected is not None and rows_affected > 0:
-            # Fetch and return the updated patient object
-            updated_patient = self.patient_db.select_patient(id)
-            return jsonify(updated_patient), 200
-        elif rows_affected == 0:
-            # Check if patient exists to give a more accurate message
-            if self.patient_db.select_patient(id):
-                return jsonify({"message": "Patient data is the same, no update performed"}), 200
-            else:
-                return jsonify({"message": "Patient not found"}), 404
-        else:
-            return jsonify({"message": "Error updating patient"}), 500
+        update_data, reply = handlers.parse_patient_update(request.get_json())
+        if reply:
+            return reply
+        return self._update_patient_response(id, update_data, "Error updating patient")
 
     def delete_patient(self, id):
+        """
+        Deletes a patient. With 'If-Match', only if the patient is still at
+        that version.
+        """
+        expected_version, reply = handlers.parse_if_match(request)
+        if reply:
+            return reply
         try:
-            rows_affected = self.patient_db.delete_patient(id)
-            if rows_affected is not None and rows_affected > 0:
-                return jsonify({"message": "Patient deleted successfully"}), 200
-            else:
-                return jsonify({"message": "Patient not found"}), 404
-        except Exception as e:
-            return jsonify({"message": "An error occurred", "error": str(e)}), 500
+            rows_affected = self.patient_db.delete_patient(id, expected_version)
+        except VersionConflictError as e:
+            return handlers.version_conflict_reply(e)
+        return handlers.deleted_reply(rows_affected)
 
     def search_patients_by_name(self):
         """
-        Searches for patients by name.
+        Searches for patients by name, best matches first.
+        Use '?prefix=true' for autocomplete and 'limit' to cap the results;
+        '?include_archived=true' lists the archived matches after the live ones.
         """
-        name = request.args.get("search_name")
-        if not name:
-            return jsonify({"message": "search_name parameter is required"}), 400
+        params, reply = handlers.parse_search(request)
+        if reply:
+            return reply
+        return handlers.search_reply(self.patient_db.search_patients_by_name(**params))
 
-        patients = self.patient_db.search_patients_by_name(name)
-        if patients:
-            return jsonify(patients), 200
-        else:
-            return jsonify({"message": "No patients found with that name"}), 404
+    def get_patient_changes(self):
+        """
+        Retrieves the patient writes logged after '?since=<seq>', oldest first,
+        as {"changes": [...], "next_since": <seq>}; pass next_since back to get
+        the following ones. With '?wait=<seconds>' the request long-polls until
+        a change is logged. With 'Accept: text/event-stream' (or '?format=sse')
+        the changes are streamed as Server-Sent Events instead.
+        """
+        params, reply = handlers.parse_changes(request)
+        if reply:
+            return reply
+
+        if handlers.wants_sse(request):
+            stream = handlers.ChangeStream(params["since"], params["limit"], self.app.json.dumps)
+            return Response(
+                stream_with_context(self._stream_changes_sse(stream)),
+                mimetype=SSE_MIMETYPE,
+                headers={"Cache-Control": "no-cache"},
+            )
+
+        changes = self.patient_db.wait_for_changes(
+            params["since"], params["limit"], params["wait"]
+        )
+        return handlers.changes_reply(params, changes)
+
+    def _stream_changes_sse(self, stream):
+        """
+        Yields the changes of a change stream as Server-Sent Events, with a
+        keep-alive comment whenever none arrives for a while, until the
+        stream ends (or on a database error).
+        """
+        yield stream.opening()
+        while (wait := stream.next_wait()) is not None:
+            changes = self.patient_db.wait_for_changes(stream.since, stream.limit, wait)
+            if changes is None:
+                return
+            yield from stream.events(changes)
 
     def set_patient_room(self, id):
         """
         Assigns a patient to a ward and room.
         Expects a JSON body with 'ward' and 'room'.
         """
-        request_body = request.get_json()
-        if not request_body or not all(key in request_body for key in ["ward", "room"]):
-            return (
-                jsonify({"message": "Missing required fields: ward, room"}),
-                400,
-            )
-
-        ward = request_body["ward"]
-        room = request_body["room"]
-
-        # Validate ward and room numbers based on config
-        if ward not in WARD_NUMBERS or str(room) not in ROOM_NUMBERS.get(ward, []):
-            return jsonify({"message": "Invalid ward or room number"}), 400
-
-        update_data = {"ward": ward, "room": room}
-        rows_affected = self.patient_db.update_patient(id, update_data)
-
-        if rows_affected is not None and rows_affected > 0:
-            updated_patient = self.patient_db.select_patient(id)
-            return jsonify(updated_patient), 200
-        elif rows_affected == 0:
-            # Check if patient exists to give a more accurate message
-            if self.patient_db.select_patient(id):
-                return jsonify({"message": "Patient room is the same, no update performed"}), 200
-            else:
-                return jsonify({"message": "Patient not found"}), 404
-        else:
-            return jsonify({"message": "Error updating patient's room"}), 500
+        update_data, reply = handlers.parse_room_assignment(request.get_json())
+        if reply:
+            return reply
+        return self._update_patient_response(id, update_data, "Error updating patient's room")
 
     def checkout_patient_api(self, id):
         """
         Sets the checkout time for a patient.
         """
-        patient_data = self.patient_db.select_patient(id)
-        if not patient_data:
-            return jsonify({"message": "Patient not found"}), 404
-
-        # Create a Patient object to use its checkout_patient method
-        # Note: This re-initializes the patient, but we only need the method
-        # A more robust solution might involve a dedicated DB method for checkout
-        patient_obj = Patient(
-            name=patient_data["name"],
-            age=patient_data["age"],
-            gender=patient_data["gender"],
-            ward=patient_data["ward"],
-            room=patient_data["room"]
-        )
-        patient_obj.checkout_patient() # This updates the object's checkout time
-
-        rows_affected = self.patient_db.update_patient(id, {"checkout": patient_obj.checkout})
-        if rows_affected is not None and rows_affected > 0:
-            return jsonify({"message": "Patient checked out successfully", "checkout_time": patient_obj.checkout}), 200
-        return jsonify({"message": "Failed to checkout patient"}), 500
+        expected_version, reply = handlers.parse_if_match(request)
+        if reply:
+            return reply
+        try:
+            patient = self.patient_db.checkout_patient(id, expected_version)
+        except VersionConflictError as e:
+            return handlers.version_conflict_reply(e)
+        except SQLAlchemyError:
+            return handlers.message_reply("Failed to checkout patient", 500)
+        return handlers.checked_out_reply(patient)
 
     def assign_doctor(self, id):
         """
         Assigns a doctor to a patient.
         Expects a JSON body with 'doctor_name'.
         """
-        request_body = request.get_json()
-        if not request_body or "doctor_name" not in request_body:
-            return jsonify({"message": "Missing required field: doctor_name"}), 400
-
-        doctor_name = request_body["doctor_name"]
+        update_data, reply = handlers.parse_doctor_assignment(request.get_json())
+        if reply:
+            return reply
+        return self._update_patient_response(id, update_data, "Error assigning doctor")
 
+    def _update_patient_response(self, id, update_data, error_message):
+        """
+        Applies an update and returns the updated patient, using a single
+        UPDATE ... RETURNING round-trip to the database. With 'If-Match', the
+        update is a compare-and-set on the patient's version.
+        """
+        expected_version, reply = handlers.parse_if_match(request)
+        if reply:
+            return reply
         try:
-            Doctor(doctor_name) # Validate doctor name
-        except ValueError as e:
-            return jsonify({"message": str(e)}), 400
-
-        rows_affected = self.patient_db.update_patient(id, {"doctor_name": doctor_name})
+            updated_patient = self.patient_db.update_patient_returning(
+                id, update_data, expected_version
+            )
+        except VersionConflictError as e:
+            return handlers.version_conflict_reply(e)
+        except SQLAlchemyError:
+            return handlers.message_reply(error_message, 500)
+        return handlers.updated_reply(updated_patient)
 
-        if rows_affected is not None and rows_affected > 0:
-            updated_patient = self.patient_db.select_patient(id)
-            return jsonify(updated_patient), 200
-        elif self.patient_db.select_patient(id) is None:
-            return jsonify({"message": "Patient not found"}), 404
-        return jsonify({"message": "Error assigning doctor"}), 500
-    def run(self):
+    def run(self, host: Optional[str] = None, port: int = 5001, debug: bool = False):
         """
-        Runs the Flask application.
+        Runs the Flask development server; serve.py is the production entry point.
+        Args:
+            host: The interface to listen on; by default every interface, or
+                only localhost in debug mode.
+            port: The port to listen on.
+            debug: Enables the reloader and the Werkzeug debugger, which runs
+                arbitrary code for anyone who can reach it.
         """
-        # WARNING: debug=True is not suitable for production environments.
-        # In a production deployment, this should be set to False.
-        self.app.run(host="0.0.0.0", port=5001, debug=True)
+        if host is None:
+            host = "127.0.0.1" if debug else "0.0.0.0"
+        self.app.run(host=host, port=port, debug=debug)
+
+
+def create_app(config: Optional[Mapping[str, Any]] = None) -> Flask:
+    """
+    Creates the WSGI application. Importing this module has no side effect:
+    the database is only connected, and its schema set up, here.
+    Args:
+        config: Settings overriding APP_CONFIG_DEFAULTS (see config.py).
+    """
+    return PatientAPIController(config).app
 
 
 if __name__ == "__main__":
     app = PatientAPIController()
-    app.run()
+    app.run(debug=os.environ.get("PATIENT_API_DEBUG", "false").lower() == "true")
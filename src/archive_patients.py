@@ -0,0 +1,44 @@
+# Archiver: moves the patients checked out long ago from the patients table
+# to patients_archive, so listings, searches and scans of the live table stay
+# fast as the history grows. Run it from cron, or as a sidecar with --every:
+#
+#   cd src
+#   python archive_patients.py --older-than-days 30
+#   python archive_patients.py --every 3600
+#
+# Patients are moved in small transactions (--batch-size), so the API keeps
+# serving writes while it runs. Each archived patient is logged as an
+# 'archive' change; API processes started with PATIENT_SYNC_CHANGES drop it
+# from their cache and refresh their listing ETags from that log.
+
+import argparse
+import time
+
+from patient_db import PatientDB
+from config import ARCHIVE_AFTER_DAYS, ARCHIVE_BATCH_SIZE, ARCHIVE_BATCH_PAUSE_SECONDS
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Archive the patients checked out long ago.")
+    parser.add_argument(
+        "--older-than-days", type=float, default=ARCHIVE_AFTER_DAYS,
+        help="archive the patients checked out more than this many days ago",
+    )
+    parser.add_argument("--batch-size", type=int, default=ARCHIVE_BATCH_SIZE, help="patients moved per transaction")
+    parser.add_argument(
+        "--pause", type=float, default=ARCHIVE_BATCH_PAUSE_SECONDS, help="seconds to wait between batches"
+    )
+    parser.add_argument("--every", type=float, help="keep running, archiving every this many seconds")
+    args = parser.parse_args()
+
+    patient_db = PatientDB()
+    while True:
+        archived = patient_db.archive_checked_out(args.older_than_days, args.batch_size, args.pause)
+        print(f"Archived {archived} patients checked out more than {args.older_than_days:g} days ago")
+        if args.every is None:
+            break
+        time.sleep(args.every)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,534 @@
+# Async Patient API Controller
+#
+# An ASGI twin of PatientAPIController built on Quart and AsyncPatientDB.
+# It serves the same routes with the same validation and response shapes;
+# the route table and the handler logic (patient_handlers.py) are shared
+# with the Flask controller.
+# Run it with an ASGI server, e.g.:
+#   hypercorn "async_api_controller:create_async_app()" --bind 0.0.0.0:5002
+
+import asyncio
+import time
+from typing import Any, Mapping, Optional
+from quart import Quart, g, make_response, request
+from quart.wrappers.response import IterableBody
+from quart_cors import cors
+from sqlalchemy.exc import SQLAlchemyError
+from async_patient_db import AsyncPatientDB
+from patient_db import VersionConflictError
+from occupancy import OccupancyIndex
+from patient_routes import ROUTES, NDJSON_MIMETYPE
+from admission import AsyncAdmissionGate
+from change_feed import SSE_MIMETYPE
+from json_provider import select_json_provider
+from patient_export import EXPORT_FORMATS, ExportEncoder
+import patient_handlers as handlers
+from config import (
+    EXPORT_CHUNK_ROWS,
+    APP_CONFIG_DEFAULTS,
+    CHANGE_SYNC_INTERVAL_SECONDS,
+)
+
+
+class _AdmittedBody(IterableBody):
+    """A streamed response body that releases its admission slot once sent."""
+
+    def __init__(self, body: IterableBody, release) -> None:
+        self.body = body
+        self.release = release
+
+    async def __aenter__(self):
+        await self.body.__aenter__()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, tb) -> None:
+        try:
+            await self.body.__aexit__(exc_type, exc_value, tb)
+        finally:
+            self.release()
+
+    def __aiter__(self):
+        return self.body.__aiter__()
+
+
+class AsyncPatientAPIController:
+    def __init__(self, config: Optional[Mapping[str, Any]] = None):
+        """
+        Builds the application. The database is connected when it starts serving.
+        Args:
+            config: Settings overriding APP_CONFIG_DEFAULTS (see config.py).
+        """
+        self.app = cors(Quart(__name__))  # Enable CORS for all routes
+        self.app.config.from_mapping(APP_CONFIG_DEFAULTS)
+        if config:
+            self.app.config.from_mapping(config)
+        settings = self.app.config
+        self.app.json = select_json_provider(settings["JSON_PROVIDER"])(self.app)
+        self.occupancy = OccupancyIndex()
+        self.patient_db = AsyncPatientDB(
+            cache=handlers.build_cache(settings),
+            occupancy=self.occupancy,
+            storage=handlers.build_storage(settings),
+        )
+        self._sync_changes = settings["PATIENT_SYNC_CHANGES"]
+        self.admission_gates = handlers.build_admission_gates(settings, AsyncAdmissionGate)
+        self._sync_task = None
+        self.app.before_serving(self._start_serving)
+        self.app.after_serving(self._stop_serving)
+        self.setup_routes()
+
+    async def _start_serving(self):
+        await self.patient_db.load_occupancy()
+        if self._sync_changes:
+            self._sync_task = asyncio.create_task(self._follow_changes())
+
+    async def _stop_serving(self):
+        if self._sync_task is not None:
+            self._sync_task.cancel()
+            self._sync_task = None
+        await self.patient_db.dispose()
+        handlers.close_admission_gates(self.admission_gates)
+
+    async def _follow_changes(self):
+        """
+        Replays the writes of the other processes serving the database into
+        the cache, occupancy index and table version of this one.
+        """
+        while True:
+            await asyncio.sleep(CHANGE_SYNC_INTERVAL_SECONDS)
+            await self.patient_db.sync_changes()
+
+    def setup_routes(self):
+
+        # Sets up the routes for the API endpoints.
+        # The route table and the handler logic are shared with the Flask controller.
+
+        for rule, methods, handler in ROUTES:
+            self.app.route(rule, methods=methods)(getattr(self, handler))
+        self.app.before_request(self._start_request_timer)
+        self.app.after_request(self._record_request)
+        if self.admission_gates is not None:
+            self.app.before_request(self._admit_request)
+            self.app.after_request(self._hold_admission_for_stream)
+            self.app.teardown_request(self._release_admission)
+
+    async def _start_request_timer(self):
+        g.request_started = time.perf_counter()
+
+    async def _admit_request(self):
+        """
+        Admits a request through the read or write gate of its route, in its
+        priority lane; over budget, answers 503 at once with Retry-After.
+        """
+        admission = handlers.request_admission(self.admission_gates, request)
+        if admission is None:
+            return None
+        gate, priority = admission
+        if not await gate.acquire(priority):
+            return handlers.busy_reply()
+        g.admission_gate = gate
+        return None
+
+    async def _release_admission(self, error=None):
+        gate = g.pop("admission_gate", None)
+        if gate is not None:
+            gate.release()
+
+    async def _hold_admission_for_stream(self, response):
+        # A streamed body is generated after the request teardown: keep the
+        # slot until the server has sent it, or the client went away.
+        if isinstance(response.response, IterableBody):
+            gate = g.pop("admission_gate", None)
+            if gate is not None:
+                response.response = _AdmittedBody(response.response, gate.release)
+        return response
+
+    async def _record_request(self, response):
+        handlers.record_request(request, response.status_code, g.pop("request_started", None))
+        return response
+
+    async def index(self):
+        """
+        Provides a welcome message for the root endpoint.
+        """
+        return handlers.index_reply()
+
+    async def get_patients(self):
+        """
+        Retrieves a list of all patients.
+        Supports keyset pagination with the 'limit' and 'cursor' query
+        parameters, and streams the whole table as NDJSON when requested
+        with '?format=ndjson' or an 'Accept: application/x-ndjson' header.
+        Filters: 'ward', 'room', 'doctor_name', 'gender', 'active=true|false'
+        (still admitted or checked out), 'min_age', 'max_age' and the
+        ISO-8601 ranges 'checkin_from'/'checkin_to' and 'checkout_from'/'checkout_to'.
+        Archived patients are only listed with 'include_archived=true'.
+        Responses carry an ETag derived from the table version; a matching
+        'If-None-Match' is answered with 304 without querying the database.
+        """
+        listing, reply = handlers.parse_listing(request)
+        if reply:
+            return reply
+        table_version = await self.patient_db.table_version()
+        headers, reply = handlers.listing_headers(request, listing, table_version)
+        if reply:
+            return reply
+
+        filters = listing["filters"]
+        if listing["ndjson"]:
+            headers["Content-Type"] = NDJSON_MIMETYPE
+            return self._stream_patients_ndjson(filters), 200, headers
+        if listing["limit"] is None:
+            result = await self.patient_db.select_all_patients(filters, as_records=True)
+        else:
+            result = await self.patient_db.select_patients_page(
+                listing["limit"], listing["cursor"], filters, as_records=True
+            )
+        return handlers.listing_reply(result, headers)
+
+    async def _stream_patients_ndjson(self, filters):
+        """
+        Yields every patient as one JSON document per line.
+        """
+        async for patient in self.patient_db.iter_patients(filters=filters, as_records=True):
+            yield (self.app.json.dumps(patient) + "\n").encode()
+
+    async def export_patients(self):
+        """
+        Exports every patient, or those matching the GET /patients filters,
+        as CSV or NDJSON ('?format=csv|ndjson', NDJSON by default). The rows
+        are read through a server-side cursor and encoded a chunk at a time,
+        so the export streams in constant memory whatever the table size. It
+        is gzip-compressed when the client sends 'Accept-Encoding: gzip'.
+        """
+        export, reply = handlers.parse_export(request)
+        if reply:
+            return reply
+        encoder = ExportEncoder(export["format"], self.app.json.dumps, export["compress"])
+        headers = handlers.export_headers(export)
+        headers["Content-Type"] = EXPORT_FORMATS[export["format"]]
+        response = await make_response(
+            self._stream_export(encoder, export["filters"]), 200, headers
+        )
+        response.timeout = None  # a large export outlives the default response timeout
+        return response
+
+    async def _stream_export(self, encoder, filters):
+        """
+        Yields the encoded chunks of an export.
+        """
+        yield encoder.header()
+        async for rows in self.patient_db.iter_patient_chunks(EXPORT_CHUNK_ROWS, filters):
+            yield encoder.encode(rows)
+        yield encoder.finish()
+
+    async def get_metrics(self):
+        """
+        Exports the request, database and cache metrics in the Prometheus text format.
+        """
+        return handlers.metrics_reply()
+
+    async def get_doctors(self):
+        """
+        Retrieves the list of available doctors.
+        """
+        return handlers.doctors_reply()
+
+    async def get_doctor_stats(self):
+        """
+        Retrieves the number of admitted and checked-out patients of every
+        doctor, read from counters maintained by the writes.
+        """
+        return handlers.doctor_stats_reply(await self.patient_db.doctor_stats())
+
+    async def get_wards(self):
+        """
+        Retrieves the occupancy of every ward.
+        Served from the occupancy index, without querying the database.
+        """
+        return handlers.wards_reply(self.occupancy)
+
+    async def get_ward_stats(self):
+        """
+        Retrieves the number of admitted and checked-out patients of every
+        ward, read from counters maintained by the writes.
+        """
+        return handlers.ward_stats_reply(await self.patient_db.ward_stats())
+
+    async def get_ward_rooms(self, ward):
+        """
+        Retrieves the rooms of a ward with their number of admitted patients.
+        Use '?free=true' to only list the free rooms.
+        """
+        return handlers.ward_rooms_reply(self.occupancy, ward, request)
+
+    async def get_patient(self, id):
+        """
+        Retrieves a single patient by their ID; archived patients are only
+        found with '?include_archived=true'.
+        The ETag is the patient's version; a matching 'If-None-Match' is
+        answered with 304 without serializing the patient.
+        """
+        include_archived = handlers.is_flag_set(request.args, "include_archived")
+        patient = await self.patient_db.select_patient(id, include_archived)
+        return handlers.patient_reply(request, patient)
+
+    async def create_patient(self):
+        """
+        Creates a new patient.
+        Expects a JSON body with 'name', 'gender', 'age', 'ward', 'room' and 'doctor_name'.
+        """
+        patient_data, reply = handlers.parse_new_patient(await request.get_json())
+        if reply:
+            return reply
+        inserted_id = await self.patient_db.insert_patient(patient_data)
+        return handlers.created_reply(patient_data, inserted_id)
+
+    async def create_patients_bulk(self):
+        """
+        Creates many patients in one request.
+        Expects either a JSON array of patient objects or, with the
+        'application/x-ndjson' content type, one patient object per line.
+        """
+        if request.mimetype == NDJSON_MIMETYPE:
+            items = self._iter_ndjson_body()
+        else:
+            request_body, reply = handlers.parse_bulk_body(await request.get_json(silent=True))
+            if reply:
+                return reply
+            items = self._iter_list(request_body)
+
+        creation = handlers.BulkCreation()
+        async for item in items:
+            if creation.add(item):
+                await self._insert_bulk_chunk(creation)
+        await self._insert_bulk_chunk(creation)
+        return creation.reply()
+
+    @staticmethod
+    async def _iter_list(items):
+        """
+        Iterates over a decoded JSON array asynchronously.
+        """
+        for item in items:
+            yield item
+
+    async def _iter_ndjson_body(self):
+        """
+        Yields the decoded objects of an NDJSON request body, line by line.
+        Lines that are not valid JSON are yielded as the ValueError raised.
+        """
+        pending = b""
+        async for data in request.body:
+            pending += data
+            *lines, pending = pending.split(b"\n")
+            for line in lines:
+                if line.strip():
+                    yield handlers.decode_ndjson_line(self.app.json.loads, line)
+        if pending.strip():
+            yield handlers.decode_ndjson_line(self.app.json.loads, pending)
+
+    async def _insert_bulk_chunk(self, creation):
+        """
+        Validates the pending items of a bulk creation in a single batch and
+        inserts the valid patients.
+        """
+        chunk = creation.take_chunk()
+        if chunk:
+            creation.inserted(await self.patient_db.insert_patients(chunk))
+
+    async def update_patients_batch(self):
+        """
+        Updates many patients in one transaction.
+        Expects a JSON array of objects, each with the 'id' of a patient, the
+        fields to update and optionally the 'version' the patient must still
+        be at. Invalid items are reported without aborting the others.
+        """
+        batch, reply = handlers.parse_batch_update(await request.get_json(silent=True))
+        if reply:
+            return reply
+        patients, conflicts = [], {}
+        if batch["updates"]:
+            try:
+                patients, conflicts = await self.patient_db.update_patients_returning(
+                    batch["updates"], batch["expected_versions"]
+                )
+            except SQLAlchemyError:
+                return handlers.message_reply("Failed to update patients", 500)
+        return handlers.batch_update_reply(batch, patients, conflicts)
+
+    async def checkout_patients_batch(self):
+        """
+        Checks many patients out in one transaction.
+        Expects a JSON body with the 'ids' of the patients.
+        """
+        patient_ids, reply = handlers.parse_checkout_batch(await request.get_json(silent=True))
+        if reply:
+            return reply
+        try:
+            patients = await self.patient_db.checkout_patients(patient_ids)
+        except SQLAlchemyError:
+            return handlers.message_reply("Failed to checkout patients", 500)
+        return handlers.checkout_batch_reply(patient_ids, patients)
+
+    async def transfer_ward(self, ward):
+        """
+        Moves the admitted patients of a ward to another ward in one transaction.
+        Expects a JSON body with the destination 'ward' and either a 'room'
+        for every patient or a 'rooms' object mapping the rooms of this ward
+        to rooms of the destination; 'ids' restricts the transfer to some
+        patients.
+        """
+        params, reply = handlers.parse_transfer(
+            self.occupancy, ward, await request.get_json(silent=True)
+        )
+        if reply:
+            return reply
+        try:
+            patients = await self.patient_db.transfer_ward(ward, **params)
+        except SQLAlchemyError:
+            return handlers.message_reply("Failed to transfer patients", 500)
+        return handlers.transfer_reply(params, patients)
+
+    async def update_patient(self, id):
+        """
+        Updates an existing patient.
+        Expects a JSON body with fields to update (e.g., 'name', 'age', 'gender').
+        """
+        update_data, reply = handlers.parse_patient_update(await request.get_json())
+        if reply:
+            return reply
+        return await self._update_patient_response(id, update_data, "Error updating patient")
+
+    async def delete_patient(self, id):
+        """
+        Deletes a patient. With 'If-Match', only if the patient is still at
+        that version.
+        """
+        expected_version, reply = handlers.parse_if_match(request)
+        if reply:
+            return reply
+        try:
+            rows_affected = await self.patient_db.delete_patient(id, expected_version)
+        except VersionConflictError as e:
+            return handlers.version_conflict_reply(e)
+        return handlers.deleted_reply(rows_affected)
+
+    async def search_patients_by_name(self):
+        """
+        Searches for patients by name, best matches first.
+        Use '?prefix=true' for autocomplete and 'limit' to cap the results;
+        '?include_archived=true' lists the archived matches after the live ones.
+        """
+        params, reply = handlers.parse_search(request)
+        if reply:
+            return reply
+        return handlers.search_reply(await self.patient_db.search_patients_by_name(**params))
+
+    async def get_patient_changes(self):
+        """
+        Retrieves the patient writes logged after '?since=<seq>', oldest first,
+        as {"changes": [...], "next_since": <seq>}; pass next_since back to get
+        the following ones. With '?wait=<seconds>' the request long-polls until
+        a change is logged. With 'Accept: text/event-stream' (or '?format=sse')
+        the changes are streamed as Server-Sent Events instead.
+        """
+        params, reply = handlers.parse_changes(request)
+        if reply:
+            return reply
+
+        if handlers.wants_sse(request):
+            stream = handlers.ChangeStream(params["since"], params["limit"], self.app.json.dumps)
+            response = await make_response(
+                self._stream_changes_sse(stream),
+                200,
+                {"Content-Type": SSE_MIMETYPE, "Cache-Control": "no-cache"},
+            )
+            response.timeout = None  # the stream ends on its own, after CHANGE_FEED_STREAM_SECONDS
+            return response
+
+        changes = await self.patient_db.wait_for_changes(
+            params["since"], params["limit"], params["wait"]
+        )
+        return handlers.changes_reply(params, changes)
+
+    async def _stream_changes_sse(self, stream):
+        """
+        Yields the changes of a change stream as Server-Sent Events, with a
+        keep-alive comment whenever none arrives for a while, until the
+        stream ends (or on a database error).
+        """
+        yield stream.opening().encode()
+        while (wait := stream.next_wait()) is not None:
+            changes = await self.patient_db.wait_for_changes(stream.since, stream.limit, wait)
+            if changes is None:
+                return
+            for event in stream.events(changes):
+                yield event.encode()
+
+    async def set_patient_room(self, id):
+        """
+        Assigns a patient to a ward and room.
+        Expects a JSON body with 'ward' and 'room'.
+        """
+        update_data, reply = handlers.parse_room_assignment(await request.get_json())
+        if reply:
+            return reply
+        return await self._update_patient_response(id, update_data, "Error updating patient's room")
+
+    async def checkout_patient_api(self, id):
+        """
+        Sets the checkout time for a patient.
+        """
+        expected_version, reply = handlers.parse_if_match(request)
+        if reply:
+            return reply
+        try:
+            patient = await self.patient_db.checkout_patient(id, expected_version)
+        except VersionConflictError as e:
+            return handlers.version_conflict_reply(e)
+        except SQLAlchemyError:
+            return handlers.message_reply("Failed to checkout patient", 500)
+        return handlers.checked_out_reply(patient)
+
+    async def assign_doctor(self, id):
+        """
+        Assigns a doctor to a patient.
+        Expects a JSON body with 'doctor_name'.
+        """
+        update_data, reply = handlers.parse_doctor_assignment(await request.get_json())
+        if reply:
+            return reply
+        return await self._update_patient_response(id, update_data, "Error assigning doctor")
+
+    async def _update_patient_response(self, id, update_data, error_message):
+        """
+        Applies an update and returns the updated patient, using a single
+        UPDATE ... RETURNING round-trip to the database. With 'If-Match', the
+        update is a compare-and-set on the patient's version.
+        """
+        expected_version, reply = handlers.parse_if_match(request)
+        if reply:
+            return reply
+        try:
+            updated_patient = await self.patient_db.update_patient_returning(
+                id, update_data, expected_version
+            )
+        except VersionConflictError as e:
+            return handlers.version_conflict_reply(e)
+        except SQLAlchemyError:
+            return handlers.message_reply(error_message, 500)
+        return handlers.updated_reply(updated_patient)
+
+
+def create_async_app(config: Optional[Mapping[str, Any]] = None):
+    """
+    Creates the ASGI application of the async controller.
+    Args:
+        config: Settings overriding APP_CONFIG_DEFAULTS (see config.py).
+    """
+    return AsyncPatientAPIController(config).app
+
+
+if __name__ == "__main__":
+    AsyncPatientAPIController().app.run(host="0.0.0.0", port=5002)
@@ -0,0 +1,678 @@
+import asyncio
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple, Union
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy import select, insert, Table
+from patient_db_config import (
+    PATIENTS_TABLE,
+    PATIENTS_ARCHIVE_TABLE,
+    PATIENT_CHANGES_TABLE,
+    WARD_STATS_TABLE,
+    DOCTOR_STATS_TABLE,
+    WARD_COLUMN,
+    DOCTOR_NAME_COLUMN,
+    Storage,
+)
+from patient_db import PatientDBBase, VersionConflictError
+from patient_cache import CacheBackend
+from metrics import record_db_error
+from patient_record import PatientRecord
+from occupancy import OccupancyIndex
+from change_feed import CHANGE_INSERT, CHANGE_UPDATE, CHANGE_DELETE, CHANGE_ARCHIVE
+from config import (
+    CHANGE_FEED_POLL_SECONDS,
+    ARCHIVE_AFTER_DAYS,
+    ARCHIVE_BATCH_SIZE,
+    ARCHIVE_BATCH_PAUSE_SECONDS,
+)
+
+
+class AsyncPatientDB(PatientDBBase):
+    """
+    The asyncio counterpart of PatientDB, built on SQLAlchemy's asyncio
+    extension. Queries and the bookkeeping of writes come from the same
+    PatientDBBase, so both classes return identical results.
+    """
+
+    def __init__(
+        self,
+        cache: Optional[CacheBackend] = None,
+        occupancy: Optional[OccupancyIndex] = None,
+        storage: Optional[Storage] = None,
+    ) -> None:
+        """
+        Initializes the database accessor.
+        Args:
+            cache: An optional cache in front of select_patient. Every write
+                method invalidates the records it touches.
+            occupancy: An optional ward/room occupancy index, updated by every
+                write method. Call load_occupancy() to fill it.
+            storage: The database to use; defaults to the PATIENT_DB_URL
+                profile. Its engines are created, and the schema set up, on
+                first use.
+        """
+        super().__init__(cache, occupancy, storage)
+
+    @property
+    def engine(self):
+        return self.storage.async_engine
+
+    @property
+    def read_engine(self):
+        return self.storage.async_read_engine
+
+    async def _log_writes(
+        self, conn: Any, operation: str, patients: List[Dict[str, Any]]
+    ) -> int:
+        """
+        Appends a write to the change log and bumps the table version, inside
+        the transaction of the write.
+        Returns:
+            The new table version.
+        """
+        await conn.execute(
+            insert(PATIENT_CHANGES_TABLE), self._change_rows(operation, patients)
+        )
+        bump = await conn.execute(self._bump_table_version_statement())
+        return bump.scalar()
+
+    async def table_version(self) -> Optional[int]:
+        """
+        Returns the version of the patients table, bumped by every write.
+        It is read from the database once, then kept up to date in memory by
+        the write methods.
+        Returns:
+            The table version, or None on error.
+        """
+        if self._table_version is None:
+            await self._load_table_version()
+        return self._table_version
+
+    async def _load_table_version(self) -> None:
+        """Reads the table version from the database."""
+        try:
+            async with self.read_engine.connect() as conn:
+                result = await conn.execute(self._table_version_statement())
+                self._record_table_version(result.scalar_one())
+        except SQLAlchemyError as e:
+            record_db_error("table_version", e)
+
+    async def dispose(self) -> None:
+        """Closes every pooled connection."""
+        await self.storage.dispose_async()
+
+    async def insert_patient(self, patient_data: Dict[str, Any]) -> Optional[str]:
+        """
+        Inserts a new patient record into the database.
+        Args:
+            patient_data: A dictionary containing the patient's information.
+        Returns:
+            The primary key of the inserted patient, or None if an error occurs.
+        """
+        try:
+            async with self.engine.begin() as conn:
+                stmt = insert(PATIENTS_TABLE).values(**patient_data)
+                result = await conn.execute(stmt)
+                table_version = await self._log_writes(conn, CHANGE_INSERT, [patient_data])
+            self._after_write(patient_data["id"], patient_data, table_version)
+            if result.inserted_primary_key:
+                return str(result.inserted_primary_key[0])
+            return None
+        except SQLAlchemyError as e:
+            record_db_error("insert_patient", e)
+            return None
+
+    async def insert_patients(
+        self, patients_data: List[Dict[str, Any]]
+    ) -> List[Optional[str]]:
+        """
+        Inserts many patient records in a single transaction.
+        If the batch insert fails, each record is retried on its own.
+        Args:
+            patients_data: A list of dictionaries containing the patients' information.
+        Returns:
+            The primary key of each inserted patient, in input order, with None
+            for the records that could not be inserted.
+        """
+        if not patients_data:
+            return []
+        try:
+            async with self.engine.begin() as conn:
+                await conn.execute(insert(PATIENTS_TABLE), patients_data)
+                table_version = await self._log_writes(conn, CHANGE_INSERT, patients_data)
+            self._after_writes(patients_data, table_version)
+            return [str(patient_data["id"]) for patient_data in patients_data]
+        except SQLAlchemyError as e:
+            record_db_error("insert_patients", e)
+        return [await self.insert_patient(patient_data) for patient_data in patients_data]
+
+    async def load_occupancy(self) -> bool:
+        """
+        Fills the occupancy index from the admitted patients.
+        Returns:
+            True if the index was loaded, False if disabled or on error.
+        """
+        if self.occupancy is None:
+            return False
+        try:
+            async with self.read_engine.connect() as conn:
+                # Both reads see the same snapshot, so sync_changes() resumes
+                # exactly after the writes the index reflects.
+                last_change = await conn.execute(self._last_change_statement())
+                change_seq = last_change.scalar_one()
+                result = await conn.execute(self._admitted_statement())
+                self.occupancy.load(self._row_to_dict(row) for row in result)
+                self._change_seq = change_seq
+                return True
+        except SQLAlchemyError as e:
+            record_db_error("load_occupancy", e)
+            return False
+
+    async def sync_changes(self, batch_size: int = 1000) -> int:
+        """
+        Applies the writes logged since the last sync to the cache, the
+        occupancy index and the table version; see PatientDB.sync_changes.
+        Args:
+            batch_size: The number of changes read per query.
+        Returns:
+            The number of changes applied.
+        """
+        applied = 0
+        try:
+            if self._change_seq is None:
+                async with self.read_engine.connect() as conn:
+                    last_change = await conn.execute(self._last_change_statement())
+                    self._change_seq = last_change.scalar_one()
+            while True:
+                async with self.read_engine.connect() as conn:
+                    result = await conn.execute(
+                        self._changes_statement(self._change_seq, batch_size)
+                    )
+                    changes = result.fetchall()
+                self._apply_changes(changes)
+                applied += len(changes)
+                if len(changes) < batch_size:
+                    break
+        except SQLAlchemyError as e:
+            record_db_error("sync_changes", e)
+        if applied:
+            await self._load_table_version()
+            self.change_notifier.notify()
+        return applied
+
+    async def select_all_patients(
+        self, filters: Optional[Dict[str, Any]] = None, as_records: bool = False
+    ) -> Optional[List[Union[Dict[str, Any], PatientRecord]]]:
+        """
+        Retrieves all patient records from the database.
+        Args:
+            filters: Optional GET /patients filters restricting the records.
+            as_records: If True, return compact PatientRecord objects.
+        Returns:
+            A list of patient records, or None on error.
+        """
+        try:
+            async with self.read_engine.connect() as conn:
+                result = await conn.execute(self._filtered_statement(filters))
+                convert = self._row_converter(as_records)
+                return [convert(row) for row in result]
+        except SQLAlchemyError as e:
+            record_db_error("select_all_patients", e)
+            return None
+
+    async def select_patients_page(
+        self,
+        limit: int,
+        cursor: Optional[str] = None,
+        filters: Optional[Dict[str, Any]] = None,
+        as_records: bool = False,
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Retrieves one page of patient records using keyset pagination on the id.
+        Args:
+            limit: The maximum number of patients to return.
+            cursor: The id of the last patient of the previous page, if any.
+            filters: Optional GET /patients filters restricting the records.
+            as_records: If True, the page holds PatientRecord objects.
+        Returns:
+            A dictionary with the 'patients' of the page and the 'next_cursor',
+            or None on error.
+        """
+        try:
+            async with self.read_engine.connect() as conn:
+                stmt = self._page_statement(limit, cursor, filters)
+                result = await conn.execute(stmt)
+                return self._page_from_rows(result.fetchall(), limit, as_records)
+        except SQLAlchemyError as e:
+            record_db_error("select_patients_page", e)
+            return None
+
+    async def iter_patients(
+        self,
+        batch_size: int = 500,
+        filters: Optional[Dict[str, Any]] = None,
+        as_records: bool = False,
+    ) -> AsyncIterator[Union[Dict[str, Any], PatientRecord]]:
+        """
+        Lazily yields all patient records, ordered by id, streaming them from
+        the database cursor.
+        Args:
+            batch_size: The number of rows fetched from the cursor at a time.
+            filters: Optional GET /patients filters restricting the records.
+            as_records: If True, yield PatientRecord objects.
+        Yields:
+            Each patient record.
+        """
+        convert = self._row_converter(as_records)
+        try:
+            async with self.read_engine.connect() as conn:
+                stmt = self._filtered_statement(filters)
+                stmt = stmt.order_by(stmt.selected_columns.id)
+                result = await conn.stream(
+                    stmt, execution_options={"yield_per": batch_size}
+                )
+                async for row in result:
+                    yield convert(row)
+        except SQLAlchemyError as e:
+            record_db_error("iter_patients", e)
+
+    async def iter_patient_chunks(
+        self, chunk_size: int, filters: Optional[Dict[str, Any]] = None
+    ) -> AsyncIterator[List[Any]]:
+        """
+        Lazily yields all patient rows, ordered by id, in chunks read through
+        a server-side cursor, from one consistent snapshot.
+        Args:
+            chunk_size: The number of rows per chunk.
+            filters: Optional GET /patients filters restricting the records.
+        Yields:
+            Lists of rows with all PATIENTS_TABLE columns, in column order.
+        """
+        try:
+            async with self.read_engine.connect() as conn:
+                stmt = self._filtered_statement(filters)
+                stmt = stmt.order_by(stmt.selected_columns.id)
+                result = await conn.stream(
+                    stmt, execution_options={"yield_per": chunk_size}
+                )
+                async for rows in result.partitions():
+                    yield rows
+        except SQLAlchemyError as e:
+            record_db_error("iter_patient_chunks", e)
+
+    async def search_patients_by_name(
+        self,
+        name: str,
+        prefix: bool = False,
+        limit: Optional[int] = None,
+        include_archived: bool = False,
+    ) -> Optional[List[Dict[str, Any]]]:
+        """
+        Searches for patients by name (case-insensitive), best matches first.
+        Args:
+            name: The name to search for.
+            prefix: If True, only match names (or words of names) starting with the term.
+            limit: The maximum number of results to return, if any.
+            include_archived: If True, archived patients are listed after the
+                live ones, up to the limit.
+        Returns:
+            A list of matching patient records, or None on error.
+        """
+        try:
+            async with self.read_engine.connect() as conn:
+                stmt = self._search_statement(
+                    name, prefix, limit, self.storage.name_search_enabled
+                )
+                result = await conn.execute(stmt)
+                patients = [self._row_to_dict(row) for row in result]
+                if include_archived and (limit is None or len(patients) < limit):
+                    remaining = None if limit is None else limit - len(patients)
+                    stmt = self._search_statement(name, prefix, remaining, archived=True)
+                    result = await conn.execute(stmt)
+                    patients.extend(self._row_to_dict(row) for row in result)
+                return patients
+        except SQLAlchemyError as e:
+            record_db_error("search_patients_by_name", e)
+            return None
+
+    async def select_patient(
+        self, patient_id: str, include_archived: bool = False
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Retrieves a specific patient record by their ID.
+        Args:
+            patient_id: The ID of the patient to retrieve.
+            include_archived: If True, a patient missing from the live table
+                is looked up in the archive.
+        Returns:
+            A dictionary representing the patient, or None if not found or on error.
+        """
+        if self.cache is not None:
+            patient = self.cache.get(patient_id)
+            if patient is not None:
+                return patient
+            generation = self._cache_generation(patient_id)
+        try:
+            async with self.read_engine.connect() as conn:
+                stmt = select(PATIENTS_TABLE).where(PATIENTS_TABLE.c.id == patient_id)
+                row = (await conn.execute(stmt)).first()
+                if row is None:
+                    if include_archived:
+                        stmt = self._archived_patient_statement(patient_id)
+                        row = (await conn.execute(stmt)).first()
+                    # Archived patients are not cached: the cache holds the live set.
+                    return None if row is None else self._row_to_dict(row)
+                patient = self._row_to_dict(row)
+                if self.cache is not None:
+                    self._cache_fill(patient_id, patient, generation)
+                return patient
+        except SQLAlchemyError as e:
+            record_db_error("select_patient", e)
+            return None
+
+    async def update_patient_returning(
+        self,
+        patient_id: str,
+        update_data: Dict[str, Any],
+        expected_version: Optional[int] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Updates a patient record and returns it in a single statement.
+        Args:
+            patient_id: The ID of the patient to update.
+            update_data: A dictionary with the fields to update.
+            expected_version: If given, only update the patient if it is still
+                at this version (compare-and-set).
+        Returns:
+            A dictionary representing the updated patient, or None if not found.
+        Raises:
+            VersionConflictError: If the patient is at another version.
+            SQLAlchemyError: If the update fails.
+        """
+        table_version = None
+        async with self.engine.begin() as conn:
+            stmt = self._update_returning_statement(
+                patient_id, update_data, expected_version
+            )
+            row = (await conn.execute(stmt)).first()
+            patient = self._row_to_dict(row) if row else None
+            if patient is None:
+                await self._check_version_conflict(conn, patient_id, expected_version)
+            else:
+                table_version = await self._log_writes(conn, CHANGE_UPDATE, [patient])
+        self._after_write(patient_id, patient, table_version)
+        return patient
+
+    async def _check_version_conflict(
+        self, conn: Any, patient_id: str, expected_version: Optional[int]
+    ) -> None:
+        """
+        Explains why a conditional write matched no row: raises if the patient
+        exists at another version, returns if it does not exist.
+        """
+        if expected_version is None:
+            return
+        result = await conn.execute(self._version_statement(patient_id))
+        current_version = result.scalar()
+        if current_version is not None:
+            raise VersionConflictError(patient_id, current_version)
+
+    async def checkout_patient(
+        self, patient_id: str, expected_version: Optional[int] = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Sets the checkout time of a patient to now.
+        Args:
+            patient_id: The ID of the patient to check out.
+            expected_version: If given, only check out the patient if it is
+                still at this version.
+        Returns:
+            A dictionary representing the checked out patient, or None if not found.
+        Raises:
+            VersionConflictError: If the patient is at another version.
+            SQLAlchemyError: If the update fails.
+        """
+        return await self.update_patient_returning(
+            patient_id, self._checkout_values(), expected_version
+        )
+
+    async def update_patients_returning(
+        self,
+        updates: Dict[str, Dict[str, Any]],
+        expected_versions: Optional[Dict[str, int]] = None,
+    ) -> Tuple[List[Dict[str, Any]], Dict[str, int]]:
+        """
+        Updates many patients, each with its own fields, in a single statement
+        and transaction: the batch is logged and committed once.
+        Args:
+            updates: Maps the ID of each patient to the fields to update.
+            expected_versions: Maps some of the patients to the version they
+                must still be at to be updated (compare-and-set).
+        Returns:
+            The updated patients, and the current version of the patients
+            not updated because they are at another version. The patients in
+            neither do not exist.
+        Raises:
+            SQLAlchemyError: If the update fails; no patient is updated.
+        """
+        if not updates:
+            return [], {}
+        table_version = None
+        async with self.engine.begin() as conn:
+            stmt = self._batch_update_statement(updates, expected_versions)
+            patients = [self._row_to_dict(row) for row in await conn.execute(stmt)]
+            conflicts: Dict[str, int] = {}
+            unmatched = self._unmatched_expected(expected_versions, patients)
+            if unmatched:
+                result = await conn.execute(self._versions_statement(unmatched))
+                conflicts = dict(result.all())
+            if patients:
+                table_version = await self._log_writes(conn, CHANGE_UPDATE, patients)
+        self._after_writes(patients, table_version)
+        return patients, conflicts
+
+    async def checkout_patients(self, patient_ids: List[str]) -> List[Dict[str, Any]]:
+        """
+        Checks many patients out now, in a single statement and transaction.
+        Args:
+            patient_ids: The IDs of the patients to check out.
+        Returns:
+            The checked out patients; the missing IDs do not exist.
+        Raises:
+            SQLAlchemyError: If the update fails; no patient is checked out.
+        """
+        checkout_values = self._checkout_values()
+        patients, _ = await self.update_patients_returning(
+            {patient_id: checkout_values for patient_id in patient_ids}
+        )
+        return patients
+
+    async def transfer_ward(
+        self,
+        ward: int,
+        to_ward: int,
+        room: Optional[int] = None,
+        rooms: Optional[Dict[int, int]] = None,
+        patient_ids: Optional[List[str]] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Moves the admitted patients of a ward to another ward in a single
+        statement and transaction.
+        Args:
+            ward: The ward to move the patients out of.
+            to_ward: The ward to move them to.
+            room: The room of to_ward receiving every patient.
+            rooms: Maps rooms of ward to rooms of to_ward, used if room is
+                None; patients in unmapped rooms are not moved.
+            patient_ids: If given, only move these patients.
+        Returns:
+            The moved patients.
+        Raises:
+            SQLAlchemyError: If the update fails; no patient is moved.
+        """
+        table_version = None
+        async with self.engine.begin() as conn:
+            stmt = self._transfer_statement(ward, to_ward, room, rooms, patient_ids)
+            patients = [self._row_to_dict(row) for row in await conn.execute(stmt)]
+            if patients:
+                table_version = await self._log_writes(conn, CHANGE_UPDATE, patients)
+        self._after_writes(patients, table_version)
+        return patients
+
+    async def delete_patient(
+        self, patient_id: str, expected_version: Optional[int] = None
+    ) -> Optional[int]:
+        """
+        Deletes a patient record from the database.
+        Args:
+            patient_id: The ID of the patient to delete.
+            expected_version: If given, only delete the patient if it is still
+                at this version.
+        Returns:
+            The number of rows affected, or None on error.
+        Raises:
+            VersionConflictError: If the patient is at another version.
+        """
+        try:
+            table_version = None
+            async with self.engine.begin() as conn:
+                stmt = self._delete_statement(patient_id, expected_version)
+                row = (await conn.execute(stmt)).first()
+                if row is None:
+                    await self._check_version_conflict(conn, patient_id, expected_version)
+                else:
+                    table_version = await self._log_writes(
+                        conn, CHANGE_DELETE, [self._row_to_dict(row)]
+                    )
+            self._after_write(patient_id, None, table_version)
+            return 0 if row is None else 1
+        except SQLAlchemyError as e:
+            record_db_error("delete_patient", e)
+            return None
+
+    async def archive_patients(
+        self, checked_out_before: str, batch_size: int = ARCHIVE_BATCH_SIZE
+    ) -> Optional[int]:
+        """
+        Moves one batch of patients checked out before a time from the live
+        table to the archive, in one short transaction.
+        Args:
+            checked_out_before: An ISO-8601 UTC timestamp.
+            batch_size: The most patients to move.
+        Returns:
+            The number of patients archived, or None on error.
+        """
+        try:
+            table_version = None
+            async with self.engine.begin() as conn:
+                stmt = self._archive_statement(checked_out_before, batch_size)
+                patients = [self._row_to_dict(row) for row in await conn.execute(stmt)]
+                if patients:
+                    await conn.execute(
+                        insert(PATIENTS_ARCHIVE_TABLE), self._archive_rows(patients)
+                    )
+                    table_version = await self._log_writes(conn, CHANGE_ARCHIVE, patients)
+            self._archived(patients, table_version)
+            return len(patients)
+        except SQLAlchemyError as e:
+            record_db_error("archive_patients", e)
+            return None
+
+    async def archive_checked_out(
+        self,
+        max_age_days: float = ARCHIVE_AFTER_DAYS,
+        batch_size: int = ARCHIVE_BATCH_SIZE,
+        pause: float = ARCHIVE_BATCH_PAUSE_SECONDS,
+    ) -> int:
+        """
+        Archives every patient checked out more than max_age_days ago,
+        batch by batch, releasing the write lock between batches.
+        Args:
+            max_age_days: How long after their checkout patients are archived.
+            batch_size: The number of patients moved per transaction.
+            pause: Seconds to wait between batches.
+        Returns:
+            The number of patients archived.
+        """
+        checked_out_before = self._archive_cutoff(max_age_days)
+        archived = 0
+        while True:
+            moved = await self.archive_patients(checked_out_before, batch_size)
+            if not moved:
+                return archived
+            archived += moved
+            if moved < batch_size:
+                return archived
+            await asyncio.sleep(pause)
+
+    async def ward_stats(self) -> Optional[List[Dict[str, Any]]]:
+        """
+        Retrieves the workload counters of every ward.
+        Returns:
+            One dict per ward, or None on error.
+        """
+        return await self._select_stats("ward_stats", WARD_STATS_TABLE, WARD_COLUMN)
+
+    async def doctor_stats(self) -> Optional[List[Dict[str, Any]]]:
+        """
+        Retrieves the workload counters of every doctor.
+        Returns:
+            One dict per doctor, or None on error.
+        """
+        return await self._select_stats("doctor_stats", DOCTOR_STATS_TABLE, DOCTOR_NAME_COLUMN)
+
+    async def _select_stats(
+        self, operation: str, stats_table: Table, key: str
+    ) -> Optional[List[Dict[str, Any]]]:
+        """Reads a workload counters table; None on error."""
+        try:
+            async with self.read_engine.connect() as conn:
+                stmt = self._stats_statement(stats_table, key, self.storage.stats_enabled)
+                result = await conn.execute(stmt)
+                return [self._row_to_dict(row) for row in result]
+        except SQLAlchemyError as e:
+            record_db_error(operation, e)
+            return None
+
+    async def select_changes(
+        self, since: int = 0, limit: int = 100
+    ) -> Optional[List[Dict[str, Any]]]:
+        """
+        Retrieves the changes logged after a sequence number.
+        Args:
+            since: The seq of the last change already seen (0 for the whole log).
+            limit: The maximum number of changes to return.
+        Returns:
+            The changes, oldest first, or None on error.
+        """
+        try:
+            async with self.read_engine.connect() as conn:
+                result = await conn.execute(self._changes_statement(since, limit))
+                return [self._row_to_dict(row) for row in result]
+        except SQLAlchemyError as e:
+            record_db_error("select_changes", e)
+            return None
+
+    async def wait_for_changes(
+        self, since: int, limit: int, timeout: float
+    ) -> Optional[List[Dict[str, Any]]]:
+        """
+        Long-polls the change log: returns as soon as there are changes after
+        'since', or an empty list once the timeout expires.
+        Args:
+            since: The seq of the last change already seen.
+            limit: The maximum number of changes to return.
+            timeout: The longest time to wait, in seconds.
+        Returns:
+            The changes, oldest first, or None on error.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            generation = self.change_notifier.generation
+            changes = await self.select_changes(since, limit)
+            remaining = deadline - time.monotonic()
+            if changes or changes is None or remaining <= 0:
+                return changes
+            await self.change_notifier.wait_async(
+                generation, min(remaining, CHANGE_FEED_POLL_SECONDS)
+            )
@@ -0,0 +1,157 @@
+# Change feed plumbing shared by PatientDB, AsyncPatientDB and both controllers.
+#
+# The change log itself lives in the patient_changes table; ChangeNotifier
+# only wakes up the requests waiting on it as soon as this process commits a
+# write. Writes made by other processes are picked up by the waiters' periodic
+# re-reads of the log (CHANGE_FEED_POLL_SECONDS), and by ChangeFollower, which
+# replays them into the in-memory state of a multi-process deployment.
+
+import asyncio
+import logging
+import os
+import threading
+import weakref
+from typing import Any, Callable, Dict, Optional, Set, Tuple
+
+logger = logging.getLogger("patient_db")
+
+SSE_MIMETYPE = "text/event-stream"
+
+CHANGE_INSERT = "insert"
+CHANGE_UPDATE = "update"
+CHANGE_DELETE = "delete"
+# A patient moved to the archive table: gone from the live set, still readable
+# with include_archived.
+CHANGE_ARCHIVE = "archive"
+
+
+def _resolve(future: "asyncio.Future[None]") -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+class ChangeNotifier:
+    """
+    A generation counter bumped by every committed write, which threads and
+    coroutines can wait on. Waiters pass the generation they last saw, so a
+    write committed between reading the log and starting to wait is not missed.
+    """
+
+    def __init__(self) -> None:
+        self._condition = threading.Condition()
+        self._generation = 0
+        self._futures: Set[Tuple[asyncio.AbstractEventLoop, "asyncio.Future[None]"]] = set()
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    def notify(self) -> None:
+        """Wakes up every waiter; called after a write is committed."""
+        with self._condition:
+            self._generation += 1
+            self._condition.notify_all()
+            futures = list(self._futures)
+        for loop, future in futures:
+            try:
+                loop.call_soon_threadsafe(_resolve, future)
+            except RuntimeError:  # the waiter's loop is closed
+                pass
+
+    def wait(self, generation: int, timeout: float) -> bool:
+        """
+        Blocks until a write newer than the given generation is committed.
+        Returns:
+            True if woken by a write, False on timeout.
+        """
+        with self._condition:
+            return self._condition.wait_for(lambda: self._generation != generation, timeout)
+
+    async def wait_async(self, generation: int, timeout: float) -> bool:
+        """The asyncio counterpart of wait()."""
+        loop = asyncio.get_running_loop()
+        waiter = (loop, loop.create_future())
+        with self._condition:
+            if self._generation != generation:
+                return True
+            self._futures.add(waiter)
+        try:
+            await asyncio.wait_for(waiter[1], timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            with self._condition:
+                self._futures.discard(waiter)
+
+
+class ChangeFollower:
+    """
+    Calls a sync function (e.g. PatientDB.sync_changes) every interval on a
+    daemon thread, so that a process keeps its in-memory state in line with
+    the writes of the other processes serving the same database. Threads do
+    not survive fork(), so a running follower is restarted in the child.
+    """
+
+    def __init__(self, sync: Callable[[], Any], interval: float) -> None:
+        self.sync = sync
+        self.interval = interval
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        _FOLLOWERS.add(self)
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and not self._stopped.is_set()
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="change-follower", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        self._stopped.set()
+        thread, self._thread = self._thread, None
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout)
+
+    def _run(self) -> None:
+        stopped = self._stopped
+        while not stopped.wait(self.interval):
+            try:
+                self.sync()
+            except Exception:  # keep following; the next round may succeed
+                logger.exception("change sync failed")
+
+    def _restart_after_fork(self) -> None:
+        if self.running:
+            self._thread = None
+            self.start()
+
+
+_FOLLOWERS: "weakref.WeakSet[ChangeFollower]" = weakref.WeakSet()
+
+
+def _restart_followers_after_fork() -> None:
+    for follower in list(_FOLLOWERS):
+        follower._restart_after_fork()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_restart_followers_after_fork)
+
+
+def sse_event(change: Dict[str, Any], dumps: Callable[[Any], str]) -> str:
+    """
+    Formats a change as a Server-Sent Event. Its seq is the event id, which
+    EventSource clients send back as Last-Event-ID when they reconnect.
+    """
+    return f"id: {change['seq']}\nevent: {change['operation']}\ndata: {dumps(change)}\n\n"
+
+
+def sse_comment(text: str, retry_ms: Optional[int] = None) -> str:
+    """Formats an SSE comment (e.g. a keep-alive), optionally setting the reconnection delay."""
+    retry = f"retry: {retry_ms}\n" if retry_ms is not None else ""
+    return f"{retry}: {text}\n\n"
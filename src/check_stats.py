@@ -0,0 +1,43 @@
+# Consistency check of the workload counters behind GET /wards/stats and
+# GET /doctors/stats. The counters are maintained by triggers in the
+# transaction of every write; this tool recounts the patients table from
+# scratch and reports any counter that disagrees:
+#
+#   cd src
+#   python check_stats.py            # exits with status 1 on a mismatch
+#   python check_stats.py --rebuild  # then recomputes every counter
+#
+# The check reads one snapshot, so it can run against a live database. The
+# rebuild holds the write lock for one transaction.
+
+import argparse
+import sys
+
+from patient_db import PatientDB
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Check the ward and doctor workload counters.")
+    parser.add_argument(
+        "--rebuild", action="store_true", help="recompute the counters from the patients table"
+    )
+    args = parser.parse_args()
+
+    patient_db = PatientDB()
+    mismatches = patient_db.check_stats()
+    for mismatch in mismatches:
+        print(
+            f"{mismatch['table']} {mismatch['key']!r}: "
+            f"stored {mismatch['stored']}, counted {mismatch['counted']}"
+        )
+    if not mismatches:
+        print("The workload counters are consistent")
+    if args.rebuild:
+        patient_db.rebuild_stats()
+        print("Rebuilt the workload counters")
+    elif mismatches:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
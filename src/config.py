@@ -5,3 +5,105 @@ GENDERS = ["Male", "Female"]
 WARD_NUMBERS = [1, 2, 3, 4]
 ROOM_NUMBERS = {ward: [f"{ward}{room}" for room in range(10)] for ward in WARD_NUMBERS}
 API_CONTROLLER_URL = "http://127.0.0.1"
+
+# Format of the checkin and checkout timestamps stored for each patient.
+# ISO-8601 in UTC, so that the stored strings sort chronologically.
+TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+# Format used before the ISO-8601 migration, still found in old databases.
+LEGACY_TIMESTAMP_FORMAT = "%d-%m-%Y %H:%M:%S"
+
+# Pagination settings for GET /patients.
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# Number of patients inserted per transaction by POST /patients/bulk.
+BULK_INSERT_CHUNK_SIZE = 500
+
+# Streaming export (GET /patients/export): rows read from the database
+# cursor and encoded per chunk, and the gzip level of compressed exports.
+EXPORT_CHUNK_ROWS = 5000
+EXPORT_GZIP_LEVEL = 6
+
+# Largest number of patients a batch operation (POST /patients/batch/checkout,
+# PATCH /patients/batch, POST /wards/<ward>/transfer) may name. Each batch is
+# applied in a single transaction.
+BATCH_MAX_PATIENTS = 1000
+
+# Archival (PatientDB.archive_checked_out): patients checked out more than
+# ARCHIVE_AFTER_DAYS ago are moved to the patients_archive table, in
+# transactions of ARCHIVE_BATCH_SIZE patients with a pause in between so
+# that writers are never blocked for long.
+ARCHIVE_AFTER_DAYS = 30
+ARCHIVE_BATCH_SIZE = 500
+ARCHIVE_BATCH_PAUSE_SECONDS = 0.05
+
+# Read-through cache in front of GET /patients/<id>.
+PATIENT_CACHE_ENABLED = True
+PATIENT_CACHE_MAX_ENTRIES = 10000
+PATIENT_CACHE_TTL_SECONDS = 30
+
+# JSON encoder of the API responses: "orjson", "stdlib" or "auto" (orjson
+# when installed, the json module otherwise).
+JSON_PROVIDER = "auto"
+
+# Version of a newly created patient record; every update increments it.
+INITIAL_ROW_VERSION = 1
+
+# Change feed (GET /patients/changes): the longest long-poll wait, how often
+# waiters re-read the log for writes made by other processes, the interval
+# of the SSE keep-alive comments, and how long an SSE stream stays open
+# before the client reconnects with Last-Event-ID.
+CHANGE_FEED_MAX_WAIT_SECONDS = 30
+CHANGE_FEED_POLL_SECONDS = 1.0
+CHANGE_FEED_HEARTBEAT_SECONDS = 15
+CHANGE_FEED_STREAM_SECONDS = 300
+
+# Settings of an application built by create_app(config) / create_async_app(config);
+# the config mapping overrides any of them. A PATIENT_DB_URL of None selects
+# the storage profile of patient_db_config.py (the PATIENT_DB_URL environment
+# variable, or patient.db); tests can pass "sqlite://" for a private
+# in-memory database.
+APP_CONFIG_DEFAULTS = {
+    "PATIENT_DB_URL": None,
+    "PATIENT_CACHE_ENABLED": PATIENT_CACHE_ENABLED,
+    "PATIENT_CACHE_MAX_ENTRIES": PATIENT_CACHE_MAX_ENTRIES,
+    "PATIENT_CACHE_TTL_SECONDS": PATIENT_CACHE_TTL_SECONDS,
+    "JSON_PROVIDER": JSON_PROVIDER,
+    # Replay the writes of other processes into this process's cache,
+    # occupancy index and table version; set by serve.py for several workers.
+    "PATIENT_SYNC_CHANGES": False,
+    # Commit the single-patient inserts and updates of concurrent request
+    # threads together (write_queue.GroupCommitQueue; threaded Flask app only).
+    "PATIENT_GROUP_COMMIT": False,
+    # Bound the requests running against the database (admission.py).
+    "PATIENT_ADMISSION_CONTROL": False,
+}
+
+# Admission control (PATIENT_ADMISSION_CONTROL): the requests that may run
+# at once against the database, for reads and for writes, how many more may
+# wait for a slot, and for how long. Requests over budget are answered 503
+# with a Retry-After of ADMISSION_RETRY_AFTER_SECONDS.
+ADMISSION_READ_CONCURRENCY = 16
+ADMISSION_WRITE_CONCURRENCY = 4
+ADMISSION_QUEUE_SIZE = 32
+ADMISSION_QUEUE_TIMEOUT_SECONDS = 0.5
+ADMISSION_RETRY_AFTER_SECONDS = 1
+
+# Group commit (PATIENT_GROUP_COMMIT): the most writes committed in one
+# transaction, and how long the first writer waits for others to join it.
+# The window adds up to that much latency to a write arriving alone.
+GROUP_COMMIT_MAX_BATCH = 64
+GROUP_COMMIT_WINDOW_SECONDS = 0.002
+
+# How often a process replays the writes of the other processes serving the
+# same database (PATIENT_SYNC_CHANGES).
+CHANGE_SYNC_INTERVAL_SECONDS = 0.5
+
+# Production server (serve.py): the address, the number of worker processes
+# (0 = one per CPU), the threads of each worker, and how long workers may
+# take to finish their requests on shutdown or reload. Each setting can be
+# overridden by a PATIENT_API_* environment variable or a command-line option.
+SERVER_BIND = "0.0.0.0:5001"
+SERVER_WORKERS = 0
+SERVER_THREADS = 4
+SERVER_GRACEFUL_TIMEOUT_SECONDS = 30
@@ -1,4 +1,4 @@
-from config import DOCTORS
+from patient_schema import DOCTOR_SET
 
 
 class Doctor:
@@ -30,6 +30,6 @@ class Doctor:
         """
         if not isinstance(name, str) or not name.strip():
             raise ValueError("Name must be a non-empty string.")
-        if name not in DOCTORS:
+        if name not in DOCTOR_SET:
             raise ValueError(f"Doctor '{name}' is not recognized.")
         self._name = name
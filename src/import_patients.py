@@ -0,0 +1,104 @@
+# Importer: loads a patient export (GET /patients/export) back into the
+# database, in chunked transactions, in constant memory:
+#
+#   cd src
+#   python import_patients.py patients.csv.gz
+#   python import_patients.py patients.ndjson --keep-ids
+#
+# The file may be CSV or NDJSON, gzipped or not. Every record is validated
+# like the items of POST /patients/bulk; the invalid ones are reported and
+# skipped. By default each patient is created anew; --keep-ids restores the
+# exported ids, check-in and check-out times and versions instead, to move a
+# dataset between databases.
+
+import argparse
+import sys
+from typing import Any, Dict, List, Tuple
+
+from patient_db import PatientDB
+from patient_export import EXPORT_FORMATS, export_format_of, read_export
+from patient_validation import prepare_bulk_chunk, bulk_chunk_results
+from config import BULK_INSERT_CHUNK_SIZE
+
+# The columns copied from the export with --keep-ids.
+KEPT_FIELDS = ("id", "checkin", "checkout", "version")
+# The number of failed records reported in detail.
+MAX_REPORTED_ERRORS = 10
+
+
+def _insert_chunk(
+    patient_db: PatientDB, pending: List[Tuple[int, Any]], keep_ids: bool
+) -> List[Dict[str, Any]]:
+    """
+    Validates and inserts one chunk of (index, record) pairs.
+    Returns:
+        The per-record results, as in a POST /patients/bulk response.
+    """
+    results, chunk = prepare_bulk_chunk(pending)
+    if keep_ids:
+        items = dict(pending)
+        for index, data in chunk:
+            data.update((key, items[index][key]) for key in KEPT_FIELDS if items[index].get(key) is not None)
+    if chunk:
+        inserted_ids = patient_db.insert_patients([data for _, data in chunk])
+        results.extend(bulk_chunk_results(chunk, inserted_ids))
+    return results
+
+
+def import_file(
+    patient_db: PatientDB, path: str, export_format: str, batch_size: int, keep_ids: bool = False
+) -> Tuple[int, int]:
+    """
+    Imports an export file, one transaction per batch of records.
+    Returns:
+        The number of patients created and of records that failed.
+    """
+    created = failed = 0
+
+    def count(results: List[Dict[str, Any]]) -> None:
+        nonlocal created, failed
+        for result in sorted(results, key=lambda result: result["index"]):
+            if result["status"] == "created":
+                created += 1
+                continue
+            failed += 1
+            if failed <= MAX_REPORTED_ERRORS:
+                print(f"Record {result['index'] + 1}: {result['message']}", file=sys.stderr)
+
+    pending = []
+    for index, item in enumerate(read_export(path, export_format)):
+        pending.append((index, item))
+        if len(pending) >= batch_size:
+            count(_insert_chunk(patient_db, pending, keep_ids))
+            pending = []
+    if pending:
+        count(_insert_chunk(patient_db, pending, keep_ids))
+    return created, failed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Import a patient export file.")
+    parser.add_argument("path", help="a CSV or NDJSON export, optionally gzipped")
+    parser.add_argument(
+        "--format", choices=sorted(EXPORT_FORMATS), help="the file format, guessed from its name by default"
+    )
+    parser.add_argument(
+        "--batch-size", type=int, default=BULK_INSERT_CHUNK_SIZE, help="patients inserted per transaction"
+    )
+    parser.add_argument(
+        "--keep-ids", action="store_true", help="keep the exported ids, timestamps and versions"
+    )
+    args = parser.parse_args()
+
+    export_format = args.format or export_format_of(args.path)
+    if export_format is None:
+        parser.error("cannot guess the format of the file, use --format")
+
+    created, failed = import_file(PatientDB(), args.path, export_format, args.batch_size, args.keep_ids)
+    print(f"Imported {created} patients, {failed} failed")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
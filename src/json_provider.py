@@ -0,0 +1,74 @@
+# JSON providers for the Flask and the async API controllers.
+#
+# The provider is chosen with JSON_PROVIDER in config.py: "orjson" uses the
+# orjson library, "stdlib" the json module, and "auto" picks orjson when it
+# is installed. Both providers serialize PatientRecord objects.
+
+from typing import Any, Type
+from flask.json.provider import DefaultJSONProvider, JSONProvider
+from patient_record import PatientRecord
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+
+def _default(obj: Any) -> Any:
+    """Serializes the types the json module does not handle."""
+    if isinstance(obj, PatientRecord):
+        return obj.to_dict()
+    return DefaultJSONProvider.default(obj)
+
+
+class StdlibJSONProvider(DefaultJSONProvider):
+    """
+    The default Flask provider, extended to serialize PatientRecord objects.
+    Keys are not sorted, which keeps large responses cheaper to encode.
+    """
+
+    default = staticmethod(_default)
+    sort_keys = False
+
+
+class OrjsonProvider(JSONProvider):
+    """
+    A provider built on orjson. Responses are encoded straight to bytes,
+    and dataclasses such as PatientRecord are serialized natively.
+    """
+
+    # Row mappings are keyed by SQLAlchemy's quoted_name, a str subclass
+    # orjson only accepts as a key with OPT_NON_STR_KEYS.
+    option = orjson.OPT_NON_STR_KEYS if orjson is not None else 0
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        return orjson.dumps(obj, default=_default, option=self.option).decode()
+
+    def loads(self, s: str | bytes, **kwargs: Any) -> Any:
+        return orjson.loads(s)
+
+    def response(self, *args: Any, **kwargs: Any) -> Any:
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(
+            orjson.dumps(obj, default=_default, option=self.option),
+            mimetype="application/json",
+        )
+
+
+def select_json_provider(name: str = "auto") -> Type[JSONProvider]:
+    """
+    Returns the JSON provider class to install on an app.
+    Args:
+        name: "orjson", "stdlib" or "auto" (orjson when installed).
+    Raises:
+        ValueError: If the name is unknown, or orjson is requested but missing.
+    """
+    if name == "stdlib":
+        return StdlibJSONProvider
+    if name == "orjson":
+        if orjson is None:
+            raise ValueError("JSON_PROVIDER is 'orjson' but orjson is not installed")
+        return OrjsonProvider
+    if name == "auto":
+        return OrjsonProvider if orjson is not None else StdlibJSONProvider
+    raise ValueError(f"Unknown JSON provider: {name}")
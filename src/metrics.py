@@ -0,0 +1,353 @@
+# Process-local metrics, exported in the Prometheus text format by GET /metrics.
+#
+# A minimal, dependency-free registry of counters, histograms and callback
+# metrics (values read when rendered, e.g. cache statistics). The metrics
+# below are fed by the controllers (request timing), by SQLAlchemy engine
+# events (statement timing, slow-query log), by the connection pools (wait
+# time) and by PatientDB (error counters).
+
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, Iterable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger("patient_db")
+slow_query_logger = logging.getLogger("patient_db.slow_query")
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Latency buckets, in seconds.
+REQUEST_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+# Group-commit batch size buckets, in writes.
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+LabelValues = Tuple[str, ...]
+Sample = Tuple[str, Dict[str, str], float]
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    pairs = []
+    for key, value in labels.items():
+        value = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        pairs.append(f'{key}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Metric:
+    """Base class of the metrics: a name, a help text, a type and label names."""
+
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def samples(self) -> Iterator[Sample]:
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    """A monotonically increasing value per label set."""
+
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> None:
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: Any) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self) -> Iterator[Sample]:
+        with self._lock:
+            values = list(self._values.items())
+        for key, value in values:
+            yield self.name, dict(zip(self.labelnames, key)), value
+
+
+class Histogram(Metric):
+    """Cumulative bucket counts, sum and count of observed values per label set."""
+
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Iterable[str] = (),
+        buckets: Iterable[float] = REQUEST_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self._values: Dict[LabelValues, List[float]] = {}
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            # One counter per bucket, then the sum; made cumulative on export.
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * len(self.buckets) + [0.0]
+            for position, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[position] += 1
+                    break
+            state[-1] += value
+
+    def samples(self) -> Iterator[Sample]:
+        with self._lock:
+            values = [(key, list(state)) for key, state in self._values.items()]
+        for key, state in values:
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets, state):
+                cumulative += count
+                yield f"{self.name}_bucket", dict(labels, le=_format_value(bound)), cumulative
+            yield f"{self.name}_sum", labels, state[-1]
+            yield f"{self.name}_count", labels, cumulative
+
+
+class CallbackMetric(Metric):
+    """
+    A gauge or counter whose values are read from callbacks when rendered.
+    Each callback returns (labels, value) pairs; registering a callback under
+    an existing key replaces the previous one.
+    """
+
+    def __init__(self, name: str, documentation: str, type: str = "gauge") -> None:
+        super().__init__(name, documentation)
+        self.type = type
+        self._callbacks: Dict[Hashable, Callable[[], Iterable[Tuple[Dict[str, str], float]]]] = {}
+
+    def set_callback(self, key: Hashable, callback: Callable[[], Iterable[Tuple[Dict[str, str], float]]]) -> None:
+        with self._lock:
+            self._callbacks[key] = callback
+
+    def remove_callback(self, key: Hashable) -> None:
+        with self._lock:
+            self._callbacks.pop(key, None)
+
+    def samples(self) -> Iterator[Sample]:
+        with self._lock:
+            callbacks = list(self._callbacks.values())
+        for callback in callbacks:
+            for labels, value in callback():
+                yield self.name, labels, value
+
+
+class MetricsRegistry:
+    """An ordered collection of metrics rendered together."""
+
+    def __init__(self) -> None:
+        self._metrics: List[Metric] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """Returns every metric in the Prometheus text exposition format."""
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+REQUESTS = REGISTRY.register(
+    Counter("patient_api_requests_total", "HTTP requests handled.", ["method", "route", "status"])
+)
+REQUEST_DURATION = REGISTRY.register(
+    Histogram(
+        "patient_api_request_duration_seconds",
+        "Time spent handling HTTP requests.",
+        ["method", "route"],
+    )
+)
+STATEMENT_DURATION = REGISTRY.register(
+    Histogram(
+        "patient_db_statement_duration_seconds",
+        "Time spent executing SQL statements.",
+        ["engine", "statement"],
+        buckets=STATEMENT_BUCKETS,
+    )
+)
+SLOW_STATEMENTS = REGISTRY.register(
+    Counter("patient_db_slow_statements_total", "SQL statements above the slow-query threshold.", ["engine"])
+)
+POOL_WAIT = REGISTRY.register(
+    Histogram(
+        "patient_db_pool_wait_seconds",
+        "Time spent waiting for a pooled connection.",
+        ["pool"],
+        buckets=STATEMENT_BUCKETS,
+    )
+)
+POOL_CHECKED_OUT = REGISTRY.register(
+    CallbackMetric("patient_db_pool_checked_out", "Connections currently checked out of each pool.")
+)
+GROUP_COMMIT_BATCH_SIZE = REGISTRY.register(
+    Histogram(
+        "patient_db_group_commit_batch_size",
+        "Writes committed together by the group-commit queue.",
+        buckets=BATCH_SIZE_BUCKETS,
+    )
+)
+ADMISSION_STATE = REGISTRY.register(
+    CallbackMetric(
+        "patient_api_admission_requests",
+        "Requests admitted (active) or waiting (queued) at each admission gate.",
+    )
+)
+ADMISSION_WAIT = REGISTRY.register(
+    Histogram(
+        "patient_api_admission_wait_seconds",
+        "Time admitted requests waited for a slot at an admission gate.",
+        ["gate", "priority"],
+        buckets=STATEMENT_BUCKETS,
+    )
+)
+ADMISSION_REJECTED = REGISTRY.register(
+    Counter(
+        "patient_api_admission_rejected_total",
+        "Requests rejected by an admission gate (queue_full, timeout or shed).",
+        ["gate", "priority", "reason"],
+    )
+)
+DB_ERRORS = REGISTRY.register(
+    Counter("patient_db_errors_total", "Failed database operations.", ["operation"])
+)
+CACHE_EVENTS = REGISTRY.register(
+    CallbackMetric("patient_cache_events_total", "Patient cache hits, misses, evictions and expirations.", "counter")
+)
+CACHE_HIT_RATIO = REGISTRY.register(
+    CallbackMetric("patient_cache_hit_ratio", "Share of patient cache lookups served from the cache.")
+)
+
+_STATEMENT_KINDS = ("SELECT", "INSERT", "UPDATE", "DELETE")
+
+
+def statement_kind(statement: str) -> str:
+    """Returns the kind of a SQL statement, used as a low-cardinality label."""
+    keyword = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else ""
+    return keyword if keyword in _STATEMENT_KINDS else "OTHER"
+
+
+def observe_request(method: str, route: str, status: int, seconds: float) -> None:
+    """Records one handled HTTP request."""
+    REQUESTS.inc(method=method, route=route, status=status)
+    REQUEST_DURATION.observe(seconds, method=method, route=route)
+
+
+def record_db_error(operation: str, error: Exception) -> None:
+    """Counts a failed database operation and logs it."""
+    DB_ERRORS.inc(operation=operation)
+    logger.error("%s failed: %s", operation, error)
+
+
+def instrument_engine(engine: Any, name: str, slow_query_seconds: Optional[float] = None) -> None:
+    """
+    Times every statement run by an engine and exports its pool occupancy.
+    Args:
+        engine: A SQLAlchemy Engine (use AsyncEngine.sync_engine for asyncio engines).
+        name: The engine label of the metrics.
+        slow_query_seconds: If set, statements slower than this are logged
+            (without their parameters) and counted.
+    """
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("statement_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["statement_started"].pop()
+        elapsed = time.perf_counter() - started
+        STATEMENT_DURATION.observe(elapsed, engine=name, statement=statement_kind(statement))
+        if slow_query_seconds is not None and elapsed >= slow_query_seconds:
+            SLOW_STATEMENTS.inc(engine=name)
+            slow_query_logger.warning("slow query on %s (%.1f ms): %s", name, elapsed * 1000, statement)
+
+    @event.listens_for(engine, "handle_error")
+    def _error(context):
+        started = context.connection.info.get("statement_started") if context.connection else None
+        if started:
+            started.pop()
+
+    def _checked_out():
+        checkedout = getattr(engine.pool, "checkedout", None)
+        return [({"pool": name}, checkedout())] if checkedout else []
+
+    POOL_CHECKED_OUT.set_callback(name, _checked_out)
+
+
+def timed_pool_class(base: type) -> type:
+    """
+    Returns a subclass of a queue pool class recording in POOL_WAIT how long
+    each checkout waits for a connection. The pool is labelled by its
+    pool_logging_name.
+    """
+
+    class TimedPool(base):
+        def _do_get(self):
+            started = time.perf_counter()
+            try:
+                return super()._do_get()
+            finally:
+                POOL_WAIT.observe(
+                    time.perf_counter() - started,
+                    pool=getattr(self, "_orig_logging_name", None) or "default",
+                )
+
+    TimedPool.__name__ = f"Timed{base.__name__}"
+    return TimedPool
+
+
+def register_cache_metrics(cache: Any, name: str = "patient") -> None:
+    """Exports the statistics of a CacheBackend."""
+
+    def _events():
+        stats = cache.stats()
+        return [
+            ({"cache": name, "event": event}, stats.get(key, 0))
+            for event, key in (
+                ("hit", "hits"),
+                ("miss", "misses"),
+                ("eviction", "evictions"),
+                ("expiration", "expirations"),
+            )
+        ]
+
+    def _ratio():
+        stats = cache.stats()
+        lookups = stats.get("hits", 0) + stats.get("misses", 0)
+        return [({"cache": name}, stats.get("hits", 0) / lookups if lookups else 0.0)]
+
+    CACHE_EVENTS.set_callback(name, _events)
+    CACHE_HIT_RATIO.set_callback(name, _ratio)
@@ -0,0 +1,150 @@
+# In-memory ward/room occupancy index, kept up to date by PatientDB.
+
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from config import WARD_NUMBERS, ROOM_NUMBERS
+
+
+class OccupancyIndex:
+    """
+    Tracks which rooms are occupied by admitted (not checked out) patients.
+    Each ward keeps a per-room patient counter, a bitmap of free rooms and a
+    patient total, so occupancy questions never need a table scan. The index
+    is loaded once from the database and then updated incrementally on every
+    admission, room change, checkout and deletion.
+    """
+
+    def __init__(
+        self,
+        ward_numbers: Iterable[int] = WARD_NUMBERS,
+        room_numbers: Dict[int, List[str]] = ROOM_NUMBERS,
+    ) -> None:
+        """
+        Initializes an empty index.
+        Args:
+            ward_numbers: The wards to track.
+            room_numbers: The room numbers of each ward.
+        """
+        self._lock = threading.Lock()
+        self._rooms: Dict[int, List[str]] = {}
+        self._slots: Dict[int, Dict[str, int]] = {}
+        for ward in ward_numbers:
+            rooms = [str(room) for room in room_numbers.get(ward, [])]
+            self._rooms[ward] = rooms
+            self._slots[ward] = {room: slot for slot, room in enumerate(rooms)}
+        self.clear()
+
+    def clear(self) -> None:
+        """Marks every room as free."""
+        with self._lock:
+            self._occupants = {ward: [0] * len(rooms) for ward, rooms in self._rooms.items()}
+            self._free_mask = {ward: (1 << len(rooms)) - 1 for ward, rooms in self._rooms.items()}
+            self._ward_patients = {ward: 0 for ward in self._rooms}
+            self._locations: Dict[str, Tuple[int, int]] = {}
+
+    def _slot(self, ward: Any, room: Any) -> Optional[Tuple[int, int]]:
+        """Returns the (ward, slot) of a room, or None if it is not tracked."""
+        slots = self._slots.get(ward)
+        if slots is None:
+            return None
+        slot = slots.get(str(room))
+        return None if slot is None else (ward, slot)
+
+    def _leave(self, patient_id: str) -> None:
+        location = self._locations.pop(patient_id, None)
+        if location is None:
+            return
+        ward, slot = location
+        self._occupants[ward][slot] -= 1
+        self._ward_patients[ward] -= 1
+        if self._occupants[ward][slot] == 0:
+            self._free_mask[ward] |= 1 << slot
+
+    def _enter(self, patient_id: str, ward: Any, room: Any) -> None:
+        location = self._slot(ward, room)
+        if location is None:
+            return
+        ward, slot = location
+        self._locations[patient_id] = location
+        self._occupants[ward][slot] += 1
+        self._ward_patients[ward] += 1
+        self._free_mask[ward] &= ~(1 << slot)
+
+    def place(self, patient_id: str, ward: Any, room: Any) -> None:
+        """
+        Records that an admitted patient is in a room, moving them out of
+        their previous room if any.
+        """
+        with self._lock:
+            self._leave(str(patient_id))
+            self._enter(str(patient_id), ward, room)
+
+    def discharge(self, patient_id: str) -> None:
+        """Records that a patient no longer occupies a room."""
+        with self._lock:
+            self._leave(str(patient_id))
+
+    def apply(self, patient: Dict[str, Any]) -> None:
+        """
+        Updates the index from the current state of a patient record.
+        """
+        if patient.get("checkout") is None and patient.get("ward") is not None:
+            self.place(patient["id"], patient["ward"], patient.get("room"))
+        else:
+            self.discharge(patient["id"])
+
+    def load(self, patients: Iterable[Dict[str, Any]]) -> None:
+        """
+        Rebuilds the index from the admitted patients.
+        Args:
+            patients: Records with at least 'id', 'ward', 'room' and 'checkout'.
+        """
+        self.clear()
+        for patient in patients:
+            self.apply(patient)
+
+    def has_ward(self, ward: int) -> bool:
+        """Checks whether a ward is tracked."""
+        return ward in self._rooms
+
+    def is_free(self, ward: int, room: Any) -> bool:
+        """Checks whether a room has no admitted patient."""
+        location = self._slot(ward, room)
+        if location is None:
+            return False
+        return bool(self._free_mask[ward] >> location[1] & 1)
+
+    def ward_summary(self) -> List[Dict[str, int]]:
+        """
+        Returns the occupancy counters of every ward.
+        """
+        with self._lock:
+            summary = []
+            for ward, rooms in self._rooms.items():
+                free_rooms = bin(self._free_mask[ward]).count("1")
+                summary.append(
+                    {
+                        "ward": ward,
+                        "rooms": len(rooms),
+                        "free_rooms": free_rooms,
+                        "occupied_rooms": len(rooms) - free_rooms,
+                        "patients": self._ward_patients[ward],
+                    }
+                )
+            return summary
+
+    def rooms(self, ward: int, free_only: bool = False) -> List[Dict[str, int]]:
+        """
+        Returns the rooms of a ward with their number of admitted patients.
+        Args:
+            ward: The ward number.
+            free_only: If True, only return the rooms without patients.
+        """
+        with self._lock:
+            free_mask = self._free_mask[ward]
+            occupants = self._occupants[ward]
+            return [
+                {"room": int(room), "patients": occupants[slot]}
+                for slot, room in enumerate(self._rooms[ward])
+                if not free_only or free_mask >> slot & 1
+            ]
@@ -1,8 +1,12 @@
 import uuid
 from datetime import datetime, timezone
-from config import GENDERS, WARD_NUMBERS, ROOM_NUMBERS, API_CONTROLLER_URL
+from typing import TYPE_CHECKING, Any, Dict, Optional
+from config import GENDERS, TIMESTAMP_FORMAT
 from doctor import Doctor
-import requests
+from patient_schema import GENDER_SET, is_integer, is_valid_room
+
+if TYPE_CHECKING:
+    import requests
 
 # TODO: Implement the Patient class.
 # Please import and use the config and db config variables.
@@ -25,6 +29,8 @@ import requests
 class Patient:
     """A class to represent a patient."""
 
+    __slots__ = ("id", "checkin", "checkout", "name", "age", "gender", "ward", "room", "doctor_name")
+
     def __init__(self, name: str, age: int, gender: str, ward: int | None = None, room: int | None = None, doctor_name: str | None = None):
         """
         Initialize the Patient object.
@@ -34,13 +40,13 @@ class Patient:
             gender (str): The gender of the patient.
             doctor_name (str, optional): The name of the assigned doctor. Defaults to None.
         """
-        if not isinstance(age, int) or age <= 0:
+        if not is_integer(age) or age <= 0:
             raise ValueError("Age must be a positive integer.")
-        if gender not in GENDERS:
+        if not isinstance(gender, str) or gender not in GENDER_SET:
             raise ValueError(f"Gender must be one of {GENDERS}.")
 
         self.id = str(uuid.uuid4())
-        self.checkin = datetime.now(timezone.utc).strftime("%d-%m-%Y %H:%M:%S")
+        self.checkin = datetime.now(timezone.utc).strftime(TIMESTAMP_FORMAT)
         self.checkout = None
         self.name = name
         self.age = age
@@ -73,7 +79,7 @@ class Patient:
             ward (int): The ward number.
             room (int): The room number.
         """
-        if ward in WARD_NUMBERS and str(room) in ROOM_NUMBERS.get(ward, []):
+        if is_valid_room(ward, room):
             self.ward = ward
             self.room = room
         else:
@@ -83,7 +89,7 @@ class Patient:
 
     def checkout_patient(self) -> None:
         """Sets the checkout time for the patient."""
-        self.checkout = datetime.now(timezone.utc).strftime("%d-%m-%Y %H:%M:%S")
+        self.checkout = datetime.now(timezone.utc).strftime(TIMESTAMP_FORMAT)
 
     def to_dict(self) -> dict:
         """
@@ -103,13 +109,18 @@ class Patient:
             "doctor_name": self.doctor_name,
         }
 
-    def commit_to_db(self) -> requests.Response:
+    def commit_to_db(self, client: Optional[Any] = None) -> "requests.Response":
         """
         Commits the patient to the database using the API.
+        The whole record is sent, including the ward, room and doctor.
+        Args:
+            client: The PatientClient to use; defaults to the client shared by
+                the process, which keeps its connections alive between calls.
         Returns:
             requests.Response: The response from the API.
         """
-        url = f"{API_CONTROLLER_URL}:5001/patients"
-        payload = {"name": self.name, "age": self.age, "gender": self.gender}
-        response = requests.post(url, json=payload)
-        return response
+        if client is None:
+            from patient_client import default_client
+
+            client = default_client()
+        return client.post_patient(self)
@@ -0,0 +1,111 @@
+# Read-through cache for patient records, used by PatientDB.select_patient.
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+
+class CacheBackend:
+    """
+    Interface for patient record cache backends.
+    Implementations can keep records in process memory or in a shared
+    store, so that several workers see the same cache.
+    """
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Returns the cached record for a key, or None on a miss.
+        """
+        raise NotImplementedError
+
+    def set(self, key: str, value: Dict[str, Any]) -> None:
+        """
+        Stores a record under a key.
+        """
+        raise NotImplementedError
+
+    def delete(self, key: str) -> None:
+        """
+        Removes a key from the cache, if present.
+        """
+        raise NotImplementedError
+
+    def clear(self) -> None:
+        """
+        Removes every key from the cache.
+        """
+        raise NotImplementedError
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Returns the cache counters (hits, misses, ...).
+        """
+        raise NotImplementedError
+
+
+class LRUTTLCache(CacheBackend):
+    """
+    An in-process, thread-safe cache bounded both in size (least recently
+    used entries are evicted first) and in age (entries expire after a TTL).
+    """
+
+    def __init__(self, max_entries: int = 10000, ttl_seconds: float = 30.0) -> None:
+        """
+        Initializes an empty cache.
+        Args:
+            max_entries (int): The maximum number of records kept.
+            ttl_seconds (float): How long a record stays valid after being stored.
+        """
+        if max_entries <= 0:
+            raise ValueError("max_entries must be a positive integer.")
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return dict(value)
+
+    def set(self, key: str, value: Dict[str, Any]) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, dict(value))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
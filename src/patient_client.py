@@ -0,0 +1,434 @@
+# Python client of the Patient API.
+#
+# PatientClient keeps a pooled keep-alive requests.Session with retries and
+# exponential backoff, and batches creations into POST /patients/bulk.
+# AsyncPatientClient is its asyncio counterpart, built on httpx. Both can
+# talk to an in-process app instead of a server, e.g. in tests:
+#   client = PatientClient.for_app(PatientAPIController().app)
+#   client = AsyncPatientClient.for_app(AsyncPatientAPIController().app)
+
+import asyncio
+import io
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Union
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+from urllib3.util.retry import Retry
+from config import API_CONTROLLER_URL, BULK_INSERT_CHUNK_SIZE, DEFAULT_PAGE_SIZE
+
+DEFAULT_BASE_URL = f"{API_CONTROLLER_URL}:5001"
+# Responses retried with backoff. POST is only retried on connection errors,
+# when the request never reached the server.
+RETRY_STATUSES = (502, 503, 504)
+
+# A patient to create: a payload dictionary or any object with to_dict().
+PatientPayload = Union[Dict[str, Any], Any]
+
+
+def _payload(patient: PatientPayload) -> Dict[str, Any]:
+    """Returns the POST payload of a patient, dropping server-set fields."""
+    data = patient if isinstance(patient, dict) else patient.to_dict()
+    return {k: v for k, v in data.items() if k not in ("id", "checkin", "checkout", "version")}
+
+
+_default_client: Optional["PatientClient"] = None
+
+
+def default_client() -> "PatientClient":
+    """
+    Returns the client shared by the process, created on first use, so that
+    callers such as Patient.commit_to_db reuse its pooled connections.
+    """
+    global _default_client
+    if _default_client is None:
+        _default_client = PatientClient()
+    return _default_client
+
+
+class WSGIAdapter(BaseAdapter):
+    """
+    A requests transport adapter that sends requests to a WSGI application
+    in the same process, without opening sockets.
+    """
+
+    def __init__(self, app: Any) -> None:
+        super().__init__()
+        from werkzeug.test import Client
+
+        self.client = Client(app)
+
+    def send(self, request: requests.PreparedRequest, **kwargs: Any) -> requests.Response:
+        url = urlsplit(request.url)
+        body = request.body.encode() if isinstance(request.body, str) else request.body
+        result = self.client.open(
+            url.path,
+            method=request.method,
+            query_string=url.query,
+            headers=dict(request.headers),
+            data=body,
+        )
+        response = requests.Response()
+        response.status_code = result.status_code
+        response.headers.update(result.headers)
+        response.raw = io.BytesIO(result.get_data())
+        response.url = request.url
+        response.request = request
+        response.reason = result.status.partition(" ")[2]
+        return response
+
+    def close(self) -> None:
+        pass
+
+
+class PatientClient:
+    """
+    A synchronous client of the Patient API.
+    Patients queued with add() are sent to POST /patients/bulk once
+    batch_size of them are pending, and on flush() or close().
+    """
+
+    def __init__(
+        self,
+        base_url: str = DEFAULT_BASE_URL,
+        pool_size: int = 10,
+        retries: int = 3,
+        backoff_factor: float = 0.2,
+        timeout: float = 10.0,
+        batch_size: int = BULK_INSERT_CHUNK_SIZE,
+        session: Optional[requests.Session] = None,
+    ) -> None:
+        """
+        Initializes the client.
+        Args:
+            base_url: The URL of the API, without a trailing slash.
+            pool_size: The number of keep-alive connections kept open.
+            retries: The number of retries of a failed request.
+            backoff_factor: The base of the exponential delay between retries, in seconds.
+            timeout: The timeout of each request, in seconds.
+            batch_size: The number of queued patients sent per bulk request.
+            session: An already configured session to use instead.
+        """
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.batch_size = batch_size
+        self._pending: List[Dict[str, Any]] = []
+        if session is None:
+            session = requests.Session()
+            retry = Retry(
+                total=retries,
+                backoff_factor=backoff_factor,
+                status_forcelist=RETRY_STATUSES,
+                raise_on_status=False,
+            )
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+        self.session = session
+
+    @classmethod
+    def for_app(cls, app: Any, **kwargs: Any) -> "PatientClient":
+        """
+        Creates a client calling a WSGI app (e.g. PatientAPIController().app)
+        in the same process.
+        """
+        session = requests.Session()
+        session.mount("http://", WSGIAdapter(app))
+        return cls(base_url="http://localhost", session=session, **kwargs)
+
+    def __enter__(self) -> "PatientClient":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Sends the queued patients and closes the pooled connections."""
+        try:
+            self.flush()
+        finally:
+            self.session.close()
+
+    def _request(self, method: str, path: str, **kwargs: Any) -> requests.Response:
+        kwargs.setdefault("timeout", self.timeout)
+        return self.session.request(method, self.base_url + path, **kwargs)
+
+    def _json(self, method: str, path: str, **kwargs: Any) -> Any:
+        """
+        Sends a request and decodes its JSON body.
+        Raises:
+            requests.HTTPError: If the API answers with an error status.
+        """
+        response = self._request(method, path, **kwargs)
+        response.raise_for_status()
+        return response.json()
+
+    def post_patient(self, patient: PatientPayload) -> requests.Response:
+        """
+        Sends one patient to POST /patients.
+        Returns:
+            The response of the API, whatever its status.
+        """
+        return self._request("POST", "/patients", json=_payload(patient))
+
+    def create_patient(self, patient: PatientPayload) -> Dict[str, Any]:
+        """
+        Creates one patient.
+        Returns:
+            The created patient record.
+        Raises:
+            requests.HTTPError: If the API rejects the patient.
+        """
+        response = self.post_patient(patient)
+        response.raise_for_status()
+        return response.json()
+
+    def create_patients(self, patients: Iterable[PatientPayload]) -> List[Dict[str, Any]]:
+        """
+        Creates many patients with as few bulk requests as possible.
+        Returns:
+            The per-item results of the bulk endpoint, in input order.
+        """
+        results = []
+        batch: List[Dict[str, Any]] = []
+        for patient in patients:
+            batch.append(_payload(patient))
+            if len(batch) >= self.batch_size:
+                results.extend(self._create_bulk(batch, offset=len(results)))
+                batch = []
+        if batch:
+            results.extend(self._create_bulk(batch, offset=len(results)))
+        return results
+
+    def _create_bulk(self, payloads: List[Dict[str, Any]], offset: int = 0) -> List[Dict[str, Any]]:
+        """
+        Sends one bulk request.
+        Returns:
+            Its per-item results, with their index shifted by offset.
+        """
+        response = self._request("POST", "/patients/bulk", json=payloads)
+        if response.status_code not in (201, 207):
+            response.raise_for_status()
+        return [
+            dict(result, index=result["index"] + offset)
+            for result in response.json()["results"]
+        ]
+
+    def add(self, patient: PatientPayload) -> List[Dict[str, Any]]:
+        """
+        Queues a patient for creation, sending the queue once it is full.
+        Returns:
+            The results of the bulk request sent, if any.
+        """
+        self._pending.append(_payload(patient))
+        if len(self._pending) >= self.batch_size:
+            return self.flush()
+        return []
+
+    def flush(self) -> List[Dict[str, Any]]:
+        """
+        Sends the queued patients in one bulk request.
+        Returns:
+            The per-item results of the queued patients, indexed by their
+            position in the queue.
+        """
+        if not self._pending:
+            return []
+        pending, self._pending = self._pending, []
+        return self._create_bulk(pending)
+
+    def get_patient(self, patient_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Retrieves a patient.
+        Returns:
+            The patient record, or None if it does not exist.
+        """
+        response = self._request("GET", f"/patients/{patient_id}")
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+        return response.json()
+
+    def iter_patients(self, page_size: int = DEFAULT_PAGE_SIZE, **filters: Any) -> Iterator[Dict[str, Any]]:
+        """
+        Iterates over all patients matching the GET /patients filters,
+        following the pagination cursors.
+        """
+        params = dict(filters, limit=page_size)
+        while True:
+            page = self._json("GET", "/patients", params=params)
+            yield from page["patients"]
+            if page["next_cursor"] is None:
+                return
+            params["cursor"] = page["next_cursor"]
+
+    def update_patient(self, patient_id: str, update_data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Updates a patient.
+        Returns:
+            The updated patient record.
+        """
+        return self._json("PUT", f"/patients/{patient_id}", json=update_data)
+
+    def checkout_patient(self, patient_id: str) -> Dict[str, Any]:
+        """Checks a patient out."""
+        return self._json("PUT", f"/patients/{patient_id}/checkout")
+
+    def delete_patient(self, patient_id: str) -> bool:
+        """
+        Deletes a patient.
+        Returns:
+            True if the patient was deleted, False if it did not exist.
+        """
+        response = self._request("DELETE", f"/patients/{patient_id}")
+        if response.status_code == 404:
+            return False
+        response.raise_for_status()
+        return True
+
+
+class AsyncPatientClient:
+    """
+    The asyncio counterpart of PatientClient, for callers fanning out many
+    concurrent requests. Requires httpx.
+    """
+
+    def __init__(
+        self,
+        base_url: str = DEFAULT_BASE_URL,
+        pool_size: int = 100,
+        retries: int = 3,
+        backoff_factor: float = 0.2,
+        timeout: float = 10.0,
+        batch_size: int = BULK_INSERT_CHUNK_SIZE,
+        transport: Any = None,
+    ) -> None:
+        """
+        Initializes the client.
+        Args:
+            base_url: The URL of the API, without a trailing slash.
+            pool_size: The maximum number of concurrent connections.
+            retries: The number of retries of a failed request.
+            backoff_factor: The base of the exponential delay between retries, in seconds.
+            timeout: The timeout of each request, in seconds.
+            batch_size: The number of patients sent per bulk request.
+            transport: An httpx transport to use instead of the network.
+        """
+        import httpx
+
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.batch_size = batch_size
+        self._connection_errors = (httpx.ConnectError, httpx.ConnectTimeout)
+        self.client = httpx.AsyncClient(
+            base_url=base_url.rstrip("/"),
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+            transport=transport,
+        )
+
+    @classmethod
+    def for_app(cls, app: Any, **kwargs: Any) -> "AsyncPatientClient":
+        """
+        Creates a client calling an ASGI app (e.g. AsyncPatientAPIController().app)
+        in the same process.
+        """
+        import httpx
+
+        return cls(base_url="http://localhost", transport=httpx.ASGITransport(app=app), **kwargs)
+
+    async def __aenter__(self) -> "AsyncPatientClient":
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.close()
+
+    async def close(self) -> None:
+        """Closes the pooled connections."""
+        await self.client.aclose()
+
+    async def _request(self, method: str, path: str, **kwargs: Any) -> Any:
+        """
+        Sends a request, retrying with exponential backoff on connection
+        errors and, for idempotent methods, on the RETRY_STATUSES.
+        """
+        for attempt in range(self.retries + 1):
+            last = attempt == self.retries
+            try:
+                response = await self.client.request(method, path, **kwargs)
+            except self._connection_errors:
+                if last:
+                    raise
+            else:
+                if last or method == "POST" or response.status_code not in RETRY_STATUSES:
+                    return response
+            await asyncio.sleep(self.backoff_factor * 2 ** attempt)
+
+    async def _json(self, method: str, path: str, **kwargs: Any) -> Any:
+        response = await self._request(method, path, **kwargs)
+        response.raise_for_status()
+        return response.json()
+
+    async def create_patient(self, patient: PatientPayload) -> Dict[str, Any]:
+        """Creates one patient and returns its record."""
+        return await self._json("POST", "/patients", json=_payload(patient))
+
+    async def create_patients(self, patients: Iterable[PatientPayload]) -> List[Dict[str, Any]]:
+        """
+        Creates many patients, sending the bulk requests concurrently.
+        Returns:
+            The per-item results of the bulk endpoint, in input order.
+        """
+        payloads = [_payload(patient) for patient in patients]
+        batches = [
+            payloads[start:start + self.batch_size]
+            for start in range(0, len(payloads), self.batch_size)
+        ]
+        pages = await asyncio.gather(
+            *(
+                self._create_bulk(batch, offset=number * self.batch_size)
+                for number, batch in enumerate(batches)
+            )
+        )
+        return [result for page in pages for result in page]
+
+    async def _create_bulk(self, payloads: List[Dict[str, Any]], offset: int = 0) -> List[Dict[str, Any]]:
+        """
+        Sends one bulk request.
+        Returns:
+            Its per-item results, with their index shifted by offset.
+        """
+        response = await self._request("POST", "/patients/bulk", json=payloads)
+        if response.status_code not in (201, 207):
+            response.raise_for_status()
+        return [
+            dict(result, index=result["index"] + offset)
+            for result in response.json()["results"]
+        ]
+
+    async def get_patient(self, patient_id: str) -> Optional[Dict[str, Any]]:
+        """Retrieves a patient, or None if it does not exist."""
+        response = await self._request("GET", f"/patients/{patient_id}")
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+        return response.json()
+
+    async def get_patients(self, patient_ids: Iterable[str]) -> List[Optional[Dict[str, Any]]]:
+        """Retrieves many patients concurrently, in input order."""
+        return await asyncio.gather(*(self.get_patient(patient_id) for patient_id in patient_ids))
+
+    async def update_patient(self, patient_id: str, update_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Updates a patient and returns the updated record."""
+        return await self._json("PUT", f"/patients/{patient_id}", json=update_data)
+
+    async def checkout_patient(self, patient_id: str) -> Dict[str, Any]:
+        """Checks a patient out."""
+        return await self._json("PUT", f"/patients/{patient_id}/checkout")
+
+    async def delete_patient(self, patient_id: str) -> bool:
+        """Deletes a patient; returns False if it did not exist."""
+        response = await self._request("DELETE", f"/patients/{patient_id}")
+        if response.status_code == 404:
+            return False
+        response.raise_for_status()
+        return True
@@ -1,21 +1,688 @@
-from typing import Any, Dict, List, Optional
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.sql import operators
-from sqlalchemy import select, insert, update, delete
-from patient_db_config import PATIENTS_TABLE, ENGINE
+from sqlalchemy.sql.expression import UnaryExpression
+from sqlalchemy import select, insert, update, delete, case, func, or_, text, union_all, Select, Table, Update, Delete
+from patient_db_config import (
+    PATIENTS_TABLE,
+    PATIENTS_TABLE_NAME,
+    PATIENTS_ARCHIVE_TABLE,
+    ARCHIVED_PATIENT_COLUMNS,
+    TABLE_VERSIONS_TABLE,
+    PATIENT_CHANGES_TABLE,
+    PATIENTS_ROWID,
+    PATIENTS_FTS_TABLE,
+    PATIENTS_FTS_TABLE_NAME,
+    FTS_MIN_TERM_LENGTH,
+    WARD_STATS_TABLE,
+    DOCTOR_STATS_TABLE,
+    PATIENT_STATS_TABLES,
+    ACTIVE_PATIENTS_COLUMN,
+    CHECKED_OUT_PATIENTS_COLUMN,
+    WARD_COLUMN,
+    DOCTOR_NAME_COLUMN,
+    stats_counts_statement,
+    rebuild_stats_counters,
+    Storage,
+    default_storage,
+)
+from config import (
+    TIMESTAMP_FORMAT,
+    CHANGE_FEED_POLL_SECONDS,
+    ARCHIVE_AFTER_DAYS,
+    ARCHIVE_BATCH_SIZE,
+    ARCHIVE_BATCH_PAUSE_SECONDS,
+)
+from patient_cache import CacheBackend
+from metrics import record_db_error
+from patient_record import PatientRecord
+from occupancy import OccupancyIndex
+from write_queue import GroupCommitQueue
+from change_feed import ChangeNotifier, CHANGE_INSERT, CHANGE_UPDATE, CHANGE_DELETE, CHANGE_ARCHIVE
 
 
-class PatientDB:
+class VersionConflictError(Exception):
     """
-    A class for interacting with the patient database.
-    Provides methods for CRUD operations on patient records.
+    Raised by a conditional write when the patient exists but is no longer
+    at the version the client expected.
     """
 
+    def __init__(self, patient_id: str, current_version: int) -> None:
+        super().__init__(f"Patient {patient_id} is at version {current_version}")
+        self.patient_id = patient_id
+        self.current_version = current_version
+
+
+class PatientDBBase:
+    """
+    The state and helpers shared by PatientDB and AsyncPatientDB: the
+    bookkeeping that keeps the cache, the occupancy index and the table
+    version up to date after a write, and the statement builders. The
+    subclasses only add the I/O, synchronous or awaited.
+    """
+
+    # The number of invalidation generations kept for the cache. IDs sharing
+    # a slot only cost each other a cache fill, never a stale record.
+    CACHE_GENERATION_SLOTS = 1024
+
+    def __init__(
+        self,
+        cache: Optional[CacheBackend] = None,
+        occupancy: Optional[OccupancyIndex] = None,
+        storage: Optional[Storage] = None,
+    ) -> None:
+        self.storage = storage or default_storage()
+        self.cache = cache
+        self.occupancy = occupancy
+        self._table_version: Optional[int] = None
+        # The last change-log entry reflected in the cache and occupancy index.
+        self._change_seq: Optional[int] = None
+        self.change_notifier = ChangeNotifier()
+        # Invalidation generations of the cached records, one counter per
+        # slot of patient IDs: a read only fills the cache if no write
+        # invalidated its slot since the read started (see _cache_fill).
+        self._cache_generations = [0] * self.CACHE_GENERATION_SLOTS
+        self._cache_lock = threading.Lock()
+
+    # The GET /patients filters selecting a range of an index rather than a key
+    # ('active=false' too: checked-out patients have any checkout time).
+    RANGE_FILTERS = (
+        "min_age", "max_age", "checkin_from", "checkin_to", "checkout_from", "checkout_to"
+    )
+
+    def _after_write(
+        self,
+        patient_id: str,
+        patient: Optional[Dict[str, Any]],
+        table_version: Optional[int] = None,
+    ) -> None:
+        """
+        Runs the bookkeeping that follows a committed write: drops the record
+        from the cache, updates the occupancy index and remembers the new
+        table version.
+        Args:
+            patient_id: The ID of the written patient.
+            patient: The new state of the record, or None if it no longer exists.
+            table_version: The table version the write committed, if it bumped it.
+        """
+        if table_version is not None:
+            self._committed(table_version)
+        if self.cache is not None:
+            self._cache_invalidate(str(patient_id))
+        if self.occupancy is not None:
+            if patient is None:
+                self.occupancy.discharge(patient_id)
+            else:
+                self.occupancy.apply(patient)
+
+    def _after_writes(
+        self, patients: List[Dict[str, Any]], table_version: Optional[int] = None
+    ) -> None:
+        """Runs the bookkeeping of a committed write of many patients."""
+        if table_version is not None:
+            self._committed(table_version)
+        for patient in patients:
+            self._after_write(patient["id"], patient)
+
+    def _cache_slot(self, patient_id: str) -> int:
+        return hash(patient_id) % self.CACHE_GENERATION_SLOTS
+
+    def _cache_generation(self, patient_id: str) -> int:
+        """Returns the invalidation generation of a record, to pass to _cache_fill after reading it."""
+        return self._cache_generations[self._cache_slot(patient_id)]
+
+    def _cache_invalidate(self, patient_id: str) -> None:
+        """Drops a written record from the cache and bumps its invalidation generation."""
+        with self._cache_lock:
+            self._cache_generations[self._cache_slot(patient_id)] += 1
+            self.cache.delete(patient_id)
+
+    def _cache_fill(self, patient_id: str, patient: Dict[str, Any], generation: int) -> None:
+        """
+        Caches a record read from the database, unless a write committed
+        after the read started: the row read may predate it, and caching it
+        would serve the old state until the entry expires.
+        Args:
+            generation: The _cache_generation of the record before the read.
+        """
+        with self._cache_lock:
+            if self._cache_generations[self._cache_slot(patient_id)] == generation:
+                self.cache.set(patient_id, patient)
+
+    def _record_table_version(self, table_version: int) -> None:
+        """Keeps the highest table version seen, as writes may finish out of order."""
+        if self._table_version is None or table_version > self._table_version:
+            self._table_version = table_version
+
+    def _committed(self, table_version: int) -> None:
+        """Records the table version of a committed write and wakes up the change feed."""
+        self._record_table_version(table_version)
+        self.change_notifier.notify()
+
+    def _archived(self, patients: List[Dict[str, Any]], table_version: Optional[int]) -> None:
+        """Runs the bookkeeping of archived patients, which leave the live table."""
+        if table_version is not None:
+            self._committed(table_version)
+        for patient in patients:
+            self._after_write(patient["id"], None)
+
+    def _apply_changes(self, changes: List[Any]) -> None:
+        """Runs the bookkeeping of writes read back from the change log."""
+        for change in changes:
+            deleted = change.operation in (CHANGE_DELETE, CHANGE_ARCHIVE)
+            self._after_write(change.patient_id, None if deleted else change.patient)
+        if changes:
+            self._change_seq = changes[-1].seq
+
     @staticmethod
     def _row_to_dict(row: Any) -> Dict[str, Any]:
         """Converts a database row to a dictionary."""
         return dict(row._mapping)
 
+    @classmethod
+    def _row_converter(cls, as_records: bool) -> Any:
+        """Returns the function turning listing rows into results."""
+        return PatientRecord.from_row if as_records else cls._row_to_dict
+
+    @staticmethod
+    def _listing_source(include_archived: bool = False) -> Any:
+        """
+        Returns what the listings read from: the live patients table, or the
+        union of the live and the archived patients.
+        """
+        if not include_archived:
+            return PATIENTS_TABLE
+        return union_all(
+            select(PATIENTS_TABLE), select(*ARCHIVED_PATIENT_COLUMNS)
+        ).subquery("all_patients")
+
+    @classmethod
+    def _filtered_statement(cls, filters: Optional[Dict[str, Any]] = None) -> Select:
+        """
+        Builds the patient listing query restricted by the GET /patients filters
+        ('ward', 'room', 'doctor_name', 'gender', 'active', 'min_age', 'max_age',
+        'checkin_from', 'checkin_to', 'checkout_from', 'checkout_to'). Archived
+        patients are only listed with 'include_archived'.
+        """
+        source = cls._listing_source(bool(filters and filters.get("include_archived")))
+        stmt = select(source)
+        if not filters:
+            return stmt
+        for key in ("ward", "room", "doctor_name", "gender"):
+            if filters.get(key) is not None:
+                stmt = stmt.where(source.c[key] == filters[key])
+        if filters.get("active") is True:
+            stmt = stmt.where(source.c.checkout.is_(None))
+        elif filters.get("active") is False:
+            # Checkout times are non-empty strings: unlike IS NOT NULL, this
+            # range can be searched in the checkout index.
+            stmt = stmt.where(source.c.checkout > "")
+        if filters.get("min_age") is not None:
+            stmt = stmt.where(source.c.age >= filters["min_age"])
+        if filters.get("max_age") is not None:
+            stmt = stmt.where(source.c.age <= filters["max_age"])
+        # Timestamps are ISO-8601 strings, so ranges compare lexicographically.
+        for column_name in ("checkin", "checkout"):
+            if filters.get(f"{column_name}_from") is not None:
+                stmt = stmt.where(source.c[column_name] >= filters[f"{column_name}_from"])
+            if filters.get(f"{column_name}_to") is not None:
+                stmt = stmt.where(source.c[column_name] <= filters[f"{column_name}_to"])
+        return stmt
+
+    @classmethod
+    def _page_statement(
+        cls,
+        limit: int,
+        cursor: Optional[str] = None,
+        filters: Optional[Dict[str, Any]] = None,
+    ) -> Select:
+        """Builds the keyset pagination query for one page of patients."""
+        stmt = cls._filtered_statement(filters)
+        id_column = stmt.selected_columns.id
+        if cls._has_range_filter(filters):
+            # SQLite would rather walk the id index past every row out of the
+            # range than sort the range read from its index: the unary plus
+            # keeps it from ordering through the id index.
+            stmt = stmt.order_by(
+                UnaryExpression(id_column, operator=operators.custom_op("+"), type_=id_column.type)
+            )
+        else:
+            stmt = stmt.order_by(id_column)
+        if cursor is not None:
+            stmt = stmt.where(id_column > cursor)
+        # Fetch one extra row to know whether another page follows.
+        return stmt.limit(limit + 1)
+
+    @classmethod
+    def _has_range_filter(cls, filters: Optional[Dict[str, Any]]) -> bool:
+        """Tells whether GET /patients filters select a range of an index rather than a key."""
+        if not filters:
+            return False
+        if filters.get("active") is False:
+            return True
+        return any(filters.get(key) is not None for key in cls.RANGE_FILTERS)
+
+    @classmethod
+    def _page_from_rows(
+        cls, rows: List[Any], limit: int, as_records: bool = False
+    ) -> Dict[str, Any]:
+        """Builds a page response from the rows of _page_statement."""
+        convert = cls._row_converter(as_records)
+        patients = [convert(row) for row in rows[:limit]]
+        next_cursor = rows[limit - 1].id if len(rows) > limit else None
+        return {"patients": patients, "next_cursor": next_cursor}
+
+    @staticmethod
+    def _search_statement(
+        name: str,
+        prefix: bool = False,
+        limit: Optional[int] = None,
+        use_index: bool = False,
+        archived: bool = False,
+    ) -> Select:
+        """
+        Builds the ranked name search query; use_index tells whether the FTS5
+        name index is available. With archived, the query searches the
+        archive table, which has no name index.
+        """
+        table = PATIENTS_ARCHIVE_TABLE if archived else PATIENTS_TABLE
+        starts_with = table.c.name.istartswith(name, autoescape=True)
+        if use_index and not archived and len(name) >= FTS_MIN_TERM_LENGTH:
+            query = '"' + name.replace('"', '""') + '"'
+            stmt = (
+                select(PATIENTS_TABLE)
+                .select_from(
+                    PATIENTS_FTS_TABLE.join(
+                        PATIENTS_TABLE,
+                        PATIENTS_ROWID == PATIENTS_FTS_TABLE.c.rowid,
+                    )
+                )
+                .where(text(f"{PATIENTS_FTS_TABLE_NAME} MATCH :query"))
+                .params(query=query)
+                .order_by(starts_with.desc(), PATIENTS_FTS_TABLE.c.rank)
+            )
+        else:
+            stmt = (
+                select(*ARCHIVED_PATIENT_COLUMNS) if archived else select(PATIENTS_TABLE)
+            )
+            stmt = stmt.where(table.c.name.icontains(name, autoescape=True)).order_by(
+                starts_with.desc(), table.c.name
+            )
+        if prefix:
+            stmt = stmt.where(
+                or_(
+                    starts_with,
+                    table.c.name.icontains(" " + name, autoescape=True),
+                )
+            )
+        if limit is not None:
+            stmt = stmt.limit(limit)
+        return stmt
+
+    @staticmethod
+    def _admitted_statement() -> Select:
+        """Builds the query listing where admitted patients are placed."""
+        return select(
+            PATIENTS_TABLE.c.id,
+            PATIENTS_TABLE.c.ward,
+            PATIENTS_TABLE.c.room,
+            PATIENTS_TABLE.c.checkout,
+        ).where(PATIENTS_TABLE.c.checkout.is_(None))
+
+    @staticmethod
+    def _checkout_values() -> Dict[str, Any]:
+        """Returns the update values checking a patient out now."""
+        return {"checkout": datetime.now(timezone.utc).strftime(TIMESTAMP_FORMAT)}
+
+    @staticmethod
+    def _update_returning_statement(
+        patient_id: str,
+        update_data: Dict[str, Any],
+        expected_version: Optional[int] = None,
+    ) -> Update:
+        """
+        Builds an UPDATE of one patient, bumping its version and returning the
+        updated row. With an expected version, the row is only updated if it
+        is still at that version.
+        """
+        stmt = (
+            update(PATIENTS_TABLE)
+            .where(PATIENTS_TABLE.c.id == patient_id)
+            .values(**update_data, version=PATIENTS_TABLE.c.version + 1)
+            .returning(*PATIENTS_TABLE.c)
+        )
+        if expected_version is not None:
+            stmt = stmt.where(PATIENTS_TABLE.c.version == expected_version)
+        return stmt
+
+    @staticmethod
+    def _batch_update_statement(
+        updates: Dict[str, Dict[str, Any]],
+        expected_versions: Optional[Dict[str, int]] = None,
+    ) -> Update:
+        """
+        Builds a single UPDATE of many patients, each with its own values,
+        bumping their versions and returning the updated rows. A column set to
+        the same value for every patient is a plain assignment; otherwise it
+        is a CASE on the patient ID, keeping the current value of the patients
+        that do not change it. Patients with an expected version are only
+        updated if they are still at that version.
+        """
+        id_column = PATIENTS_TABLE.c.id
+        values: Dict[str, Any] = {"version": PATIENTS_TABLE.c.version + 1}
+        for key in {key for update_data in updates.values() for key in update_data}:
+            by_id = {
+                patient_id: update_data[key]
+                for patient_id, update_data in updates.items()
+                if key in update_data
+            }
+            distinct = set(by_id.values())
+            if len(by_id) == len(updates) and len(distinct) == 1:
+                values[key] = distinct.pop()
+            else:
+                values[key] = case(by_id, value=id_column, else_=PATIENTS_TABLE.c[key])
+        stmt = (
+            update(PATIENTS_TABLE)
+            .where(id_column.in_(list(updates)))
+            .values(**values)
+            .returning(*PATIENTS_TABLE.c)
+        )
+        if expected_versions:
+            stmt = stmt.where(
+                PATIENTS_TABLE.c.version
+                == case(expected_versions, value=id_column, else_=PATIENTS_TABLE.c.version)
+            )
+        return stmt
+
+    @staticmethod
+    def _transfer_statement(
+        ward: int,
+        to_ward: int,
+        room: Optional[int] = None,
+        rooms: Optional[Dict[int, int]] = None,
+        patient_ids: Optional[List[str]] = None,
+    ) -> Update:
+        """
+        Builds the UPDATE moving the admitted patients of a ward to another
+        ward, returning the moved rows. They all go to one room, or each room
+        is mapped to a room of the new ward (patients in unmapped rooms stay).
+        Args:
+            ward: The ward to move the patients out of.
+            to_ward: The ward to move them to.
+            room: The room of to_ward receiving every patient.
+            rooms: Maps rooms of ward to rooms of to_ward, used if room is None.
+            patient_ids: If given, only move these patients.
+        """
+        stmt = (
+            update(PATIENTS_TABLE)
+            .where(PATIENTS_TABLE.c.ward == ward, PATIENTS_TABLE.c.checkout.is_(None))
+            .returning(*PATIENTS_TABLE.c)
+        )
+        if room is not None:
+            new_room: Any = room
+        else:
+            new_room = case(rooms, value=PATIENTS_TABLE.c.room, else_=PATIENTS_TABLE.c.room)
+            stmt = stmt.where(PATIENTS_TABLE.c.room.in_(list(rooms)))
+        if patient_ids is not None:
+            stmt = stmt.where(PATIENTS_TABLE.c.id.in_(patient_ids))
+        return stmt.values(ward=to_ward, room=new_room, version=PATIENTS_TABLE.c.version + 1)
+
+    @staticmethod
+    def _versions_statement(patient_ids: List[str]) -> Select:
+        """Builds the query reading the ID and version of some patients."""
+        return select(PATIENTS_TABLE.c.id, PATIENTS_TABLE.c.version).where(
+            PATIENTS_TABLE.c.id.in_(patient_ids)
+        )
+
+    @staticmethod
+    def _unmatched_expected(
+        expected_versions: Optional[Dict[str, int]], patients: List[Dict[str, Any]]
+    ) -> List[str]:
+        """
+        Returns the patients a conditional batch update expected at some
+        version but did not update: they are either gone or at another version.
+        """
+        if not expected_versions:
+            return []
+        updated = {patient["id"] for patient in patients}
+        return [patient_id for patient_id in expected_versions if patient_id not in updated]
+
+    @staticmethod
+    def _delete_statement(patient_id: str, expected_version: Optional[int] = None) -> Delete:
+        """
+        Builds a DELETE of one patient returning the deleted row, optionally
+        conditional on its version.
+        """
+        stmt = (
+            delete(PATIENTS_TABLE)
+            .where(PATIENTS_TABLE.c.id == patient_id)
+            .returning(*PATIENTS_TABLE.c)
+        )
+        if expected_version is not None:
+            stmt = stmt.where(PATIENTS_TABLE.c.version == expected_version)
+        return stmt
+
+    @staticmethod
+    def _archived_patient_statement(patient_id: str) -> Select:
+        """Builds the query reading one archived patient."""
+        return select(*ARCHIVED_PATIENT_COLUMNS).where(PATIENTS_ARCHIVE_TABLE.c.id == patient_id)
+
+    @staticmethod
+    def _archive_statement(checked_out_before: str, limit: int) -> Delete:
+        """
+        Builds the DELETE removing, and returning, the patients checked out
+        longest before a time, at most limit of them; they are found through
+        the checkout index.
+        """
+        oldest = (
+            select(PATIENTS_TABLE.c.id)
+            .where(PATIENTS_TABLE.c.checkout < checked_out_before)
+            .order_by(PATIENTS_TABLE.c.checkout)
+            .limit(limit)
+        )
+        return (
+            delete(PATIENTS_TABLE)
+            .where(PATIENTS_TABLE.c.id.in_(oldest.scalar_subquery()))
+            .returning(*PATIENTS_TABLE.c)
+        )
+
+    @staticmethod
+    def _archive_cutoff(max_age_days: float) -> str:
+        """Returns the checkout time before which patients are archived."""
+        cutoff = datetime.now(timezone.utc) - timedelta(days=max_age_days)
+        return cutoff.strftime(TIMESTAMP_FORMAT)
+
+    @staticmethod
+    def _archive_rows(patients: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Builds the archive rows of some patients removed from the live table."""
+        archived_at = datetime.now(timezone.utc).strftime(TIMESTAMP_FORMAT)
+        return [dict(patient, archived_at=archived_at) for patient in patients]
+
+    @staticmethod
+    def _version_statement(patient_id: str) -> Select:
+        """Builds the query reading the version of one patient."""
+        return select(PATIENTS_TABLE.c.version).where(PATIENTS_TABLE.c.id == patient_id)
+
+    @staticmethod
+    def _table_version_statement() -> Select:
+        """Builds the query reading the version of the patients table."""
+        return select(TABLE_VERSIONS_TABLE.c.version).where(
+            TABLE_VERSIONS_TABLE.c.name == PATIENTS_TABLE_NAME
+        )
+
+    @staticmethod
+    def _bump_table_version_statement() -> Update:
+        """Builds the UPDATE incrementing the patients table version, returning it."""
+        return (
+            update(TABLE_VERSIONS_TABLE)
+            .where(TABLE_VERSIONS_TABLE.c.name == PATIENTS_TABLE_NAME)
+            .values(version=TABLE_VERSIONS_TABLE.c.version + 1)
+            .returning(TABLE_VERSIONS_TABLE.c.version)
+        )
+
+    @staticmethod
+    def _change_rows(operation: str, patients: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Builds the change log rows recording a write of some patients."""
+        changed_at = datetime.now(timezone.utc).strftime(TIMESTAMP_FORMAT)
+        return [
+            {
+                "patient_id": patient["id"],
+                "operation": operation,
+                "changed_at": changed_at,
+                "patient": patient,
+            }
+            for patient in patients
+        ]
+
+    @staticmethod
+    def _stats_statement(stats_table: Table, key: str, maintained: bool) -> Select:
+        """
+        Builds the query reading a workload counters table, ordered by key.
+        When the counters are not maintained (databases other than SQLite),
+        the query counts the patients instead.
+        """
+        if maintained:
+            return select(stats_table).order_by(stats_table.c[key])
+        return stats_counts_statement(key).order_by(PATIENTS_TABLE.c[key])
+
+    @staticmethod
+    def _stats_mismatch_statement(stats_table: Table, key: str) -> Select:
+        """
+        Builds the query comparing a counters table with a fresh count of
+        the patients, in one statement (one snapshot), and returning the
+        keys whose counters are wrong.
+        """
+        counted = stats_counts_statement(key).subquery()
+        active, checked_out = ACTIVE_PATIENTS_COLUMN, CHECKED_OUT_PATIENTS_COLUMN
+        return (
+            select(
+                func.coalesce(counted.c[key], stats_table.c[key]).label("key"),
+                func.coalesce(stats_table.c[active], 0).label("stored_active"),
+                func.coalesce(stats_table.c[checked_out], 0).label("stored_checked_out"),
+                func.coalesce(counted.c[active], 0).label("counted_active"),
+                func.coalesce(counted.c[checked_out], 0).label("counted_checked_out"),
+            )
+            .select_from(counted.join(stats_table, counted.c[key] == stats_table.c[key], full=True))
+            .where(
+                or_(
+                    func.coalesce(stats_table.c[active], 0) != func.coalesce(counted.c[active], 0),
+                    func.coalesce(stats_table.c[checked_out], 0)
+                    != func.coalesce(counted.c[checked_out], 0),
+                )
+            )
+        )
+
+    @staticmethod
+    def _mismatch_to_dict(stats_table: Table, row: Any) -> Dict[str, Any]:
+        """Converts a row of _stats_mismatch_statement to a report entry."""
+        return {
+            "table": stats_table.name,
+            "key": row.key,
+            "stored": {
+                ACTIVE_PATIENTS_COLUMN: row.stored_active,
+                CHECKED_OUT_PATIENTS_COLUMN: row.stored_checked_out,
+            },
+            "counted": {
+                ACTIVE_PATIENTS_COLUMN: row.counted_active,
+                CHECKED_OUT_PATIENTS_COLUMN: row.counted_checked_out,
+            },
+        }
+
+    @staticmethod
+    def _last_change_statement() -> Select:
+        """Builds the query reading the seq of the latest change (0 if none)."""
+        return select(func.coalesce(func.max(PATIENT_CHANGES_TABLE.c.seq), 0))
+
+    @staticmethod
+    def _changes_statement(since: int, limit: int) -> Select:
+        """Builds the query reading the changes after a sequence number, oldest first."""
+        return (
+            select(PATIENT_CHANGES_TABLE)
+            .where(PATIENT_CHANGES_TABLE.c.seq > since)
+            .order_by(PATIENT_CHANGES_TABLE.c.seq)
+            .limit(limit)
+        )
+
+
+class PatientDB(PatientDBBase):
+    """
+    A class for interacting with the patient database.
+    Provides methods for CRUD operations on patient records.
+    """
+
+    def __init__(
+        self,
+        cache: Optional[CacheBackend] = None,
+        occupancy: Optional[OccupancyIndex] = None,
+        storage: Optional[Storage] = None,
+        write_queue: Optional[GroupCommitQueue] = None,
+    ) -> None:
+        """
+        Initializes the database accessor.
+        Args:
+            cache: An optional cache in front of select_patient. Every write
+                method invalidates the records it touches.
+            occupancy: An optional ward/room occupancy index, updated by every
+                write method. Call load_occupancy() to fill it.
+            storage: The database to use; defaults to the PATIENT_DB_URL
+                profile. It is only connected on first use.
+            write_queue: An optional group-commit queue on this storage. The
+                single-patient inserts and updates are then committed together
+                with those of other threads.
+        """
+        super().__init__(cache, occupancy, storage)
+        self.write_queue = write_queue
+
+    def _write(self, apply: Callable[[Any], Any]) -> Any:
+        """
+        Runs a write, a function of a connection, in its own transaction, or
+        in a transaction shared with other threads through the write queue.
+        Returns:
+            What apply returned, once committed.
+        """
+        if self.write_queue is not None:
+            return self.write_queue.submit(apply)
+        with self.storage.engine.begin() as conn:
+            return apply(conn)
+
+    def _log_writes(
+        self, conn: Any, operation: str, patients: List[Dict[str, Any]]
+    ) -> int:
+        """
+        Appends a write to the change log and bumps the table version, inside
+        the transaction of the write.
+        Returns:
+            The new table version.
+        """
+        conn.execute(insert(PATIENT_CHANGES_TABLE), self._change_rows(operation, patients))
+        return conn.execute(self._bump_table_version_statement()).scalar()
+
+    def table_version(self) -> Optional[int]:
+        """
+        Returns the version of the patients table, bumped by every write.
+        It is read from the database once, then kept up to date in memory by
+        the write methods, so checking it costs no query. The writes of other
+        processes reach it through sync_changes() (PATIENT_SYNC_CHANGES).
+        Returns:
+            The table version, or None on error.
+        """
+        if self._table_version is None:
+            self._load_table_version()
+        return self._table_version
+
+    def _load_table_version(self) -> None:
+        """Reads the table version from the database."""
+        try:
+            with self.storage.read_engine.connect() as conn:
+                self._record_table_version(
+                    conn.execute(self._table_version_statement()).scalar_one()
+                )
+        except SQLAlchemyError as e:
+            record_db_error("table_version", e)
+
     def insert_patient(self, patient_data: Dict[str, Any]) -> Optional[str]:
         """
         Inserts a new patient record into the database.
@@ -24,67 +691,274 @@ class PatientDB:
         Returns:
             The primary key of the inserted patient, or None if an error occurs.
         """
+
+        def apply(conn):
+            result = conn.execute(insert(PATIENTS_TABLE).values(**patient_data))
+            table_version = self._log_writes(conn, CHANGE_INSERT, [patient_data])
+            return result.inserted_primary_key, table_version
+
         try:
-            with ENGINE.connect() as conn:
-                stmt = insert(PATIENTS_TABLE).values(**patient_data)
-                result = conn.execute(stmt)
-                conn.commit()
-                if result.inserted_primary_key:
-                    return str(result.inserted_primary_key[0])
-                return None
+            inserted_primary_key, table_version = self._write(apply)
         except SQLAlchemyError as e:
-            print(f"Error inserting patient: {e}")
+            record_db_error("insert_patient", e)
             return None
+        self._after_write(patient_data["id"], patient_data, table_version)
+        if inserted_primary_key:
+            return str(inserted_primary_key[0])
+        return None
+
+    def insert_patients(
+        self, patients_data: List[Dict[str, Any]]
+    ) -> List[Optional[str]]:
+        """
+        Inserts many patient records in a single transaction.
+        If the batch insert fails, each record is retried on its own so that
+        one bad record does not reject the others.
+        Args:
+            patients_data: A list of dictionaries containing the patients' information.
+        Returns:
+            The primary key of each inserted patient, in input order, with None
+            for the records that could not be inserted.
+        """
+        if not patients_data:
+            return []
+        try:
+            with self.storage.engine.begin() as conn:
+                conn.execute(insert(PATIENTS_TABLE), patients_data)
+                table_version = self._log_writes(conn, CHANGE_INSERT, patients_data)
+            self._after_writes(patients_data, table_version)
+            return [str(patient_data["id"]) for patient_data in patients_data]
+        except SQLAlchemyError as e:
+            record_db_error("insert_patients", e)
+        return [self.insert_patient(patient_data) for patient_data in patients_data]
 
-    def select_all_patients(self) -> Optional[List[Dict[str, Any]]]:
+    def load_occupancy(self) -> bool:
+        """
+        Fills the occupancy index from the admitted patients. This is the
+        only scan the index needs; afterwards it is maintained by the writes.
+        Returns:
+            True if the index was loaded, False if disabled or on error.
+        """
+        if self.occupancy is None:
+            return False
+        try:
+            with self.storage.read_engine.connect() as conn:
+                # Both reads see the same snapshot, so sync_changes() resumes
+                # exactly after the writes the index reflects.
+                change_seq = conn.execute(self._last_change_statement()).scalar_one()
+                result = conn.execute(self._admitted_statement())
+                self.occupancy.load(self._row_to_dict(row) for row in result)
+                self._change_seq = change_seq
+                return True
+        except SQLAlchemyError as e:
+            record_db_error("load_occupancy", e)
+            return False
+
+    def sync_changes(self, batch_size: int = 1000) -> int:
+        """
+        Applies the writes logged since the last sync to the in-memory state:
+        drops their records from the cache, updates the occupancy index and
+        refreshes the table version. Only needed when several processes serve
+        the same database, as each process only sees its own writes otherwise;
+        re-applying this process's writes is harmless.
+        Args:
+            batch_size: The number of changes read per query.
+        Returns:
+            The number of changes applied.
+        """
+        applied = 0
+        try:
+            if self._change_seq is None:
+                with self.storage.read_engine.connect() as conn:
+                    self._change_seq = conn.execute(self._last_change_statement()).scalar_one()
+            while True:
+                with self.storage.read_engine.connect() as conn:
+                    changes = conn.execute(
+                        self._changes_statement(self._change_seq, batch_size)
+                    ).fetchall()
+                self._apply_changes(changes)
+                applied += len(changes)
+                if len(changes) < batch_size:
+                    break
+        except SQLAlchemyError as e:
+            record_db_error("sync_changes", e)
+        if applied:
+            self._load_table_version()
+            self.change_notifier.notify()
+        return applied
+
+    def select_all_patients(
+        self, filters: Optional[Dict[str, Any]] = None, as_records: bool = False
+    ) -> Optional[List[Union[Dict[str, Any], PatientRecord]]]:
         """
         Retrieves all patient records from the database.
+        Args:
+            filters: Optional GET /patients filters restricting the records.
+            as_records: If True, return compact PatientRecord objects built
+                straight from the row tuples instead of dictionaries.
         Returns:
-            A list of dictionaries representing patient records, or None on error.
+            A list of patient records, or None on error.
         """
         try:
-            with ENGINE.connect() as conn:
-                stmt = select(PATIENTS_TABLE)
+            with self.storage.read_engine.connect() as conn:
+                stmt = self._filtered_statement(filters)
                 result = conn.execute(stmt)
-                return [self._row_to_dict(row) for row in result]
+                convert = self._row_converter(as_records)
+                return [convert(row) for row in result]
+        except SQLAlchemyError as e:
+            record_db_error("select_all_patients", e)
+            return None
+
+    def select_patients_page(
+        self,
+        limit: int,
+        cursor: Optional[str] = None,
+        filters: Optional[Dict[str, Any]] = None,
+        as_records: bool = False,
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Retrieves one page of patient records using keyset pagination on the id.
+        Args:
+            limit: The maximum number of patients to return.
+            cursor: The id of the last patient of the previous page, if any.
+            filters: Optional GET /patients filters restricting the records.
+            as_records: If True, the page holds PatientRecord objects.
+        Returns:
+            A dictionary with the 'patients' of the page and the 'next_cursor'
+            to pass for the following page (None on the last page), or None on error.
+        """
+        try:
+            with self.storage.read_engine.connect() as conn:
+                stmt = self._page_statement(limit, cursor, filters)
+                rows = conn.execute(stmt).fetchall()
+                return self._page_from_rows(rows, limit, as_records)
         except SQLAlchemyError as e:
-            print(f"Error selecting all patients: {e}")
+            record_db_error("select_patients_page", e)
             return None
 
-    def search_patients_by_name(self, name: str) -> Optional[List[Dict[str, Any]]]:
+    def iter_patients(
+        self,
+        batch_size: int = 500,
+        filters: Optional[Dict[str, Any]] = None,
+        as_records: bool = False,
+    ) -> Iterator[Union[Dict[str, Any], PatientRecord]]:
+        """
+        Lazily yields all patient records, ordered by id.
+        Rows are streamed from the database cursor, so memory use does not
+        grow with the size of the table.
+        Args:
+            batch_size: The number of rows fetched from the cursor at a time.
+            filters: Optional GET /patients filters restricting the records.
+            as_records: If True, yield PatientRecord objects.
+        Yields:
+            Each patient record.
+        """
+        convert = self._row_converter(as_records)
+        try:
+            with self.storage.read_engine.connect() as conn:
+                stmt = self._filtered_statement(filters)
+                stmt = stmt.order_by(stmt.selected_columns.id)
+                result = conn.execution_options(
+                    stream_results=True, yield_per=batch_size
+                ).execute(stmt)
+                for row in result:
+                    yield convert(row)
+        except SQLAlchemyError as e:
+            record_db_error("iter_patients", e)
+
+    def iter_patient_chunks(
+        self, chunk_size: int, filters: Optional[Dict[str, Any]] = None
+    ) -> Iterator[List[Any]]:
+        """
+        Lazily yields all patient rows, ordered by id, in chunks read through
+        a server-side cursor: memory use depends on the chunk size, not on
+        the number of patients. The rows come from one read transaction, so
+        the chunks form a consistent snapshot.
+        Args:
+            chunk_size: The number of rows per chunk.
+            filters: Optional GET /patients filters restricting the records.
+        Yields:
+            Lists of rows with all PATIENTS_TABLE columns, in column order.
+        """
+        try:
+            with self.storage.read_engine.connect() as conn:
+                stmt = self._filtered_statement(filters)
+                stmt = stmt.order_by(stmt.selected_columns.id)
+                result = conn.execution_options(
+                    stream_results=True, yield_per=chunk_size
+                ).execute(stmt)
+                yield from result.partitions()
+        except SQLAlchemyError as e:
+            record_db_error("iter_patient_chunks", e)
+
+    def search_patients_by_name(
+        self,
+        name: str,
+        prefix: bool = False,
+        limit: Optional[int] = None,
+        include_archived: bool = False,
+    ) -> Optional[List[Dict[str, Any]]]:
         """
         Searches for patients by name (case-insensitive).
+        Terms of three or more characters are served from the trigram
+        full-text index and ranked by relevance, with names starting with the
+        term listed first.
         Args:
             name: The name to search for.
+            prefix: If True, only match names (or words of names) starting with the term.
+            limit: The maximum number of results to return, if any.
+            include_archived: If True, archived patients are listed after the
+                live ones, up to the limit.
         Returns:
             A list of matching patient records, or None on error.
         """
         try:
-            with ENGINE.connect() as conn:
-                stmt = select(PATIENTS_TABLE).where(
-                    PATIENTS_TABLE.c.name.ilike(f"%{name}%")
+            with self.storage.read_engine.connect() as conn:
+                stmt = self._search_statement(
+                    name, prefix, limit, self.storage.name_search_enabled
                 )
-                result = conn.execute(stmt)
-                return [self._row_to_dict(row) for row in result]
+                patients = [self._row_to_dict(row) for row in conn.execute(stmt)]
+                if include_archived and (limit is None or len(patients) < limit):
+                    remaining = None if limit is None else limit - len(patients)
+                    stmt = self._search_statement(name, prefix, remaining, archived=True)
+                    patients.extend(self._row_to_dict(row) for row in conn.execute(stmt))
+                return patients
         except SQLAlchemyError as e:
-            print(f"Error searching for patients by name: {e}")
+            record_db_error("search_patients_by_name", e)
             return None
 
-    def select_patient(self, patient_id: str) -> Optional[Dict[str, Any]]:
+    def select_patient(
+        self, patient_id: str, include_archived: bool = False
+    ) -> Optional[Dict[str, Any]]:
         """
         Retrieves a specific patient record by their ID.
         Args:
             patient_id: The ID of the patient to retrieve.
+            include_archived: If True, a patient missing from the live table
+                is looked up in the archive.
         Returns:
             A dictionary representing the patient, or None if not found or on error.
         """
+        if self.cache is not None:
+            patient = self.cache.get(patient_id)
+            if patient is not None:
+                return patient
+            generation = self._cache_generation(patient_id)
         try:
-            with ENGINE.connect() as conn:
+            with self.storage.read_engine.connect() as conn:
                 stmt = select(PATIENTS_TABLE).where(PATIENTS_TABLE.c.id == patient_id)
                 row = conn.execute(stmt).first()
-                return self._row_to_dict(row) if row else None
+                if row is None:
+                    if include_archived:
+                        row = conn.execute(self._archived_patient_statement(patient_id)).first()
+                    # Archived patients are not cached: the cache holds the live set.
+                    return None if row is None else self._row_to_dict(row)
+                patient = self._row_to_dict(row)
+                if self.cache is not None:
+                    self._cache_fill(patient_id, patient, generation)
+                return patient
         except SQLAlchemyError as e:
-            print(f"Error selecting patient: {e}")
+            record_db_error("select_patient", e)
             return None
 
     def update_patient(
@@ -99,33 +973,335 @@ class PatientDB:
             The number of rows affected, or None on error.
         """
         try:
-            with ENGINE.connect() as conn:
-                stmt = (
-                    update(PATIENTS_TABLE)
-                    .where(PATIENTS_TABLE.c.id == patient_id)
-                    .values(**update_data)
-                )
-                result = conn.execute(stmt)
-                conn.commit()
-                return result.rowcount
+            updated_patient = self.update_patient_returning(patient_id, update_data)
+            return 0 if updated_patient is None else 1
         except SQLAlchemyError as e:
-            print(f"Error updating patient: {e}")
+            record_db_error("update_patient", e)
             return None
 
-    def delete_patient(self, patient_id: str) -> Optional[int]:
+    def update_patient_returning(
+        self,
+        patient_id: str,
+        update_data: Dict[str, Any],
+        expected_version: Optional[int] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Updates a patient record and returns it in a single statement.
+        Args:
+            patient_id: The ID of the patient to update.
+            update_data: A dictionary with the fields to update.
+            expected_version: If given, only update the patient if it is still
+                at this version (compare-and-set).
+        Returns:
+            A dictionary representing the updated patient, or None if not found.
+        Raises:
+            VersionConflictError: If the patient is at another version.
+            SQLAlchemyError: If the update fails.
+        """
+
+        def apply(conn):
+            stmt = self._update_returning_statement(patient_id, update_data, expected_version)
+            row = conn.execute(stmt).first()
+            if row is None:
+                self._check_version_conflict(conn, patient_id, expected_version)
+                return None, None
+            patient = self._row_to_dict(row)
+            return patient, self._log_writes(conn, CHANGE_UPDATE, [patient])
+
+        patient, table_version = self._write(apply)
+        self._after_write(patient_id, patient, table_version)
+        return patient
+
+    def _check_version_conflict(
+        self, conn: Any, patient_id: str, expected_version: Optional[int]
+    ) -> None:
+        """
+        Explains why a conditional write matched no row: raises if the patient
+        exists at another version, returns if it does not exist.
+        """
+        if expected_version is None:
+            return
+        current_version = conn.execute(self._version_statement(patient_id)).scalar()
+        if current_version is not None:
+            raise VersionConflictError(patient_id, current_version)
+
+    def checkout_patient(
+        self, patient_id: str, expected_version: Optional[int] = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Sets the checkout time of a patient to now.
+        Args:
+            patient_id: The ID of the patient to check out.
+            expected_version: If given, only check out the patient if it is
+                still at this version.
+        Returns:
+            A dictionary representing the checked out patient, or None if not found.
+        Raises:
+            VersionConflictError: If the patient is at another version.
+            SQLAlchemyError: If the update fails.
+        """
+        return self.update_patient_returning(
+            patient_id, self._checkout_values(), expected_version
+        )
+
+    def update_patients_returning(
+        self,
+        updates: Dict[str, Dict[str, Any]],
+        expected_versions: Optional[Dict[str, int]] = None,
+    ) -> Tuple[List[Dict[str, Any]], Dict[str, int]]:
+        """
+        Updates many patients, each with its own fields, in a single statement
+        and transaction: the batch is logged and committed once.
+        Args:
+            updates: Maps the ID of each patient to the fields to update.
+            expected_versions: Maps some of the patients to the version they
+                must still be at to be updated (compare-and-set).
+        Returns:
+            The updated patients, and the current version of the patients
+            not updated because they are at another version. The patients in
+            neither do not exist.
+        Raises:
+            SQLAlchemyError: If the update fails; no patient is updated.
+        """
+        if not updates:
+            return [], {}
+        table_version = None
+        with self.storage.engine.begin() as conn:
+            stmt = self._batch_update_statement(updates, expected_versions)
+            patients = [self._row_to_dict(row) for row in conn.execute(stmt)]
+            conflicts: Dict[str, int] = {}
+            unmatched = self._unmatched_expected(expected_versions, patients)
+            if unmatched:
+                conflicts = dict(conn.execute(self._versions_statement(unmatched)).all())
+            if patients:
+                table_version = self._log_writes(conn, CHANGE_UPDATE, patients)
+        self._after_writes(patients, table_version)
+        return patients, conflicts
+
+    def checkout_patients(self, patient_ids: List[str]) -> List[Dict[str, Any]]:
+        """
+        Checks many patients out now, in a single statement and transaction.
+        Args:
+            patient_ids: The IDs of the patients to check out.
+        Returns:
+            The checked out patients; the missing IDs do not exist.
+        Raises:
+            SQLAlchemyError: If the update fails; no patient is checked out.
+        """
+        checkout_values = self._checkout_values()
+        patients, _ = self.update_patients_returning(
+            {patient_id: checkout_values for patient_id in patient_ids}
+        )
+        return patients
+
+    def transfer_ward(
+        self,
+        ward: int,
+        to_ward: int,
+        room: Optional[int] = None,
+        rooms: Optional[Dict[int, int]] = None,
+        patient_ids: Optional[List[str]] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Moves the admitted patients of a ward to another ward in a single
+        statement and transaction.
+        Args:
+            ward: The ward to move the patients out of.
+            to_ward: The ward to move them to.
+            room: The room of to_ward receiving every patient.
+            rooms: Maps rooms of ward to rooms of to_ward, used if room is
+                None; patients in unmapped rooms are not moved.
+            patient_ids: If given, only move these patients.
+        Returns:
+            The moved patients.
+        Raises:
+            SQLAlchemyError: If the update fails; no patient is moved.
+        """
+        table_version = None
+        with self.storage.engine.begin() as conn:
+            stmt = self._transfer_statement(ward, to_ward, room, rooms, patient_ids)
+            patients = [self._row_to_dict(row) for row in conn.execute(stmt)]
+            if patients:
+                table_version = self._log_writes(conn, CHANGE_UPDATE, patients)
+        self._after_writes(patients, table_version)
+        return patients
+
+    def delete_patient(
+        self, patient_id: str, expected_version: Optional[int] = None
+    ) -> Optional[int]:
         """
         Deletes a patient record from the database.
         Args:
             patient_id: The ID of the patient to delete.
+            expected_version: If given, only delete the patient if it is still
+                at this version.
         Returns:
             The number of rows affected, or None on error.
+        Raises:
+            VersionConflictError: If the patient is at another version.
         """
         try:
-            with ENGINE.connect() as conn:
-                stmt = delete(PATIENTS_TABLE).where(PATIENTS_TABLE.c.id == patient_id)
-                result = conn.execute(stmt)
-                conn.commit()
-                return result.rowcount
+            table_version = None
+            with self.storage.engine.begin() as conn:
+                row = conn.execute(self._delete_statement(patient_id, expected_version)).first()
+                if row is None:
+                    self._check_version_conflict(conn, patient_id, expected_version)
+                else:
+                    table_version = self._log_writes(conn, CHANGE_DELETE, [self._row_to_dict(row)])
+            self._after_write(patient_id, None, table_version)
+            return 0 if row is None else 1
+        except SQLAlchemyError as e:
+            record_db_error("delete_patient", e)
+            return None
+
+    def archive_patients(
+        self, checked_out_before: str, batch_size: int = ARCHIVE_BATCH_SIZE
+    ) -> Optional[int]:
+        """
+        Moves one batch of patients checked out before a time from the live
+        table to the archive, in one short transaction. Each archived patient
+        is logged as an 'archive' change.
+        Args:
+            checked_out_before: An ISO-8601 UTC timestamp.
+            batch_size: The most patients to move.
+        Returns:
+            The number of patients archived, or None on error.
+        """
+        try:
+            table_version = None
+            with self.storage.engine.begin() as conn:
+                stmt = self._archive_statement(checked_out_before, batch_size)
+                patients = [self._row_to_dict(row) for row in conn.execute(stmt)]
+                if patients:
+                    conn.execute(insert(PATIENTS_ARCHIVE_TABLE), self._archive_rows(patients))
+                    table_version = self._log_writes(conn, CHANGE_ARCHIVE, patients)
+            self._archived(patients, table_version)
+            return len(patients)
+        except SQLAlchemyError as e:
+            record_db_error("archive_patients", e)
+            return None
+
+    def archive_checked_out(
+        self,
+        max_age_days: float = ARCHIVE_AFTER_DAYS,
+        batch_size: int = ARCHIVE_BATCH_SIZE,
+        pause: float = ARCHIVE_BATCH_PAUSE_SECONDS,
+    ) -> int:
+        """
+        Archives every patient checked out more than max_age_days ago,
+        batch by batch. The write lock is released, and held for one batch
+        only, between batches, so concurrent writes are only delayed briefly.
+        Args:
+            max_age_days: How long after their checkout patients are archived.
+            batch_size: The number of patients moved per transaction.
+            pause: Seconds to wait between batches.
+        Returns:
+            The number of patients archived.
+        """
+        checked_out_before = self._archive_cutoff(max_age_days)
+        archived = 0
+        while True:
+            moved = self.archive_patients(checked_out_before, batch_size)
+            if not moved:
+                return archived
+            archived += moved
+            if moved < batch_size:
+                return archived
+            time.sleep(pause)
+
+    def ward_stats(self) -> Optional[List[Dict[str, Any]]]:
+        """
+        Retrieves the workload counters of every ward.
+        Returns:
+            One dict per ward with its 'ward', 'active_patients' and
+            'checked_out_patients', or None on error.
+        """
+        return self._select_stats("ward_stats", WARD_STATS_TABLE, WARD_COLUMN)
+
+    def doctor_stats(self) -> Optional[List[Dict[str, Any]]]:
+        """
+        Retrieves the workload counters of every doctor.
+        Returns:
+            One dict per doctor with its 'doctor_name', 'active_patients' and
+            'checked_out_patients', or None on error.
+        """
+        return self._select_stats("doctor_stats", DOCTOR_STATS_TABLE, DOCTOR_NAME_COLUMN)
+
+    def _select_stats(
+        self, operation: str, stats_table: Table, key: str
+    ) -> Optional[List[Dict[str, Any]]]:
+        """Reads a workload counters table; None on error."""
+        try:
+            with self.storage.read_engine.connect() as conn:
+                stmt = self._stats_statement(stats_table, key, self.storage.stats_enabled)
+                return [self._row_to_dict(row) for row in conn.execute(stmt)]
+        except SQLAlchemyError as e:
+            record_db_error(operation, e)
+            return None
+
+    def check_stats(self) -> List[Dict[str, Any]]:
+        """
+        Compares the workload counters with a full count of the patients.
+        Returns:
+            One entry per wrong counter row: its 'table', 'key', and the
+            'stored' and 'counted' values. Empty if the counters are right.
+        Raises:
+            SQLAlchemyError: If the database cannot be read.
+        """
+        mismatches = []
+        with self.storage.read_engine.connect() as conn:
+            for stats_table, key in PATIENT_STATS_TABLES:
+                result = conn.execute(self._stats_mismatch_statement(stats_table, key))
+                mismatches.extend(self._mismatch_to_dict(stats_table, row) for row in result)
+        return mismatches
+
+    def rebuild_stats(self) -> None:
+        """
+        Recomputes the workload counters from scratch, in one transaction.
+        Raises:
+            SQLAlchemyError: If the counters cannot be written.
+        """
+        with self.storage.engine.begin() as conn:
+            rebuild_stats_counters(conn)
+
+    def select_changes(self, since: int = 0, limit: int = 100) -> Optional[List[Dict[str, Any]]]:
+        """
+        Retrieves the changes logged after a sequence number.
+        Args:
+            since: The seq of the last change already seen (0 for the whole log).
+            limit: The maximum number of changes to return.
+        Returns:
+            The changes, oldest first, each with its 'seq', 'patient_id',
+            'operation', 'changed_at' and 'patient' state; or None on error.
+        """
+        try:
+            with self.storage.read_engine.connect() as conn:
+                result = conn.execute(self._changes_statement(since, limit))
+                return [self._row_to_dict(row) for row in result]
         except SQLAlchemyError as e:
-            print(f"Error deleting patient: {e}")
+            record_db_error("select_changes", e)
             return None
+
+    def wait_for_changes(
+        self, since: int, limit: int, timeout: float
+    ) -> Optional[List[Dict[str, Any]]]:
+        """
+        Long-polls the change log: returns as soon as there are changes after
+        'since', or an empty list once the timeout expires. Writes of this
+        process wake the waiter up at once; writes of other processes are seen
+        within CHANGE_FEED_POLL_SECONDS.
+        Args:
+            since: The seq of the last change already seen.
+            limit: The maximum number of changes to return.
+            timeout: The longest time to wait, in seconds.
+        Returns:
+            The changes, oldest first, or None on error.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            generation = self.change_notifier.generation
+            changes = self.select_changes(since, limit)
+            remaining = deadline - time.monotonic()
+            if changes or changes is None or remaining <= 0:
+                return changes
+            self.change_notifier.wait(generation, min(remaining, CHANGE_FEED_POLL_SECONDS))
@@ -1,13 +1,140 @@
 # All sqlalchemy related config goes here, including the database schema definition.
 
-import sqlite3
-from sqlalchemy import create_engine
-from sqlalchemy import Table, Column, Integer, String, MetaData
+import os
+import threading
+import weakref
+from datetime import datetime, timezone
+from typing import Optional, Tuple
+from sqlalchemy import Select, case, create_engine, event, func, insert, inspect, or_, select, update
+from sqlalchemy import Table, Column, Index, Integer, JSON, String, MetaData, column, literal_column, table
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool, StaticPool
+from metrics import instrument_engine, record_db_error, timed_pool_class
+from change_feed import CHANGE_UPDATE
+from config import INITIAL_ROW_VERSION, TIMESTAMP_FORMAT
+
+# --- Storage profile ---
+# Every setting can be overridden from the environment.
+DB_FILE_PATH = os.environ.get("PATIENT_DB_FILE", "patient.db")
+DB_URL = os.environ.get("PATIENT_DB_URL", "sqlite:///" + DB_FILE_PATH)
+DB_ECHO = os.environ.get("PATIENT_DB_ECHO", "false").lower() == "true"
+
+# SQLite pragmas applied to every new connection.
+DB_JOURNAL_MODE = os.environ.get("PATIENT_DB_JOURNAL_MODE", "WAL")
+DB_SYNCHRONOUS = os.environ.get("PATIENT_DB_SYNCHRONOUS", "NORMAL")
+DB_CACHE_SIZE = int(os.environ.get("PATIENT_DB_CACHE_SIZE", "-64000"))  # negative = KiB
+DB_MMAP_SIZE = int(os.environ.get("PATIENT_DB_MMAP_SIZE", str(256 * 1024 * 1024)))
+DB_BUSY_TIMEOUT_SECONDS = float(os.environ.get("PATIENT_DB_BUSY_TIMEOUT", "5"))
+
+# Connection pool sizing, for the read-write and the read-only engines.
+DB_POOL_SIZE = int(os.environ.get("PATIENT_DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.environ.get("PATIENT_DB_MAX_OVERFLOW", "10"))
+DB_READ_POOL_SIZE = int(os.environ.get("PATIENT_DB_READ_POOL_SIZE", "10"))
+DB_READ_MAX_OVERFLOW = int(os.environ.get("PATIENT_DB_READ_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT_SECONDS = float(os.environ.get("PATIENT_DB_POOL_TIMEOUT", "30"))
+
+# Statements slower than this many milliseconds are logged; unset disables the log.
+DB_SLOW_QUERY_MS = os.environ.get("PATIENT_DB_SLOW_QUERY_MS")
+DB_SLOW_QUERY_SECONDS = float(DB_SLOW_QUERY_MS) / 1000 if DB_SLOW_QUERY_MS else None
+
+# Pool classes recording the time spent waiting for a connection.
+TIMED_QUEUE_POOL = timed_pool_class(QueuePool)
+TIMED_ASYNC_QUEUE_POOL = timed_pool_class(AsyncAdaptedQueuePool)
+
+
+def _is_in_memory(url) -> bool:
+    """Checks whether a SQLite URL points to a private in-memory database."""
+    return url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:")
+
+
+def _apply_sqlite_pragmas(engine, read_only: bool) -> None:
+    """
+    Registers a connect hook applying the storage profile pragmas.
+    Read-only connections are additionally put in query_only mode and
+    leave the (persistent) journal mode alone.
+    """
+
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        if read_only:
+            cursor.execute("PRAGMA query_only = ON")
+        else:
+            cursor.execute(f"PRAGMA journal_mode = {DB_JOURNAL_MODE}")
+        cursor.execute(f"PRAGMA synchronous = {DB_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA cache_size = {DB_CACHE_SIZE}")
+        cursor.execute(f"PRAGMA mmap_size = {DB_MMAP_SIZE}")
+        cursor.close()
+
+
+def _engine_name(read_only: bool, asyncio: bool = False) -> str:
+    """Returns the label of an engine and of its pool in the metrics."""
+    return ("async_" if asyncio else "") + ("read" if read_only else "write")
+
+
+def _engine_options(parsed_url, read_only: bool, asyncio: bool = False) -> dict:
+    """Builds the create_engine keyword arguments of the storage profile."""
+    options = {"echo": DB_ECHO}
+    if parsed_url.get_backend_name() == "sqlite":
+        options["connect_args"] = {"timeout": DB_BUSY_TIMEOUT_SECONDS}
+    if _is_in_memory(parsed_url):
+        # A private in-memory database only lives as long as its connection:
+        # share that single connection across threads.
+        options["poolclass"] = StaticPool
+        options["connect_args"]["check_same_thread"] = False
+    else:
+        options["poolclass"] = TIMED_ASYNC_QUEUE_POOL if asyncio else TIMED_QUEUE_POOL
+        options["pool_logging_name"] = _engine_name(read_only, asyncio)
+        options["pool_size"] = DB_READ_POOL_SIZE if read_only else DB_POOL_SIZE
+        options["max_overflow"] = DB_READ_MAX_OVERFLOW if read_only else DB_MAX_OVERFLOW
+        options["pool_timeout"] = DB_POOL_TIMEOUT_SECONDS
+    return options
+
+
+def create_storage_engine(url: str, read_only: bool = False):
+    """
+    Creates an engine configured with the storage profile.
+    Args:
+        url: The database URL.
+        read_only: Whether the engine only serves reads.
+    Returns:
+        The configured SQLAlchemy engine.
+    """
+    parsed_url = make_url(url)
+    engine = create_engine(parsed_url, **_engine_options(parsed_url, read_only))
+    if parsed_url.get_backend_name() == "sqlite":
+        _apply_sqlite_pragmas(engine, read_only)
+    instrument_engine(engine, _engine_name(read_only), DB_SLOW_QUERY_SECONDS)
+    return engine
+
+
+def create_async_storage_engine(url: str, read_only: bool = False):
+    """
+    Creates an asyncio engine configured with the storage profile.
+    SQLite URLs are switched to the aiosqlite driver, which must be installed.
+    Args:
+        url: The database URL.
+        read_only: Whether the engine only serves reads.
+    Returns:
+        The configured SQLAlchemy AsyncEngine.
+    """
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    parsed_url = make_url(url)
+    if parsed_url.get_backend_name() == "sqlite":
+        parsed_url = parsed_url.set(drivername="sqlite+aiosqlite")
+    engine = create_async_engine(
+        parsed_url, **_engine_options(parsed_url, read_only, asyncio=True)
+    )
+    if parsed_url.get_backend_name() == "sqlite":
+        _apply_sqlite_pragmas(engine.sync_engine, read_only)
+    instrument_engine(
+        engine.sync_engine, _engine_name(read_only, asyncio=True), DB_SLOW_QUERY_SECONDS
+    )
+    return engine
 
-DB_FILE_PATH = "patient.db"
 
-CONN = sqlite3.connect(DB_FILE_PATH)
-ENGINE = create_engine("sqlite:///" + DB_FILE_PATH, echo=True)
 METADATA = MetaData()
 
 PATIENTS_TABLE_NAME = "patients"
@@ -19,6 +146,8 @@ CHECKIN_COLUMN = "checkin"
 CHECKOUT_COLUMN = "checkout"
 WARD_COLUMN = "ward"
 ROOM_COLUMN = "room"
+DOCTOR_NAME_COLUMN = "doctor_name"
+VERSION_COLUMN = "version"
 
 PATIENT_COLUMN_NAMES = [
     ID_COLUMN,
@@ -31,18 +160,593 @@ PATIENT_COLUMN_NAMES = [
     CHECKIN_COLUMN,
 ]
 
-PATIENTS_TABLE = Table(
-    PATIENTS_TABLE_NAME,
+
+def _patient_columns() -> list:
+    """Builds the columns of a patient record, for the live and the archive tables."""
+    return [
+        Column(ID_COLUMN, String, primary_key=True),
+        Column(NAME_COLUMN, String),
+        Column(AGE_COLUMN, Integer),
+        Column(GENDER_COLUMN, String),
+        Column(CHECKIN_COLUMN, String),
+        Column(CHECKOUT_COLUMN, String),
+        Column(WARD_COLUMN, Integer),
+        Column(ROOM_COLUMN, Integer),
+        Column(DOCTOR_NAME_COLUMN, String),
+        # Bumped by every update of the row; served as its ETag.
+        Column(VERSION_COLUMN, Integer, nullable=False, server_default=str(INITIAL_ROW_VERSION)),
+    ]
+
+
+PATIENTS_TABLE = Table(PATIENTS_TABLE_NAME, METADATA, *_patient_columns())
+
+# Patients checked out long ago, moved out of the patients table by the
+# archiver (PatientDB.archive_checked_out) so that the live table, and every
+# scan of it, only grows with the recent admissions. Same columns, plus the
+# time each row was archived.
+PATIENTS_ARCHIVE_TABLE_NAME = "patients_archive"
+ARCHIVED_AT_COLUMN = "archived_at"
+PATIENTS_ARCHIVE_TABLE = Table(
+    PATIENTS_ARCHIVE_TABLE_NAME,
     METADATA,
-    Column(ID_COLUMN, String, primary_key=True),
-    Column(NAME_COLUMN, String),
-    Column(AGE_COLUMN, Integer),
-    Column(GENDER_COLUMN, String),
-    Column(CHECKIN_COLUMN, String),
-    Column(CHECKOUT_COLUMN, String),
-    Column(WARD_COLUMN, Integer),
-    Column(ROOM_COLUMN, Integer),
-    Column("doctor_name", String),
+    *_patient_columns(),
+    Column(ARCHIVED_AT_COLUMN, String, nullable=False),
+)
+# The archive columns matching those of the patients table, in the same order.
+ARCHIVED_PATIENT_COLUMNS = [PATIENTS_ARCHIVE_TABLE.c[name] for name in PATIENTS_TABLE.c.keys()]
+
+# Monotonic version of each table, bumped in the same transaction as every
+# write to it, so listings can be served as ETags and revalidated cheaply.
+TABLE_VERSIONS_TABLE_NAME = "table_versions"
+TABLE_VERSIONS_TABLE = Table(
+    TABLE_VERSIONS_TABLE_NAME,
+    METADATA,
+    Column("name", String, primary_key=True),
+    Column("version", Integer, nullable=False),
+)
+
+# Ordered log of the patient writes behind GET /patients/changes. Each write
+# appends its rows in the same transaction, so the log never misses or
+# invents a change; seq is never reused, even after old entries are purged.
+PATIENT_CHANGES_TABLE_NAME = "patient_changes"
+PATIENT_CHANGES_TABLE = Table(
+    PATIENT_CHANGES_TABLE_NAME,
+    METADATA,
+    Column("seq", Integer, primary_key=True, autoincrement=True),
+    Column("patient_id", String, nullable=False),
+    Column("operation", String, nullable=False),  # insert, update, delete or archive
+    Column("changed_at", String, nullable=False),
+    # The patient after the write; for a delete, its last state.
+    Column("patient", JSON),
+    sqlite_autoincrement=True,
+)
+
+# Workload counters behind GET /wards/stats and GET /doctors/stats: the
+# admitted and checked-out patients of the live table per ward and per
+# doctor. SQLite triggers (PATIENT_STATS_DDL) update them in the transaction
+# of every write, so the endpoints read a few rows instead of grouping the
+# patients table.
+ACTIVE_PATIENTS_COLUMN = "active_patients"
+CHECKED_OUT_PATIENTS_COLUMN = "checked_out_patients"
+
+
+def _stats_table(name: str, key: Column) -> Table:
+    """Builds a counters table keyed by a patient column."""
+    return Table(
+        name,
+        METADATA,
+        key,
+        Column(ACTIVE_PATIENTS_COLUMN, Integer, nullable=False, server_default="0"),
+        Column(CHECKED_OUT_PATIENTS_COLUMN, Integer, nullable=False, server_default="0"),
+    )
+
+
+WARD_STATS_TABLE = _stats_table("ward_stats", Column(WARD_COLUMN, Integer, primary_key=True))
+DOCTOR_STATS_TABLE = _stats_table("doctor_stats", Column(DOCTOR_NAME_COLUMN, String, primary_key=True))
+# Each counters table with the patient column it counts by.
+PATIENT_STATS_TABLES = [(WARD_STATS_TABLE, WARD_COLUMN), (DOCTOR_STATS_TABLE, DOCTOR_NAME_COLUMN)]
+
+# Secondary indexes backing the GET /patients filters, on the live and archive
+# tables. The composite ones end with id, so that the pages of a listing,
+# ordered by id, are read from the index in order instead of being sorted.
+# Room numbers are unique across wards, so a room is searched on its own too.
+def _filter_indexes(patients: Table) -> list:
+    """Builds the filter indexes shared by the live and the archive tables."""
+    return [
+        Index(f"ix_{patients.name}_ward_room_id", patients.c.ward, patients.c.room, patients.c.id),
+        Index(f"ix_{patients.name}_room_id", patients.c.room, patients.c.id),
+        Index(
+            f"ix_{patients.name}_doctor_name_checkout_id",
+            patients.c.doctor_name,
+            patients.c.checkout,
+            patients.c.id,
+        ),
+        Index(f"ix_{patients.name}_gender_age", patients.c.gender, patients.c.age),
+        Index(f"ix_{patients.name}_age", patients.c.age),
+        Index(f"ix_{patients.name}_checkin", patients.c.checkin),
+    ]
+
+
+PATIENTS_INDEXES = [
+    *_filter_indexes(PATIENTS_TABLE),
+    Index("ix_patients_checkout_ward", PATIENTS_TABLE.c.checkout, PATIENTS_TABLE.c.ward),
+    # Every archived patient has checked out: the archiver and the checkout
+    # filters search this one.
+    *_filter_indexes(PATIENTS_ARCHIVE_TABLE),
+    Index("ix_patients_archive_checkout", PATIENTS_ARCHIVE_TABLE.c.checkout),
+]
+# Indexes of older versions, replaced by PATIENTS_INDEXES.
+SUPERSEDED_INDEXES = ["ix_patients_ward_room", "ix_patients_doctor_name_checkout"]
+
+def migrate_schema(engine) -> None:
+    """
+    Brings databases created by older versions up to the current schema:
+    create_all skips existing tables, so missing columns and indexes are
+    added here, superseded indexes dropped, and the table versions seeded.
+    """
+    columns = {column["name"] for column in inspect(engine).get_columns(PATIENTS_TABLE_NAME)}
+    with engine.begin() as conn:
+        if VERSION_COLUMN not in columns:
+            conn.exec_driver_sql(
+                f"ALTER TABLE {PATIENTS_TABLE_NAME} ADD COLUMN {VERSION_COLUMN} "
+                f"INTEGER NOT NULL DEFAULT {INITIAL_ROW_VERSION}"
+            )
+        exists = conn.execute(
+            TABLE_VERSIONS_TABLE.select().where(
+                TABLE_VERSIONS_TABLE.c.name == PATIENTS_TABLE_NAME
+            )
+        ).first()
+        if exists is None:
+            conn.execute(
+                TABLE_VERSIONS_TABLE.insert().values(name=PATIENTS_TABLE_NAME, version=0)
+            )
+        for index_name in SUPERSEDED_INDEXES:
+            conn.exec_driver_sql(f"DROP INDEX IF EXISTS {index_name}")
+    for index in PATIENTS_INDEXES:
+        index.create(engine, checkfirst=True)
+
+
+# Timestamps used to be stored as "dd-mm-YYYY HH:MM:SS", which does not sort
+# chronologically. This SQL expression rewrites such a value to ISO-8601.
+_LEGACY_TO_ISO_SQL = (
+    "substr({column}, 7, 4) || '-' || substr({column}, 4, 2) || '-' || "
+    "substr({column}, 1, 2) || 'T' || substr({column}, 12, 8) || 'Z'"
+)
+_LEGACY_TIMESTAMP_PATTERN = "__-__-____ __:__:__"
+# The PRAGMA user_version recorded once the legacy timestamps are converted,
+# so that the migration only walks the table once per database.
+LEGACY_TIMESTAMPS_MIGRATED_VERSION = 1
+
+
+def _legacy_to_iso(column_name: str):
+    """Builds the SQL converting a column's legacy timestamp, left as is otherwise."""
+    legacy_column = PATIENTS_TABLE.c[column_name]
+    return case(
+        (
+            legacy_column.like(_LEGACY_TIMESTAMP_PATTERN),
+            literal_column(_LEGACY_TO_ISO_SQL.format(column=column_name)),
+        ),
+        else_=legacy_column,
+    )
+
+
+def migrate_legacy_timestamps(engine, batch_size: int = 1000) -> int:
+    """
+    Converts checkin/checkout values still in the legacy format to ISO-8601.
+    The table is walked in rowid ranges, one short transaction per batch, so
+    the migration can run on a live database without blocking writers for long.
+    Like any other write, each batch bumps the version of the rows it converts
+    and the table version, and logs the rows in the change log, so that ETags
+    issued before the migration stop matching and change followers see it.
+    Its completion is recorded in the database's user_version, and databases
+    already migrated are skipped.
+    Args:
+        engine: The engine of the database to migrate.
+        batch_size: The number of rows examined per transaction.
+    Returns:
+        The number of rows converted.
+    """
+    if engine.dialect.name != "sqlite":
+        return 0
+    with engine.connect() as conn:
+        if conn.exec_driver_sql("PRAGMA user_version").scalar() >= LEGACY_TIMESTAMPS_MIGRATED_VERSION:
+            return 0
+        max_rowid = conn.exec_driver_sql(
+            f"SELECT max(rowid) FROM {PATIENTS_TABLE_NAME}"
+        ).scalar()
+    patients = PATIENTS_TABLE.c
+    converted = 0
+    start = 0
+    while max_rowid is not None and start < max_rowid:
+        stmt = (
+            update(PATIENTS_TABLE)
+            .where(
+                PATIENTS_ROWID > start,
+                PATIENTS_ROWID <= start + batch_size,
+                or_(
+                    patients[CHECKIN_COLUMN].like(_LEGACY_TIMESTAMP_PATTERN),
+                    patients[CHECKOUT_COLUMN].like(_LEGACY_TIMESTAMP_PATTERN),
+                ),
+            )
+            .values(
+                {
+                    CHECKIN_COLUMN: _legacy_to_iso(CHECKIN_COLUMN),
+                    CHECKOUT_COLUMN: _legacy_to_iso(CHECKOUT_COLUMN),
+                    VERSION_COLUMN: patients[VERSION_COLUMN] + 1,
+                }
+            )
+            .returning(*patients)
+        )
+        with engine.begin() as conn:
+            rows = conn.execute(stmt).mappings().all()
+            if rows:
+                changed_at = datetime.now(timezone.utc).strftime(TIMESTAMP_FORMAT)
+                conn.execute(
+                    insert(PATIENT_CHANGES_TABLE),
+                    [
+                        {
+                            "patient_id": row[ID_COLUMN],
+                            "operation": CHANGE_UPDATE,
+                            "changed_at": changed_at,
+                            "patient": dict(row),
+                        }
+                        for row in rows
+                    ],
+                )
+                conn.execute(
+                    update(TABLE_VERSIONS_TABLE)
+                    .where(TABLE_VERSIONS_TABLE.c.name == PATIENTS_TABLE_NAME)
+                    .values(version=TABLE_VERSIONS_TABLE.c.version + 1)
+                )
+            converted += len(rows)
+        start += batch_size
+    with engine.begin() as conn:
+        conn.exec_driver_sql(f"PRAGMA user_version = {LEGACY_TIMESTAMPS_MIGRATED_VERSION}")
+    return converted
+
+
+# Full-text name search: an FTS5 index over the patient names using the
+# trigram tokenizer, so substring searches are served from the index instead
+# of a full table scan. Triggers keep it in sync with the patients table.
+PATIENTS_FTS_TABLE_NAME = "patients_fts"
+PATIENTS_ROWID = literal_column(f"{PATIENTS_TABLE_NAME}.rowid")
+PATIENTS_FTS_TABLE = table(
+    PATIENTS_FTS_TABLE_NAME, column("rowid"), column(NAME_COLUMN), column("rank")
 )
+# The trigram tokenizer cannot match terms shorter than three characters.
+FTS_MIN_TERM_LENGTH = 3
+
+PATIENTS_FTS_DDL = [
+    f"""
+    CREATE VIRTUAL TABLE {PATIENTS_FTS_TABLE_NAME} USING fts5(
+        {NAME_COLUMN},
+        content='{PATIENTS_TABLE_NAME}',
+        content_rowid='rowid',
+        tokenize='trigram'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {PATIENTS_FTS_TABLE_NAME}_ai
+    AFTER INSERT ON {PATIENTS_TABLE_NAME} BEGIN
+        INSERT INTO {PATIENTS_FTS_TABLE_NAME}(rowid, {NAME_COLUMN})
+        VALUES (new.rowid, new.{NAME_COLUMN});
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {PATIENTS_FTS_TABLE_NAME}_ad
+    AFTER DELETE ON {PATIENTS_TABLE_NAME} BEGIN
+        INSERT INTO {PATIENTS_FTS_TABLE_NAME}({PATIENTS_FTS_TABLE_NAME}, rowid, {NAME_COLUMN})
+        VALUES ('delete', old.rowid, old.{NAME_COLUMN});
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {PATIENTS_FTS_TABLE_NAME}_au
+    AFTER UPDATE OF {NAME_COLUMN} ON {PATIENTS_TABLE_NAME} BEGIN
+        INSERT INTO {PATIENTS_FTS_TABLE_NAME}({PATIENTS_FTS_TABLE_NAME}, rowid, {NAME_COLUMN})
+        VALUES ('delete', old.rowid, old.{NAME_COLUMN});
+        INSERT INTO {PATIENTS_FTS_TABLE_NAME}(rowid, {NAME_COLUMN})
+        VALUES (new.rowid, new.{NAME_COLUMN});
+    END
+    """,
+]
+
+
+def create_name_search_index(engine) -> bool:
+    """
+    Creates the FTS5 name index and its sync triggers if they do not exist,
+    back-filling it from the existing patients.
+    Returns:
+        True if the index is available, False if SQLite lacks FTS5 support.
+    """
+    if engine.dialect.name != "sqlite":
+        return False
+    try:
+        with engine.begin() as conn:
+            exists = conn.exec_driver_sql(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                (PATIENTS_FTS_TABLE_NAME,),
+            ).first()
+            if exists:
+                return True
+            for ddl in PATIENTS_FTS_DDL:
+                conn.exec_driver_sql(ddl)
+            conn.exec_driver_sql(
+                f"INSERT INTO {PATIENTS_FTS_TABLE_NAME}({PATIENTS_FTS_TABLE_NAME}) "
+                "VALUES ('rebuild')"
+            )
+        return True
+    except OperationalError as e:
+        record_db_error("create_name_search_index", e)
+        return False
+
+
+def _stats_trigger_ddl(stats_table: Table, key: str) -> list:
+    """
+    Builds the triggers keeping a counters table in step with the patients
+    table. An insert adds the patient to the counters of its key, a delete
+    (or archiving) removes it, and an update changing the key or admitting
+    or checking out the patient moves it between counters.
+    """
+    name = stats_table.name
+    active, checked_out = ACTIVE_PATIENTS_COLUMN, CHECKED_OUT_PATIENTS_COLUMN
+    add_new = f"""
+        INSERT INTO {name}({key}, {active}, {checked_out})
+        SELECT new.{key}, new.{CHECKOUT_COLUMN} IS NULL, new.{CHECKOUT_COLUMN} IS NOT NULL
+        WHERE new.{key} IS NOT NULL
+        ON CONFLICT({key}) DO UPDATE SET
+            {active} = {active} + excluded.{active},
+            {checked_out} = {checked_out} + excluded.{checked_out};
+    """
+    remove_old = f"""
+        UPDATE {name} SET
+            {active} = {active} - (old.{CHECKOUT_COLUMN} IS NULL),
+            {checked_out} = {checked_out} - (old.{CHECKOUT_COLUMN} IS NOT NULL)
+        WHERE {key} = old.{key};
+    """
+    return [
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {name}_ai
+        AFTER INSERT ON {PATIENTS_TABLE_NAME} BEGIN {add_new} END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {name}_ad
+        AFTER DELETE ON {PATIENTS_TABLE_NAME} BEGIN {remove_old} END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {name}_au
+        AFTER UPDATE OF {key}, {CHECKOUT_COLUMN} ON {PATIENTS_TABLE_NAME}
+        WHEN old.{key} IS NOT new.{key}
+            OR (old.{CHECKOUT_COLUMN} IS NULL) IS NOT (new.{CHECKOUT_COLUMN} IS NULL)
+        BEGIN {remove_old} {add_new} END
+        """,
+    ]
+
+
+PATIENT_STATS_DDL = [
+    ddl for stats_table, key in PATIENT_STATS_TABLES for ddl in _stats_trigger_ddl(stats_table, key)
+]
+
+
+def stats_counts_statement(key: str) -> Select:
+    """
+    Builds the query counting the admitted and checked-out patients of the
+    live table per value of a column: the values its counters must hold.
+    """
+    key_column = PATIENTS_TABLE.c[key]
+    admitted = PATIENTS_TABLE.c.checkout.is_(None)
+    return (
+        select(
+            key_column,
+            func.sum(case((admitted, 1), else_=0)).label(ACTIVE_PATIENTS_COLUMN),
+            func.sum(case((admitted, 0), else_=1)).label(CHECKED_OUT_PATIENTS_COLUMN),
+        )
+        .where(key_column.is_not(None))
+        .group_by(key_column)
+    )
+
+
+def rebuild_stats_counters(conn) -> None:
+    """Recomputes every counters table from the patients table, within conn's transaction."""
+    for stats_table, key in PATIENT_STATS_TABLES:
+        conn.execute(stats_table.delete())
+        conn.execute(
+            stats_table.insert().from_select(
+                [key, ACTIVE_PATIENTS_COLUMN, CHECKED_OUT_PATIENTS_COLUMN],
+                stats_counts_statement(key),
+            )
+        )
+
+
+def create_stats_counters(engine) -> bool:
+    """
+    Creates the triggers maintaining the workload counters if they do not
+    exist, filling the counters from the existing patients in the same
+    transaction.
+    Returns:
+        True if the counters are maintained, False on databases other than SQLite.
+    """
+    if engine.dialect.name != "sqlite":
+        return False
+    with engine.begin() as conn:
+        exists = conn.exec_driver_sql(
+            "SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = ?",
+            (f"{DOCTOR_STATS_TABLE.name}_au",),
+        ).first()
+        if exists:
+            return True
+        for ddl in PATIENT_STATS_DDL:
+            conn.exec_driver_sql(ddl)
+        rebuild_stats_counters(conn)
+    return True
+
+
+def initialize_schema(engine) -> Tuple[bool, bool]:
+    """
+    Creates the tables of a database, or brings an existing one up to date.
+    Returns:
+        Whether the FTS5 name search index is available, and whether the
+        workload counters are maintained.
+    """
+    METADATA.create_all(engine)
+    migrate_schema(engine)
+    migrate_legacy_timestamps(engine)
+    return create_name_search_index(engine), create_stats_counters(engine)
+
+
+# Every live Storage, so that engines inherited across a fork can be reset.
+_STORAGES: "weakref.WeakSet[Storage]" = weakref.WeakSet()
+
+
+class Storage:
+    """
+    The engines of one database. Nothing is connected at import time: the
+    engines are created, and the schema created or migrated, on first use.
+
+    engine serves writes; read_engine serves the GET handlers from its own
+    pool of read-only connections so that, in WAL mode, reads never wait on
+    writers. A private in-memory database cannot be shared, so it uses a
+    single engine. async_engine and async_read_engine are their asyncio
+    counterparts, used by AsyncPatientDB.
+    """
+
+    def __init__(self, url: Optional[str] = None) -> None:
+        """
+        Args:
+            url: The database URL; defaults to the PATIENT_DB_URL profile.
+        """
+        self.url = url or DB_URL
+        self.in_memory = _is_in_memory(make_url(self.url))
+        self._lock = threading.Lock()
+        self._engine = None
+        self._read_engine = None
+        self._async_engine = None
+        self._async_read_engine = None
+        self._name_search_enabled = False
+        self._stats_enabled = False
+        _STORAGES.add(self)
+
+    def _initialize(self) -> None:
+        with self._lock:
+            if self._engine is not None:
+                return
+            engine = create_storage_engine(self.url)
+            self._name_search_enabled, self._stats_enabled = initialize_schema(engine)
+            if self.in_memory:
+                self._read_engine = engine
+            else:
+                self._read_engine = create_storage_engine(self.url, read_only=True)
+            self._engine = engine
+
+    @property
+    def engine(self):
+        if self._engine is None:
+            self._initialize()
+        return self._engine
+
+    @property
+    def read_engine(self):
+        if self._engine is None:
+            self._initialize()
+        return self._read_engine
+
+    @property
+    def name_search_enabled(self) -> bool:
+        """Whether name searches can use the FTS5 index."""
+        if self._engine is None:
+            self._initialize()
+        return self._name_search_enabled
+
+    @property
+    def stats_enabled(self) -> bool:
+        """Whether the workload counters are maintained by triggers."""
+        if self._engine is None:
+            self._initialize()
+        return self._stats_enabled
+
+    def _initialize_async(self) -> None:
+        # The schema is created through the synchronous engine first.
+        if self._engine is None:
+            self._initialize()
+        with self._lock:
+            if self._async_engine is not None:
+                return
+            engine = create_async_storage_engine(self.url)
+            if self.in_memory:
+                self._async_read_engine = engine
+            else:
+                self._async_read_engine = create_async_storage_engine(self.url, read_only=True)
+            self._async_engine = engine
+
+    @property
+    def async_engine(self):
+        if self._async_engine is None:
+            self._initialize_async()
+        return self._async_engine
+
+    @property
+    def async_read_engine(self):
+        if self._async_engine is None:
+            self._initialize_async()
+        return self._async_read_engine
+
+    def _engines(self) -> list:
+        engines = []
+        for engine in (self._engine, self._read_engine):
+            if engine is not None and engine not in engines:
+                engines.append(engine)
+        for engine in (self._async_engine, self._async_read_engine):
+            if engine is not None and engine.sync_engine not in engines:
+                engines.append(engine.sync_engine)
+        return engines
+
+    def dispose(self) -> None:
+        """Closes every pooled connection of the synchronous engines."""
+        for engine in (self._engine, self._read_engine):
+            if engine is not None:
+                engine.dispose()
+
+    async def dispose_async(self) -> None:
+        """Closes every pooled connection of the asyncio engines."""
+        for engine in {self._async_engine, self._async_read_engine} - {None}:
+            await engine.dispose()
+
+    def reset_after_fork(self) -> None:
+        """
+        Drops the pooled connections inherited from the parent process
+        without closing them, as they still belong to the parent; new ones
+        are opened on demand.
+        """
+        self._lock = threading.Lock()
+        for engine in self._engines():
+            engine.dispose(close=False)
+
+
+def _reset_storages_after_fork() -> None:
+    for storage in list(_STORAGES):
+        storage.reset_after_fork()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_storages_after_fork)
+
+_default_storage: Optional[Storage] = None
+
+
+def default_storage() -> Storage:
+    """Returns the Storage of the PATIENT_DB_URL profile, shared by the process."""
+    global _default_storage
+    if _default_storage is None:
+        _default_storage = Storage()
+    return _default_storage
+
 
-METADATA.create_all(ENGINE)
+def __getattr__(name: str):
+    # ENGINE, READ_ENGINE and NAME_SEARCH_INDEX_ENABLED used to be created at
+    # import time; they are still served, lazily, from the default storage.
+    if name == "ENGINE":
+        return default_storage().engine
+    if name == "READ_ENGINE":
+        return default_storage().read_engine
+    if name == "NAME_SEARCH_INDEX_ENABLED":
+        return default_storage().name_search_enabled
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
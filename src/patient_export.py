@@ -0,0 +1,128 @@
+# Export formats of GET /patients/export, shared by both controllers, and
+# their reading back by import_patients.py.
+#
+# An export is encoded one chunk of database rows at a time, and optionally
+# gzip-compressed as a single stream, so producing it takes the same memory
+# for a thousand patients or ten million.
+
+import csv
+import gzip
+import io
+import json
+import zlib
+from dataclasses import fields
+from typing import Any, Callable, Dict, IO, Iterator, Optional, Sequence
+from config import EXPORT_GZIP_LEVEL
+from patient_record import PatientRecord
+from patient_routes import NDJSON_MIMETYPE
+
+CSV_MIMETYPE = "text/csv"
+EXPORT_FORMATS = {"csv": CSV_MIMETYPE, "ndjson": NDJSON_MIMETYPE}
+
+# The exported columns, in the column order of PATIENTS_TABLE.
+EXPORT_FIELDS = [field.name for field in fields(PatientRecord)]
+# CSV holds strings only: these columns are converted back to integers on import.
+INTEGER_FIELDS = frozenset(["age", "ward", "room", "version"])
+
+
+class ExportEncoder:
+    """
+    Encodes a patient export chunk by chunk. Chunks are lists of rows
+    selected with all PATIENTS_TABLE columns.
+    """
+
+    def __init__(
+        self, export_format: str, dumps: Callable[[Any], str], compress: bool = False
+    ) -> None:
+        """
+        Args:
+            export_format: "csv" or "ndjson".
+            dumps: The JSON encoder of the app, for NDJSON.
+            compress: If True, the output is one gzip stream.
+        """
+        self.export_format = export_format
+        self.dumps = dumps
+        self._compressor = (
+            zlib.compressobj(EXPORT_GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+            if compress
+            else None
+        )
+
+    def _output(self, text: str) -> bytes:
+        data = text.encode()
+        return self._compressor.compress(data) if self._compressor else data
+
+    def header(self) -> bytes:
+        """Returns the start of the export: the CSV header line."""
+        return self._output(",".join(EXPORT_FIELDS) + "\n" if self.export_format == "csv" else "")
+
+    def encode(self, rows: Sequence[Any]) -> bytes:
+        """Returns the encoding of a chunk of rows."""
+        if self.export_format == "csv":
+            buffer = io.StringIO()
+            csv.writer(buffer, lineterminator="\n").writerows(rows)
+            return self._output(buffer.getvalue())
+        dumps = self.dumps
+        return self._output("".join(dumps(PatientRecord.from_row(row)) + "\n" for row in rows))
+
+    def finish(self) -> bytes:
+        """Returns the end of the export (the rest of the gzip stream)."""
+        return self._compressor.flush() if self._compressor else b""
+
+
+def parse_csv_record(row: Dict[str, str]) -> Dict[str, Any]:
+    """
+    Converts a CSV export row back to a patient: empty cells become None and
+    the integer columns integers. Values that are not integers are kept as
+    they are, for validation to report.
+    """
+    record: Dict[str, Any] = {}
+    for key, value in row.items():
+        if value == "":
+            value = None
+        elif key in INTEGER_FIELDS:
+            try:
+                value = int(value)
+            except ValueError:
+                pass
+        record[key] = value
+    return record
+
+
+def _open_text(path: str) -> IO[str]:
+    """Opens an export file as text, decompressing it if it is gzipped."""
+    with open(path, "rb") as probe:
+        gzipped = probe.read(2) == b"\x1f\x8b"
+    if gzipped:
+        return gzip.open(path, "rt", encoding="utf-8", newline="")
+    return open(path, "r", encoding="utf-8", newline="")
+
+
+def export_format_of(path: str) -> Optional[str]:
+    """Guesses the format of an export file from its name."""
+    name = path[:-3] if path.endswith(".gz") else path
+    if name.endswith(".csv"):
+        return "csv"
+    if name.endswith((".ndjson", ".jsonl")):
+        return "ndjson"
+    return None
+
+
+def read_export(path: str, export_format: str) -> Iterator[Any]:
+    """
+    Yields the patients of an export file, one at a time, gzipped or not.
+    NDJSON lines that are not valid JSON are yielded as the ValueError
+    raised, like the bodies of POST /patients/bulk.
+    """
+    with _open_text(path) as stream:
+        if export_format == "csv":
+            for row in csv.DictReader(stream):
+                yield parse_csv_record(row)
+            return
+        for line in stream:
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                yield ValueError("Invalid JSON")
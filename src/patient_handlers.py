@@ -0,0 +1,568 @@
+# Route handler logic shared by the Flask and the async API controllers.
+#
+# A controller handler only reads the request body and makes its database
+# calls, awaiting them or not: parsing and validating the request, and
+# building the response from the results, happens here. The functions read
+# the werkzeug request interface both frameworks expose (args, conditional
+# and Accept headers), and return replies: (body, status) or (body, status,
+# headers) tuples whose dict or list body both frameworks serialize with the
+# application's JSON provider.
+#
+# Parsers return a (value, reply) pair: the reply is an error response to
+# send as is, or None if the request is valid.
+
+import time
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple
+
+from werkzeug.http import quote_etag
+
+from patient_db_config import Storage, default_storage
+from patient_cache import LRUTTLCache
+from patient_routes import NDJSON_MIMETYPE, route_admission
+from change_feed import SSE_MIMETYPE, sse_comment, sse_event
+from patient_export import EXPORT_FORMATS
+from metrics import REGISTRY, CONTENT_TYPE, observe_request, register_cache_metrics
+from patient_validation import (
+    validate_new_patient,
+    validate_patient_update,
+    validate_room_assignment,
+    validate_doctor_assignment,
+    prepare_bulk_chunk,
+    error_response,
+    parse_limit,
+    parse_patient_filters,
+    parse_expected_version,
+    parse_change_feed_args,
+    listing_etag,
+    build_new_patient,
+    updatable_fields,
+    bulk_chunk_results,
+    bulk_response,
+    parse_patient_ids,
+    prepare_batch_updates,
+    batch_update_results,
+    checkout_results,
+    parse_ward_transfer,
+    transfer_results,
+    batch_response,
+    stats_listing,
+)
+from config import (
+    DOCTORS,
+    WARD_NUMBERS,
+    DEFAULT_PAGE_SIZE,
+    BULK_INSERT_CHUNK_SIZE,
+    BATCH_MAX_PATIENTS,
+    ADMISSION_READ_CONCURRENCY,
+    ADMISSION_WRITE_CONCURRENCY,
+    ADMISSION_QUEUE_SIZE,
+    ADMISSION_QUEUE_TIMEOUT_SECONDS,
+    ADMISSION_RETRY_AFTER_SECONDS,
+    CHANGE_FEED_POLL_SECONDS,
+    CHANGE_FEED_HEARTBEAT_SECONDS,
+    CHANGE_FEED_STREAM_SECONDS,
+)
+
+Reply = Tuple[Any, ...]
+
+
+# Application setup
+
+
+def build_cache(settings: Mapping[str, Any]) -> Optional[LRUTTLCache]:
+    """Builds the patient cache of PATIENT_CACHE_ENABLED, exporting its metrics."""
+    if not settings["PATIENT_CACHE_ENABLED"]:
+        return None
+    cache = LRUTTLCache(settings["PATIENT_CACHE_MAX_ENTRIES"], settings["PATIENT_CACHE_TTL_SECONDS"])
+    register_cache_metrics(cache)
+    return cache
+
+
+def build_storage(settings: Mapping[str, Any]) -> Storage:
+    """Returns the storage of PATIENT_DB_URL, or the default profile."""
+    if settings["PATIENT_DB_URL"]:
+        return Storage(settings["PATIENT_DB_URL"])
+    return default_storage()
+
+
+def build_admission_gates(settings: Mapping[str, Any], gate_class: Callable[..., Any]) -> Optional[Dict[str, Any]]:
+    """Builds the read and write gates of PATIENT_ADMISSION_CONTROL, or None if disabled."""
+    if not settings["PATIENT_ADMISSION_CONTROL"]:
+        return None
+    return {
+        budget: gate_class(budget, concurrency, ADMISSION_QUEUE_SIZE, ADMISSION_QUEUE_TIMEOUT_SECONDS)
+        for budget, concurrency in (
+            ("read", ADMISSION_READ_CONCURRENCY),
+            ("write", ADMISSION_WRITE_CONCURRENCY),
+        )
+    }
+
+
+def close_admission_gates(gates: Optional[Dict[str, Any]]) -> None:
+    """Closes the gates of build_admission_gates, if any."""
+    for gate in (gates or {}).values():
+        gate.close()
+
+
+# Request hooks
+
+
+def request_admission(gates: Dict[str, Any], request: Any) -> Optional[Tuple[Any, int]]:
+    """Returns the gate and priority lane of a request, or None if its route is not gated."""
+    if request.url_rule is None:
+        return None
+    admission = route_admission(request.endpoint, request.method)
+    if admission is None:
+        return None
+    budget, priority = admission
+    return gates[budget], priority
+
+
+def busy_reply() -> Reply:
+    """Answers a request rejected by admission control."""
+    return message_reply(
+        "Server busy, please retry later", 503, {"Retry-After": str(ADMISSION_RETRY_AFTER_SECONDS)}
+    )
+
+
+def record_request(request: Any, status_code: int, started: Optional[float]) -> None:
+    """
+    Records the duration and status of a request, labelled by its URL rule
+    so that the route label stays low-cardinality.
+    """
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        observe_request(request.method, route, status_code, time.perf_counter() - started)
+
+
+# Common replies and arguments
+
+
+def message_reply(message: str, status: int, headers: Optional[Dict[str, str]] = None) -> Reply:
+    """Builds a {"message": ...} reply."""
+    if headers:
+        return {"message": message}, status, headers
+    return {"message": message}, status
+
+
+def is_flag_set(args: Mapping[str, str], name: str) -> bool:
+    """Tells whether a boolean query parameter is 'true'."""
+    return args.get(name, "").lower() == "true"
+
+
+def wants_ndjson(request: Any) -> bool:
+    """Checks whether the client asked for an NDJSON stream."""
+    if request.args.get("format") == "ndjson":
+        return True
+    return request.accept_mimetypes.best == NDJSON_MIMETYPE
+
+
+def wants_sse(request: Any) -> bool:
+    """Checks whether the client asked for a Server-Sent Events stream."""
+    if request.args.get("format") == "sse":
+        return True
+    return request.accept_mimetypes.best == SSE_MIMETYPE
+
+
+def parse_if_match(request: Any) -> Tuple[Optional[int], Optional[Reply]]:
+    """Parses the If-Match header of a conditional write into the expected patient version."""
+    expected_version, error = parse_expected_version(request.if_match)
+    if error:
+        return None, message_reply(error, 412)
+    return expected_version, None
+
+
+def version_conflict_reply(conflict: Any) -> Reply:
+    """
+    Answers a conditional write whose 'If-Match' version is outdated,
+    with the current version so the client can refetch and retry.
+    """
+    current = conflict.current_version
+    return (
+        {"message": "Patient was modified by another request", "version": current},
+        412,
+        {"ETag": quote_etag(str(current))},
+    )
+
+
+# Read-only routes
+
+
+def index_reply() -> Reply:
+    return message_reply("Welcome to the Patient API!", 200)
+
+
+def metrics_reply() -> Reply:
+    return REGISTRY.render(), 200, {"Content-Type": CONTENT_TYPE}
+
+
+def doctors_reply() -> Reply:
+    return {"doctors": DOCTORS}, 200
+
+
+def wards_reply(occupancy: Any) -> Reply:
+    return {"wards": occupancy.ward_summary()}, 200
+
+
+def ward_rooms_reply(occupancy: Any, ward: int, request: Any) -> Reply:
+    if not occupancy.has_ward(ward):
+        return message_reply("Ward not found", 404)
+    rooms = occupancy.rooms(ward, free_only=is_flag_set(request.args, "free"))
+    return {"ward": ward, "rooms": rooms}, 200
+
+
+def ward_stats_reply(rows: Optional[List[Dict[str, Any]]]) -> Reply:
+    if rows is None:
+        return message_reply("Failed to read the ward statistics", 500)
+    return {"wards": stats_listing(rows, "ward", WARD_NUMBERS)}, 200
+
+
+def doctor_stats_reply(rows: Optional[List[Dict[str, Any]]]) -> Reply:
+    if rows is None:
+        return message_reply("Failed to read the doctor statistics", 500)
+    return {"doctors": stats_listing(rows, "doctor_name", DOCTORS)}, 200
+
+
+# GET /patients and GET /patients/export
+
+
+def parse_listing(request: Any) -> Tuple[Dict[str, Any], Optional[Reply]]:
+    """
+    Parses GET /patients.
+    Returns:
+        The listing: its 'filters', whether it is streamed as 'ndjson', and
+        for a page, its 'limit' and 'cursor' ('limit' is None when the whole
+        listing is wanted).
+    """
+    filters, error = parse_patient_filters(request.args)
+    if error:
+        return {}, message_reply(error, 400)
+    listing = {
+        "filters": filters,
+        "ndjson": wants_ndjson(request),
+        "limit": None,
+        "cursor": request.args.get("cursor"),
+    }
+    if not listing["ndjson"] and ("limit" in request.args or listing["cursor"] is not None):
+        listing["limit"], error = parse_limit(request.args.get("limit"), DEFAULT_PAGE_SIZE)
+        if error:
+            return {}, message_reply(error, 400)
+    return listing, None
+
+
+def listing_headers(
+    request: Any, listing: Dict[str, Any], table_version: Optional[int]
+) -> Tuple[Dict[str, str], Optional[Reply]]:
+    """
+    Builds the ETag of a listing from the table version.
+    Returns:
+        The headers of the listing, and a 304 reply if the client's
+        'If-None-Match' shows its copy is current.
+    """
+    headers: Dict[str, str] = {}
+    if table_version is not None:
+        etag = listing_etag(table_version, request.query_string, listing["ndjson"])
+        headers["ETag"] = quote_etag(etag)
+        if request.if_none_match.contains_weak(etag):
+            return headers, ("", 304, headers)
+    return headers, None
+
+
+def listing_reply(result: Any, headers: Dict[str, str]) -> Reply:
+    """Answers GET /patients with a listing or page; None means the query failed."""
+    if result is None:
+        return message_reply("Error retrieving patients", 500)
+    return result, 200, headers
+
+
+def parse_export(request: Any) -> Tuple[Dict[str, Any], Optional[Reply]]:
+    """
+    Parses GET /patients/export.
+    Returns:
+        The export: its 'format', 'filters', and whether to 'compress' it.
+    """
+    export_format = request.args.get("format", "ndjson")
+    if export_format not in EXPORT_FORMATS:
+        return {}, message_reply("format must be csv or ndjson", 400)
+    filters, error = parse_patient_filters(request.args)
+    if error:
+        return {}, message_reply(error, 400)
+    compress = request.accept_encodings["gzip"] > 0
+    return {"format": export_format, "filters": filters, "compress": compress}, None
+
+
+def export_headers(export: Dict[str, Any]) -> Dict[str, str]:
+    """Builds the headers of an export, but its content type."""
+    headers = {
+        "Content-Disposition": f'attachment; filename="patients.{export["format"]}"',
+        "Vary": "Accept-Encoding",
+    }
+    if export["compress"]:
+        headers["Content-Encoding"] = "gzip"
+    return headers
+
+
+# Single-patient routes
+
+
+def patient_reply(request: Any, patient: Optional[Dict[str, Any]]) -> Reply:
+    """
+    Answers GET /patients/<id>. The ETag is the patient's version; a matching
+    'If-None-Match' is answered with 304 without serializing the patient.
+    """
+    if not patient:
+        return message_reply("Patient not found", 404)
+    etag = str(patient["version"])
+    headers = {"ETag": quote_etag(etag)}
+    if request.if_none_match.contains_weak(etag):
+        return "", 304, headers
+    return patient, 200, headers
+
+
+def parse_new_patient(request_body: Any) -> Tuple[Optional[Dict[str, Any]], Optional[Reply]]:
+    """Validates POST /patients and builds the record of the new patient."""
+    if not request_body:
+        return None, message_reply("Request body cannot be empty", 400)
+    errors = validate_new_patient(request_body)
+    if errors:
+        return None, (error_response(errors), 400)
+    return build_new_patient(request_body), None
+
+
+def created_reply(patient_data: Dict[str, Any], inserted_id: Optional[str]) -> Reply:
+    if not inserted_id:
+        return message_reply("Failed to create patient", 500)
+    return patient_data, 201
+
+
+def parse_patient_update(request_body: Any) -> Tuple[Dict[str, Any], Optional[Reply]]:
+    """Validates PUT /patients/<id> and keeps the fields clients may change."""
+    if not request_body:
+        return {}, message_reply("Request body cannot be empty", 400)
+    errors = validate_patient_update(request_body)
+    if errors:
+        return {}, (error_response(errors), 400)
+    return updatable_fields(request_body), None
+
+
+def parse_room_assignment(request_body: Any) -> Tuple[Dict[str, Any], Optional[Reply]]:
+    """Validates PUT /patients/<id>/room."""
+    errors = validate_room_assignment(request_body)
+    if errors:
+        return {}, (error_response(errors), 400)
+    return {"ward": request_body["ward"], "room": request_body["room"]}, None
+
+
+def parse_doctor_assignment(request_body: Any) -> Tuple[Dict[str, Any], Optional[Reply]]:
+    """Validates PUT /patients/<id>/doctor."""
+    errors = validate_doctor_assignment(request_body)
+    if errors:
+        return {}, (error_response(errors), 400)
+    return {"doctor_name": request_body["doctor_name"]}, None
+
+
+def updated_reply(patient: Optional[Dict[str, Any]]) -> Reply:
+    """Answers an update with the updated patient and its version as ETag."""
+    if patient is None:
+        return message_reply("Patient not found", 404)
+    return patient, 200, {"ETag": quote_etag(str(patient["version"]))}
+
+
+def checked_out_reply(patient: Optional[Dict[str, Any]]) -> Reply:
+    if patient is None:
+        return message_reply("Patient not found", 404)
+    return (
+        {"message": "Patient checked out successfully", "checkout_time": patient["checkout"]},
+        200,
+        {"ETag": quote_etag(str(patient["version"]))},
+    )
+
+
+def deleted_reply(rows_affected: Optional[int]) -> Reply:
+    if rows_affected is None:
+        return message_reply("Error deleting patient", 500)
+    if rows_affected > 0:
+        return message_reply("Patient deleted successfully", 200)
+    return message_reply("Patient not found", 404)
+
+
+# Batch routes
+
+
+def parse_bulk_body(request_body: Any) -> Tuple[List[Any], Optional[Reply]]:
+    """Checks that the JSON body of POST /patients/bulk is an array."""
+    if not isinstance(request_body, list):
+        return [], message_reply("Request body must be a JSON array", 400)
+    return request_body, None
+
+
+def decode_ndjson_line(loads: Callable[[Any], Any], line: Any) -> Any:
+    """Decodes one NDJSON line, returning the ValueError if it is not valid JSON."""
+    try:
+        return loads(line)
+    except ValueError:
+        return ValueError("Invalid JSON")
+
+
+class BulkCreation:
+    """
+    The items of a POST /patients/bulk request, validated and inserted in
+    chunks of BULK_INSERT_CHUNK_SIZE as they are read: invalid items are
+    reported without aborting the rest of the batch.
+    """
+
+    def __init__(self) -> None:
+        self.results: List[Dict[str, Any]] = []
+        self._pending: List[Tuple[int, Any]] = []
+        self._chunk: List[Tuple[int, Dict[str, Any]]] = []
+        self._count = 0
+
+    def add(self, item: Any) -> bool:
+        """Queues an item. Returns True once a chunk is full and must be inserted."""
+        self._pending.append((self._count, item))
+        self._count += 1
+        return len(self._pending) >= BULK_INSERT_CHUNK_SIZE
+
+    def take_chunk(self) -> List[Dict[str, Any]]:
+        """Validates the queued items, and returns the records of the valid ones to insert."""
+        results, self._chunk = prepare_bulk_chunk(self._pending)
+        self._pending = []
+        self.results.extend(results)
+        return [data for _, data in self._chunk]
+
+    def inserted(self, inserted_ids: List[Optional[str]]) -> None:
+        """Records the outcome of inserting the last chunk taken."""
+        self.results.extend(bulk_chunk_results(self._chunk, inserted_ids))
+
+    def reply(self) -> Reply:
+        if not self.results:
+            return message_reply("Request body cannot be empty", 400)
+        return bulk_response(self.results)
+
+
+def parse_batch_update(request_body: Any) -> Tuple[Dict[str, Any], Optional[Reply]]:
+    """
+    Validates PATCH /patients/batch.
+    Returns:
+        The batch: the error 'results' of the invalid items, and the
+        'updates', 'expected_versions' and request 'indexes' of the valid ones.
+    """
+    if not isinstance(request_body, list) or not request_body:
+        return {}, message_reply("Request body must be a non-empty JSON array", 400)
+    if len(request_body) > BATCH_MAX_PATIENTS:
+        return {}, message_reply(f"A batch must not name more than {BATCH_MAX_PATIENTS} patients", 400)
+    results, updates, expected_versions, indexes = prepare_batch_updates(request_body)
+    return {
+        "results": results,
+        "updates": updates,
+        "expected_versions": expected_versions,
+        "indexes": indexes,
+    }, None
+
+
+def batch_update_reply(
+    batch: Dict[str, Any], patients: List[Dict[str, Any]], conflicts: Dict[str, int]
+) -> Reply:
+    results = batch_update_results(batch["results"], batch["indexes"], patients, conflicts)
+    return batch_response(results, "updated")
+
+
+def parse_checkout_batch(request_body: Any) -> Tuple[List[str], Optional[Reply]]:
+    """Validates POST /patients/batch/checkout and returns the patient IDs."""
+    patient_ids, error = parse_patient_ids(
+        request_body.get("ids") if isinstance(request_body, dict) else None
+    )
+    if error:
+        return [], message_reply(error, 400)
+    return patient_ids, None
+
+
+def checkout_batch_reply(patient_ids: List[str], patients: List[Dict[str, Any]]) -> Reply:
+    return batch_response(checkout_results(patient_ids, patients), "checked_out")
+
+
+def parse_transfer(occupancy: Any, ward: int, request_body: Any) -> Tuple[Dict[str, Any], Optional[Reply]]:
+    """Validates POST /wards/<ward>/transfer and returns the keyword arguments of transfer_ward."""
+    if not occupancy.has_ward(ward):
+        return {}, message_reply("Ward not found", 404)
+    params, errors = parse_ward_transfer(ward, request_body)
+    if errors:
+        return {}, (error_response(errors), 400)
+    return params, None
+
+
+def transfer_reply(params: Dict[str, Any], patients: List[Dict[str, Any]]) -> Reply:
+    return batch_response(transfer_results(patients, params["patient_ids"]), "transferred")
+
+
+# Search and change feed
+
+
+def parse_search(request: Any) -> Tuple[Dict[str, Any], Optional[Reply]]:
+    """Parses GET /patients/search into the keyword arguments of search_patients_by_name."""
+    name = request.args.get("search_name")
+    if not name:
+        return {}, message_reply("search_name parameter is required", 400)
+    limit, error = parse_limit(request.args.get("limit"))
+    if error:
+        return {}, message_reply(error, 400)
+    return {
+        "name": name,
+        "prefix": is_flag_set(request.args, "prefix"),
+        "limit": limit,
+        "include_archived": is_flag_set(request.args, "include_archived"),
+    }, None
+
+
+def search_reply(patients: Optional[List[Dict[str, Any]]]) -> Reply:
+    if not patients:
+        return message_reply("No patients found with that name", 404)
+    return patients, 200
+
+
+def parse_changes(request: Any) -> Tuple[Dict[str, Any], Optional[Reply]]:
+    """Parses GET /patients/changes into its 'since', 'limit' and 'wait'."""
+    params, error = parse_change_feed_args(request.args, request.headers.get("Last-Event-ID"))
+    if error:
+        return {}, message_reply(error, 400)
+    return params, None
+
+
+def changes_reply(params: Dict[str, Any], changes: Optional[List[Dict[str, Any]]]) -> Reply:
+    if changes is None:
+        return message_reply("Error retrieving changes", 500)
+    next_since = changes[-1]["seq"] if changes else params["since"]
+    return {"changes": changes, "next_since": next_since}, 200
+
+
+class ChangeStream:
+    """
+    The state of a GET /patients/changes Server-Sent Events stream. The
+    controller loops on next_wait(), waits that long for the changes after
+    'since', and sends the events() of what it got, until next_wait()
+    returns None: the stream is closed after CHANGE_FEED_STREAM_SECONDS, and
+    the client reconnects with the Last-Event-ID of the last change.
+    """
+
+    def __init__(self, since: int, limit: int, dumps: Callable[[Any], str]) -> None:
+        self.since = since
+        self.limit = limit
+        self.dumps = dumps
+        self._deadline = time.monotonic() + CHANGE_FEED_STREAM_SECONDS
+
+    def opening(self) -> str:
+        return sse_comment("connected", retry_ms=int(CHANGE_FEED_POLL_SECONDS * 1000))
+
+    def next_wait(self) -> Optional[float]:
+        """Returns how long to wait for changes, or None once the stream must end."""
+        remaining = self._deadline - time.monotonic()
+        if remaining <= 0:
+            return None
+        return min(remaining, CHANGE_FEED_HEARTBEAT_SECONDS)
+
+    def events(self, changes: List[Dict[str, Any]]) -> List[str]:
+        """Formats the changes received, or a keep-alive comment if there were none."""
+        if not changes:
+            return [sse_comment("keep-alive")]
+        self.since = changes[-1]["seq"]
+        return [sse_event(change, self.dumps) for change in changes]
@@ -0,0 +1,45 @@
+# Compact, read-only view of a patients row used by the listing endpoints.
+
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Sequence
+
+
+@dataclass(slots=True)
+class PatientRecord:
+    """
+    A patient row as a slotted dataclass, with its fields in the column order
+    of PATIENTS_TABLE so it can be built directly from a row tuple. It has no
+    per-instance __dict__, and JSON encoders serialize it without building an
+    intermediate dictionary.
+    """
+
+    id: str
+    name: Optional[str]
+    age: Optional[int]
+    gender: Optional[str]
+    checkin: Optional[str]
+    checkout: Optional[str]
+    ward: Optional[int]
+    room: Optional[int]
+    doctor_name: Optional[str]
+    version: int
+
+    @classmethod
+    def from_row(cls, row: Sequence[Any]) -> "PatientRecord":
+        """Builds a record from a row selected with all PATIENTS_TABLE columns."""
+        return cls(*row)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Returns a dictionary representation of the record."""
+        return {
+            "id": self.id,
+            "name": self.name,
+            "age": self.age,
+            "gender": self.gender,
+            "checkin": self.checkin,
+            "checkout": self.checkout,
+            "ward": self.ward,
+            "room": self.room,
+            "doctor_name": self.doctor_name,
+            "version": self.version,
+        }
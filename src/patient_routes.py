@@ -0,0 +1,63 @@
+# Route table shared by the Flask and the async API controllers.
+# Each entry maps a URL rule and its HTTP methods to the name of the
+# controller method handling it.
+
+from typing import Optional, Tuple
+
+from admission import PRIORITY_CLINICAL, PRIORITY_DEFAULT, PRIORITY_BULK
+
+NDJSON_MIMETYPE = "application/x-ndjson"
+
+ROUTES = [
+    ("/", ["GET"], "index"),
+    ("/patients", ["GET"], "get_patients"),
+    ("/patients/<id>", ["GET"], "get_patient"),
+    ("/patients", ["POST"], "create_patient"),
+    ("/patients/bulk", ["POST"], "create_patients_bulk"),
+    ("/patients/batch", ["PATCH"], "update_patients_batch"),
+    ("/patients/batch/checkout", ["POST"], "checkout_patients_batch"),
+    ("/patients/<id>", ["PUT"], "update_patient"),
+    ("/patients/<id>", ["DELETE"], "delete_patient"),
+    ("/patients/search", ["GET"], "search_patients_by_name"),
+    ("/patients/changes", ["GET"], "get_patient_changes"),
+    ("/patients/export", ["GET"], "export_patients"),
+    ("/patients/<id>/room", ["PUT"], "set_patient_room"),
+    ("/patients/<id>/checkout", ["PUT"], "checkout_patient_api"),
+    ("/doctors", ["GET"], "get_doctors"),
+    ("/doctors/stats", ["GET"], "get_doctor_stats"),
+    ("/patients/<id>/doctor", ["PUT"], "assign_doctor"),
+    ("/wards", ["GET"], "get_wards"),
+    ("/wards/stats", ["GET"], "get_ward_stats"),
+    ("/wards/<int:ward>/rooms", ["GET"], "get_ward_rooms"),
+    ("/wards/<int:ward>/transfer", ["POST"], "transfer_ward"),
+    ("/metrics", ["GET"], "get_metrics"),
+]
+
+# Admission control (admission.py): GET handlers draw from the read budget,
+# the others from the write budget. Clinical actions are queued ahead of the
+# rest, bulk listings and batches behind. Handlers served from memory, and
+# those holding a request open for long (long-polls), are not gated.
+ROUTE_PRIORITIES = {
+    "set_patient_room": PRIORITY_CLINICAL,
+    "checkout_patient_api": PRIORITY_CLINICAL,
+    "assign_doctor": PRIORITY_CLINICAL,
+    "transfer_ward": PRIORITY_CLINICAL,
+    "checkout_patients_batch": PRIORITY_CLINICAL,
+    "get_patients": PRIORITY_BULK,
+    "export_patients": PRIORITY_BULK,
+    "create_patients_bulk": PRIORITY_BULK,
+    "update_patients_batch": PRIORITY_BULK,
+}
+UNGATED_ROUTES = frozenset(
+    ["index", "get_metrics", "get_patient_changes", "get_doctors", "get_wards", "get_ward_rooms"]
+)
+
+
+def route_admission(handler: str, method: str) -> Optional[Tuple[str, int]]:
+    """
+    Returns the admission budget ("read" or "write") and priority of a
+    request, or None if its route is not gated.
+    """
+    if handler in UNGATED_ROUTES:
+        return None
+    return ("read" if method in ("GET", "HEAD") else "write"), ROUTE_PRIORITIES.get(handler, PRIORITY_DEFAULT)
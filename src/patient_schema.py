@@ -0,0 +1,205 @@
+# Declarative validation schemas for the patient payloads.
+#
+# The allowed values in config.py are compiled once, at import time, into
+# frozenset/dict lookups, and each schema is compiled into an ordered tuple
+# of rules. Validating a payload is then a single pass over those rules that
+# collects every error instead of stopping at the first one.
+
+from typing import Any, Callable, Dict, FrozenSet, Iterable, List, Optional, Sequence, Tuple
+from config import GENDERS, WARD_NUMBERS, ROOM_NUMBERS, DOCTORS
+
+GENDER_SET: FrozenSet[str] = frozenset(GENDERS)
+DOCTOR_SET: FrozenSet[str] = frozenset(DOCTORS)
+WARD_ROOMS: Dict[int, FrozenSet[str]] = {
+    ward: frozenset(str(room) for room in ROOM_NUMBERS.get(ward, []))
+    for ward in WARD_NUMBERS
+}
+
+NOT_AN_OBJECT = "Each patient must be a JSON object"
+
+# A compiled rule is a (key, check, skip_empty) triple: check is applied to
+# payload[key] when the key is present, or to the whole payload when key is
+# None. Checks return an error message or None.
+Rule = Tuple[Optional[str], Callable[[Any], Optional[str]], bool]
+
+
+def is_integer(value: Any) -> bool:
+    """Checks for a JSON integer; bool is an int subclass but not one."""
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def is_valid_room(ward: Any, room: Any) -> bool:
+    """Checks whether a room belongs to a ward."""
+    if isinstance(ward, bool) or isinstance(room, bool):
+        return False
+    try:
+        rooms = WARD_ROOMS.get(ward)
+    except TypeError:  # unhashable ward
+        return False
+    return rooms is not None and str(room) in rooms
+
+
+def check_name(name: Any) -> Optional[str]:
+    if not isinstance(name, str) or not name.strip():
+        return "Name must be a non-empty string"
+    return None
+
+
+def check_gender(gender: Any) -> Optional[str]:
+    if not isinstance(gender, str) or gender not in GENDER_SET:
+        return f"Invalid gender provided. Must be one of: {', '.join(GENDERS)}"
+    return None
+
+
+def check_age(age: Any) -> Optional[str]:
+    if not is_integer(age) or age <= 0:
+        return "Age must be a positive integer"
+    return None
+
+
+def check_doctor_name(name: Any) -> Optional[str]:
+    if not isinstance(name, str) or not name.strip():
+        return "Name must be a non-empty string."
+    if name not in DOCTOR_SET:
+        return f"Doctor '{name}' is not recognized."
+    return None
+
+
+def field(key: str, check: Callable[[Any], Optional[str]], skip_empty: bool = False) -> Rule:
+    """
+    Builds a rule checking one field when it is present.
+    Args:
+        key: The field name.
+        check: Returns the error message for an invalid value, or None.
+        skip_empty: If True, falsy values are not checked.
+    """
+    return (key, check, skip_empty)
+
+
+def room_pair(required: bool = False, when_present: bool = False) -> Rule:
+    """
+    Builds a rule checking that 'room' belongs to 'ward'.
+    Args:
+        required: If False, the pair may be left out (both None) but not
+            half given; if True, a valid pair is mandatory.
+        when_present: If True, the rule only applies when the payload has a
+            'ward' or 'room' key.
+    """
+
+    def rule(payload: Dict[str, Any]) -> Optional[str]:
+        if when_present and "ward" not in payload and "room" not in payload:
+            return None
+        ward = payload.get("ward")
+        room = payload.get("room")
+        if not required:
+            if ward is None and room is None:
+                return None
+            if ward is None or room is None:
+                return "Both ward and room must be provided together"
+        # Rooms are stored as integers: "12" would be stored and returned as
+        # a string.
+        if any(value is not None and not is_integer(value) for value in (ward, room)):
+            return "Ward and room must be integers"
+        if not is_valid_room(ward, room):
+            return "Invalid ward or room number"
+        return None
+
+    return (None, rule, False)
+
+
+class PayloadSchema:
+    """A validation schema compiled into an ordered tuple of rules."""
+
+    def __init__(
+        self,
+        rules: Iterable[Rule],
+        required: Sequence[str] = (),
+        allowed: Optional[Sequence[str]] = None,
+    ) -> None:
+        """
+        Compiles a schema.
+        Args:
+            rules: The rules to apply, in the order their errors are reported.
+            required: Fields that must all be present.
+            allowed: If given, at least one of these fields must be present.
+        """
+        self.required = frozenset(required)
+        self.allowed = frozenset(allowed) if allowed is not None else None
+        self.rules = tuple(rules)
+        noun = "fields" if len(required) > 1 else "field"
+        self._missing_message = f"Missing required {noun}: {', '.join(required)}"
+
+    def validate(self, payload: Any) -> List[str]:
+        """
+        Validates a payload in a single pass.
+        Returns:
+            Every error found, in rule order; empty if the payload is valid.
+        """
+        if not isinstance(payload, dict):
+            payload = {}
+        errors = []
+        if self.required and not self.required <= payload.keys():
+            errors.append(self._missing_message)
+        for key, check, skip_empty in self.rules:
+            if key is None:
+                error = check(payload)
+            elif key in payload:
+                value = payload[key]
+                if skip_empty and not value:
+                    continue
+                error = check(value)
+            else:
+                continue
+            if error:
+                errors.append(error)
+        if self.allowed is not None and self.allowed.isdisjoint(payload):
+            errors.append("No valid fields provided for update")
+        return errors
+
+    def validate_many(self, payloads: Iterable[Any]) -> List[List[str]]:
+        """
+        Validates a batch of payloads, e.g. the items of a bulk request.
+        Returns:
+            The list of errors of each payload, in input order.
+        """
+        validate = self.validate
+        return [
+            validate(payload) if isinstance(payload, dict) else [NOT_AN_OBJECT]
+            for payload in payloads
+        ]
+
+
+REQUIRED_FIELDS = ["name", "gender", "age", "ward", "room", "doctor_name"]
+UPDATABLE_FIELDS = ["name", "age", "gender", "room", "ward", "doctor_name"]
+
+NEW_PATIENT_SCHEMA = PayloadSchema(
+    required=REQUIRED_FIELDS,
+    rules=[
+        field("name", check_name),
+        field("gender", check_gender),
+        field("age", check_age),
+        room_pair(),
+        field("doctor_name", check_doctor_name, skip_empty=True),
+    ],
+)
+
+PATIENT_UPDATE_SCHEMA = PayloadSchema(
+    allowed=UPDATABLE_FIELDS,
+    rules=[
+        field("name", check_name),
+        field("gender", check_gender),
+        field("age", check_age),
+        field("doctor_name", check_doctor_name),
+        room_pair(when_present=True),
+    ],
+)
+
+ROOM_ASSIGNMENT_SCHEMA = PayloadSchema(
+    required=["ward", "room"],
+    rules=[room_pair(required=True)],
+)
+
+DOCTOR_ASSIGNMENT_SCHEMA = PayloadSchema(
+    required=["doctor_name"],
+    rules=[field("doctor_name", check_doctor_name)],
+)
@@ -0,0 +1,527 @@
+# Request validation shared by the Flask and the async API controllers.
+# The payload validators run the compiled schemas of patient_schema.py and
+# return every error found, so a client can fix a request in one go.
+
+import zlib
+from datetime import date, datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+from config import (
+    INITIAL_ROW_VERSION,
+    DEFAULT_PAGE_SIZE,
+    MAX_PAGE_SIZE,
+    TIMESTAMP_FORMAT,
+    CHANGE_FEED_MAX_WAIT_SECONDS,
+    BATCH_MAX_PATIENTS,
+)
+from patient import Patient
+from patient_schema import (
+    UPDATABLE_FIELDS,
+    WARD_ROOMS,
+    is_integer,
+    is_valid_room,
+    NEW_PATIENT_SCHEMA,
+    PATIENT_UPDATE_SCHEMA,
+    ROOM_ASSIGNMENT_SCHEMA,
+    DOCTOR_ASSIGNMENT_SCHEMA,
+)
+
+def validate_new_patient(request_body: Dict[str, Any]) -> List[str]:
+    """
+    Validates the payload of a new patient.
+    Returns:
+        Every error found, empty if the payload is valid.
+    """
+    return NEW_PATIENT_SCHEMA.validate(request_body)
+
+
+def validate_patient_update(update_data: Dict[str, Any]) -> List[str]:
+    """
+    Validates the fields of a patient update.
+    Returns:
+        Every error found, empty if the payload is valid.
+    """
+    return PATIENT_UPDATE_SCHEMA.validate(update_data)
+
+
+def validate_room_assignment(request_body: Dict[str, Any]) -> List[str]:
+    """
+    Validates a ward and room assignment.
+    Returns:
+        Every error found, empty if the payload is valid.
+    """
+    return ROOM_ASSIGNMENT_SCHEMA.validate(request_body)
+
+
+def validate_doctor_assignment(request_body: Dict[str, Any]) -> List[str]:
+    """
+    Validates a doctor assignment.
+    Returns:
+        Every error found, empty if the payload is valid.
+    """
+    return DOCTOR_ASSIGNMENT_SCHEMA.validate(request_body)
+
+
+def error_response(errors: List[str]) -> Dict[str, Any]:
+    """
+    Builds the body of a 400 response: the first error as 'message', for
+    clients that only read one, and the full list as 'errors'.
+    """
+    return {"message": errors[0], "errors": errors}
+
+
+def parse_limit(value: Optional[str], default: Optional[int] = None) -> Tuple[Optional[int], Optional[str]]:
+    """
+    Parses a 'limit' query parameter.
+    Returns:
+        A (limit, error message) tuple; the limit falls back to the default
+        when the parameter is missing.
+    """
+    if value is None:
+        return default, None
+    try:
+        limit = int(value)
+    except ValueError:
+        return None, "limit must be an integer"
+    if not 0 < limit <= MAX_PAGE_SIZE:
+        return None, f"limit must be between 1 and {MAX_PAGE_SIZE}"
+    return limit, None
+
+
+# Query parameters accepted by GET /patients to filter the listing.
+INTEGER_FILTERS = ["ward", "room", "min_age", "max_age"]
+STRING_FILTERS = ["doctor_name", "gender"]
+# 'active' keeps the admitted (true) or checked out (false) patients;
+# 'include_archived' also lists the archived patients.
+BOOLEAN_FILTERS = ["active", "include_archived"]
+# Inclusive bounds on the checkin and checkout (discharge) times. A date
+# alone covers the whole day: from its midnight, or up to its last second.
+TIMESTAMP_FILTERS = ["checkin_from", "checkin_to", "checkout_from", "checkout_to"]
+
+
+def parse_patient_filters(args: Dict[str, str]) -> Tuple[Dict[str, Any], Optional[str]]:
+    """
+    Parses the filter query parameters of GET /patients.
+    Returns:
+        A (filters, error message) tuple. 'active' and 'include_archived'
+        are parsed to booleans and the numeric filters to integers.
+    """
+    filters: Dict[str, Any] = {}
+    for key in INTEGER_FILTERS:
+        if key in args:
+            try:
+                filters[key] = int(args[key])
+            except ValueError:
+                return {}, f"{key} must be an integer"
+    for key in STRING_FILTERS:
+        if key in args:
+            filters[key] = args[key]
+    for key in BOOLEAN_FILTERS:
+        if key in args:
+            value = args[key].lower()
+            if value not in ("true", "false"):
+                return {}, f"{key} must be true or false"
+            filters[key] = value == "true"
+    for key in TIMESTAMP_FILTERS:
+        if key in args:
+            timestamp = parse_timestamp(args[key], end_of_day=key.endswith("_to"))
+            if timestamp is None:
+                return {}, f"{key} must be an ISO-8601 date or datetime"
+            filters[key] = timestamp
+    return filters, None
+
+
+def parse_timestamp(value: str, end_of_day: bool = False) -> Optional[str]:
+    """
+    Parses an ISO-8601 date or datetime (UTC unless an offset is given).
+    Args:
+        value: The date or datetime.
+        end_of_day: Resolve a date alone to the last second of that day
+            rather than to its midnight, for an inclusive upper bound.
+    Returns:
+        The instant formatted like the stored timestamps, or None if invalid.
+    """
+    try:
+        moment = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    if end_of_day and _is_date(value):
+        moment = moment.replace(hour=23, minute=59, second=59)
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc)
+    return moment.strftime(TIMESTAMP_FORMAT)
+
+
+def _is_date(value: str) -> bool:
+    """Checks whether an ISO-8601 value is a date without a time."""
+    try:
+        date.fromisoformat(value)
+    except ValueError:
+        return False
+    return True
+
+
+def parse_change_feed_args(
+    args: Dict[str, str], last_event_id: Optional[str] = None
+) -> Tuple[Dict[str, Any], Optional[str]]:
+    """
+    Parses the query parameters of GET /patients/changes.
+    Args:
+        args: The query parameters.
+        last_event_id: The Last-Event-ID header sent by a reconnecting SSE
+            client; it takes precedence over 'since'.
+    Returns:
+        A (params, error message) tuple; params holds the 'since' seq, the
+        'limit' and the long-poll 'wait' in seconds.
+    """
+    since = last_event_id or args.get("since", "0")
+    try:
+        since = int(since)
+    except ValueError:
+        return {}, "since must be an integer"
+    if since < 0:
+        return {}, "since must not be negative"
+    limit, error = parse_limit(args.get("limit"), DEFAULT_PAGE_SIZE)
+    if error:
+        return {}, error
+    try:
+        wait = float(args.get("wait", "0"))
+    except ValueError:
+        return {}, "wait must be a number of seconds"
+    if not 0 <= wait <= CHANGE_FEED_MAX_WAIT_SECONDS:
+        return {}, f"wait must be between 0 and {CHANGE_FEED_MAX_WAIT_SECONDS} seconds"
+    return {"since": since, "limit": limit, "wait": wait}, None
+
+
+def listing_etag(table_version: int, query_string: bytes, ndjson: bool) -> str:
+    """
+    Builds the ETag of a patient listing: the table version, which changes
+    with every write, and a checksum of the query and representation.
+    """
+    variant = zlib.crc32(query_string + (b"#ndjson" if ndjson else b""))
+    return f"{table_version}-{variant:08x}"
+
+
+def parse_expected_version(if_match: Any) -> Tuple[Optional[int], Optional[str]]:
+    """
+    Parses the If-Match header of a conditional write.
+    Args:
+        if_match: The parsed header, a werkzeug ETags.
+    Returns:
+        A (version, error) pair: the patient version the write expects, or
+        None when the header is absent or '*', and an error message if the
+        header names no single patient version.
+    """
+    if not if_match or if_match.star_tag:
+        return None, None
+    tags = list(if_match)
+    if len(tags) != 1 or not tags[0].isdigit():
+        return None, "If-Match must name a single patient version"
+    return int(tags[0]), None
+
+
+def build_new_patient(request_body: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Builds the database record of a new, already validated patient.
+    """
+    new_patient = Patient(
+        name=request_body["name"],
+        gender=request_body["gender"],
+        age=request_body["age"],
+        ward=request_body.get("ward"),
+        room=request_body.get("room"),
+        doctor_name=request_body.get("doctor_name"),
+    )
+    record = new_patient.to_dict()
+    record["version"] = INITIAL_ROW_VERSION
+    return record
+
+
+def updatable_fields(update_data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Keeps only the fields of an update that clients are allowed to change.
+    """
+    return {k: v for k, v in update_data.items() if k in UPDATABLE_FIELDS}
+
+
+def validate_bulk_items(items: List[Any]) -> List[List[str]]:
+    """
+    Validates the items of one chunk of a bulk creation request in a single
+    batch. Items that could not be decoded are passed as the exception raised
+    while decoding them.
+    Returns:
+        The errors of each item, in input order; empty for valid new patients.
+    """
+    errors = NEW_PATIENT_SCHEMA.validate_many(items)
+    for position, item in enumerate(items):
+        if isinstance(item, Exception):
+            errors[position] = [str(item)]
+    return errors
+
+
+def prepare_bulk_chunk(
+    pending: List[Tuple[int, Any]]
+) -> Tuple[List[Dict[str, Any]], List[Tuple[int, Dict[str, Any]]]]:
+    """
+    Validates a chunk of (index, item) pairs of a bulk creation request.
+    Returns:
+        The error results of the invalid items and the (index, record) pairs
+        of the valid ones, ready to be inserted.
+    """
+    results = []
+    chunk = []
+    item_errors = validate_bulk_items([item for _, item in pending])
+    for (index, item), errors in zip(pending, item_errors):
+        if errors:
+            results.append(
+                {"index": index, "status": "error", "message": errors[0], "errors": errors}
+            )
+        else:
+            chunk.append((index, build_new_patient(item)))
+    return results, chunk
+
+
+def bulk_chunk_results(chunk: List[Tuple[int, Dict[str, Any]]], inserted_ids: List[Optional[str]]) -> List[Dict[str, Any]]:
+    """
+    Builds the per-item results of one inserted chunk of a bulk creation.
+    """
+    results = []
+    for (index, data), inserted_id in zip(chunk, inserted_ids):
+        if inserted_id:
+            results.append({"index": index, "status": "created", "id": inserted_id})
+        else:
+            results.append(
+                {"index": index, "status": "error", "message": "Failed to create patient"}
+            )
+    return results
+
+
+def bulk_response(results: List[Dict[str, Any]]) -> Tuple[Dict[str, Any], int]:
+    """
+    Summarizes the per-item results of a bulk creation.
+    Returns:
+        The response body and its status: 201 when every item was created,
+        207 otherwise.
+    """
+    results.sort(key=lambda result: result["index"])
+    created = sum(1 for result in results if result["status"] == "created")
+    response = {
+        "created": created,
+        "failed": len(results) - created,
+        "results": results,
+    }
+    return response, 201 if created == len(results) else 207
+
+
+def parse_patient_ids(ids: Any, key: str = "ids") -> Tuple[List[str], Optional[str]]:
+    """
+    Parses the list of patient IDs named by a batch operation.
+    Returns:
+        A (patient IDs, error message) tuple.
+    """
+    if not isinstance(ids, list) or not ids:
+        return [], f"{key} must be a non-empty array of patient IDs"
+    if len(ids) > BATCH_MAX_PATIENTS:
+        return [], f"{key} must not name more than {BATCH_MAX_PATIENTS} patients"
+    if not all(isinstance(patient_id, str) and patient_id for patient_id in ids):
+        return [], f"{key} must only contain patient IDs"
+    if len(set(ids)) != len(ids):
+        return [], f"{key} must not name a patient twice"
+    return ids, None
+
+
+def prepare_batch_updates(
+    items: List[Any],
+) -> Tuple[List[Dict[str, Any]], Dict[str, Dict[str, Any]], Dict[str, int], Dict[str, int]]:
+    """
+    Validates the items of PATCH /patients/batch: objects with the 'id' of
+    a patient, the fields to update and optionally the 'version' the patient
+    must still be at.
+    Returns:
+        The error results of the invalid items, the fields to update of each
+        valid patient, the expected versions, and the index of each valid
+        patient in the request.
+    """
+    results = []
+    updates: Dict[str, Dict[str, Any]] = {}
+    expected_versions: Dict[str, int] = {}
+    indexes: Dict[str, int] = {}
+    item_errors = PATIENT_UPDATE_SCHEMA.validate_many(items)
+    for index, (item, errors) in enumerate(zip(items, item_errors)):
+        patient_id = item.get("id") if isinstance(item, dict) else None
+        if isinstance(item, dict):
+            version = item.get("version")
+            if not isinstance(patient_id, str) or not patient_id:
+                errors.insert(0, "Each patient must have an 'id'")
+            elif patient_id in indexes:
+                errors.insert(0, f"Patient {patient_id} is named twice")
+            if version is not None and (
+                not isinstance(version, int) or isinstance(version, bool) or version < 1
+            ):
+                errors.append("version must be a positive integer")
+        if errors:
+            result = {"index": index, "status": "error", "message": errors[0], "errors": errors}
+            if isinstance(patient_id, str):
+                result["id"] = patient_id
+            results.append(result)
+            continue
+        updates[patient_id] = updatable_fields(item)
+        indexes[patient_id] = index
+        if item.get("version") is not None:
+            expected_versions[patient_id] = item["version"]
+    return results, updates, expected_versions, indexes
+
+
+def batch_update_results(
+    results: List[Dict[str, Any]],
+    indexes: Dict[str, int],
+    patients: List[Dict[str, Any]],
+    conflicts: Dict[str, int],
+) -> List[Dict[str, Any]]:
+    """
+    Adds the outcome of each valid item of PATCH /patients/batch to the
+    error results, in request order.
+    """
+    versions = {patient["id"]: patient["version"] for patient in patients}
+    for patient_id, index in indexes.items():
+        result = {"index": index, "id": patient_id}
+        if patient_id in versions:
+            result.update(status="updated", version=versions[patient_id])
+        elif patient_id in conflicts:
+            result.update(
+                status="conflict",
+                message="Patient was modified by another request",
+                version=conflicts[patient_id],
+            )
+        else:
+            result.update(status="not_found", message="Patient not found")
+        results.append(result)
+    results.sort(key=lambda result: result["index"])
+    return results
+
+
+def checkout_results(patient_ids: List[str], patients: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Builds the per-patient outcomes of POST /patients/batch/checkout, in request order.
+    """
+    checked_out = {patient["id"]: patient for patient in patients}
+    results = []
+    for patient_id in patient_ids:
+        patient = checked_out.get(patient_id)
+        if patient is None:
+            results.append({"id": patient_id, "status": "not_found", "message": "Patient not found"})
+        else:
+            results.append(
+                {
+                    "id": patient_id,
+                    "status": "checked_out",
+                    "checkout_time": patient["checkout"],
+                    "version": patient["version"],
+                }
+            )
+    return results
+
+
+def parse_ward_transfer(ward: int, request_body: Any) -> Tuple[Dict[str, Any], List[str]]:
+    """
+    Parses the body of POST /wards/<ward>/transfer: the destination 'ward',
+    either one 'room' for every patient or a 'rooms' object mapping rooms of
+    the ward to rooms of the destination, and optionally the 'ids' of the
+    patients to move (all the admitted patients of the ward by default).
+    Returns:
+        A (transfer_ward keyword arguments, errors) tuple.
+    """
+    if not isinstance(request_body, dict):
+        return {}, ["Request body must be a JSON object"]
+    errors = []
+    to_ward = request_body.get("ward")
+    if isinstance(to_ward, bool) or not isinstance(to_ward, int) or to_ward not in WARD_ROOMS:
+        errors.append(f"ward must be one of: {', '.join(map(str, WARD_ROOMS))}")
+        to_ward = None
+    room, rooms = request_body.get("room"), request_body.get("rooms")
+    params: Dict[str, Any] = {"to_ward": to_ward, "room": None, "rooms": None, "patient_ids": None}
+    if (room is None) == (rooms is None):
+        errors.append("Provide either room or rooms")
+    elif to_ward is None:
+        pass  # the rooms cannot be checked without a valid destination
+    elif room is not None:
+        if is_integer(room) and is_valid_room(to_ward, room):
+            params["room"] = room
+        else:
+            errors.append("Invalid ward or room number")
+    elif not isinstance(rooms, dict) or not rooms:
+        errors.append("rooms must map rooms of the ward to rooms of the destination ward")
+    else:
+        # JSON object keys are strings: only the destination rooms are integers.
+        for from_room, to_room in rooms.items():
+            if not (is_valid_room(ward, from_room) and is_integer(to_room) and is_valid_room(to_ward, to_room)):
+                errors.append(f"Invalid room mapping: {from_room} -> {to_room}")
+        if not errors:
+            params["rooms"] = {int(from_room): to_room for from_room, to_room in rooms.items()}
+    if "ids" in request_body:
+        params["patient_ids"], error = parse_patient_ids(request_body["ids"])
+        if error:
+            errors.append(error)
+    return params, errors
+
+
+def transfer_results(
+    patients: List[Dict[str, Any]], patient_ids: Optional[List[str]] = None
+) -> List[Dict[str, Any]]:
+    """
+    Builds the per-patient outcomes of POST /wards/<ward>/transfer: the moved
+    patients, then the requested ones that were not moved.
+    """
+    results = [
+        {
+            "id": patient["id"],
+            "status": "transferred",
+            "ward": patient["ward"],
+            "room": patient["room"],
+            "version": patient["version"],
+        }
+        for patient in sorted(patients, key=lambda patient: patient["id"])
+    ]
+    moved = {patient["id"] for patient in patients}
+    for patient_id in patient_ids or []:
+        if patient_id not in moved:
+            results.append(
+                {
+                    "id": patient_id,
+                    "status": "not_found",
+                    "message": "Patient is not admitted to a transferred room of the ward",
+                }
+            )
+    return results
+
+
+def batch_response(results: List[Dict[str, Any]], succeeded: str) -> Tuple[Dict[str, Any], int]:
+    """
+    Summarizes the per-patient outcomes of a batch operation.
+    Args:
+        results: The outcomes, each with a 'status'.
+        succeeded: The status of the patients the operation was applied to.
+    Returns:
+        The response body and its status: 200 when the operation was applied
+        to every patient, 207 otherwise.
+    """
+    done = sum(1 for result in results if result["status"] == succeeded)
+    response = {succeeded: done, "failed": len(results) - done, "results": results}
+    return response, 200 if done == len(results) else 207
+
+
+def stats_listing(rows: List[Dict[str, Any]], key: str, known: List[Any]) -> List[Dict[str, Any]]:
+    """
+    Builds the listing of GET /wards/stats or GET /doctors/stats from the
+    counter rows: every configured ward or doctor, with zero counters when
+    it has no patients, then the other values still found in the data
+    (e.g. doctors no longer in the configuration) that have patients.
+    """
+    by_key = {row[key]: row for row in rows}
+    listing = [
+        by_key.pop(value, {key: value, "active_patients": 0, "checked_out_patients": 0})
+        for value in known
+    ]
+    listing.extend(
+        row for row in by_key.values() if row["active_patients"] or row["checked_out_patients"]
+    )
+    return listing
@@ -0,0 +1,132 @@
+# Production entry point: serves the Flask application with gunicorn, in
+# several pre-forked worker processes, each running a pool of threads.
+#
+#   cd src
+#   python serve.py --workers 4 --threads 4 --bind 0.0.0.0:5001
+#
+# The application is built once in the master and forked into the workers.
+# Each worker opens its own database connections after the fork, and starts
+# replaying the writes of the other workers into its cache, occupancy index
+# and table version (see PATIENT_SYNC_CHANGES): the master runs no thread
+# that a fork could copy while it holds a lock. Signals sent to the master:
+#   TERM / INT  graceful shutdown: workers finish their requests first
+#               (up to the graceful timeout)
+#   HUP         graceful reload: new workers are started, then the old ones
+#               are stopped. With the default preload, the new workers are
+#               forked from the code the master imported at startup: to
+#               deploy new code, run with --no-preload or restart the server.
+#   TTIN / TTOU add / remove one worker
+
+import argparse
+import os
+from typing import Any, Dict, Optional
+
+from gunicorn.app.base import BaseApplication
+
+from api_controller import PatientAPIController
+from config import (
+    SERVER_BIND,
+    SERVER_WORKERS,
+    SERVER_THREADS,
+    SERVER_GRACEFUL_TIMEOUT_SECONDS,
+)
+
+# Every setting can be overridden from the environment.
+BIND = os.environ.get("PATIENT_API_BIND", SERVER_BIND)
+WORKERS = int(os.environ.get("PATIENT_API_WORKERS", str(SERVER_WORKERS)))
+THREADS = int(os.environ.get("PATIENT_API_THREADS", str(SERVER_THREADS)))
+GRACEFUL_TIMEOUT_SECONDS = int(
+    os.environ.get("PATIENT_API_GRACEFUL_TIMEOUT", str(SERVER_GRACEFUL_TIMEOUT_SECONDS))
+)
+GROUP_COMMIT = os.environ.get("PATIENT_API_GROUP_COMMIT", "false").lower() == "true"
+ADMISSION_CONTROL = os.environ.get("PATIENT_API_ADMISSION_CONTROL", "false").lower() == "true"
+
+
+def worker_count(workers: int) -> int:
+    """Resolves a worker count, 0 meaning one worker per CPU."""
+    return workers if workers > 0 else os.cpu_count() or 1
+
+
+class PatientServer(BaseApplication):
+    """A gunicorn application serving PatientAPIController."""
+
+    def __init__(self, options: Dict[str, Any], app_config: Optional[Dict[str, Any]] = None) -> None:
+        """
+        Args:
+            options: gunicorn settings (bind, workers, threads, ...).
+            app_config: Settings passed to the application factory. Its
+                PATIENT_SYNC_CHANGES is applied in each worker, after the fork.
+        """
+        self.options = options
+        self.app_config = dict(app_config or {})
+        self.sync_changes = self.app_config.pop("PATIENT_SYNC_CHANGES", False)
+        self.controller: Optional[PatientAPIController] = None
+        super().__init__()
+
+    def load_config(self) -> None:
+        for key, value in self.options.items():
+            if key in self.cfg.settings and value is not None:
+                self.cfg.set(key, value)
+        self.cfg.set("post_worker_init", self._post_worker_init)
+        self.cfg.set("worker_exit", self._worker_exit)
+
+    def load(self):
+        self.controller = PatientAPIController(
+            dict(self.app_config, PATIENT_SYNC_CHANGES=False)
+        )
+        return self.controller.app
+
+    def _post_worker_init(self, worker) -> None:
+        if self.sync_changes and self.controller is not None:
+            self.controller.follow_changes()
+
+    def _worker_exit(self, server, worker) -> None:
+        if self.controller is not None:
+            self.controller.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Serve the Patient API with gunicorn.")
+    parser.add_argument("--bind", default=BIND, help="address to listen on (host:port)")
+    parser.add_argument("--workers", type=int, default=WORKERS, help="worker processes, 0 for one per CPU")
+    parser.add_argument("--threads", type=int, default=THREADS, help="threads per worker")
+    parser.add_argument(
+        "--graceful-timeout", type=int, default=GRACEFUL_TIMEOUT_SECONDS,
+        help="seconds workers may take to finish their requests on shutdown or reload",
+    )
+    parser.add_argument(
+        "--no-preload", action="store_true",
+        help="build the application in each worker, so that HUP loads new code",
+    )
+    parser.add_argument(
+        "--group-commit", action="store_true", default=GROUP_COMMIT,
+        help="commit the inserts and updates of concurrent requests together",
+    )
+    parser.add_argument(
+        "--admission-control", action="store_true", default=ADMISSION_CONTROL,
+        help="bound the requests running against the database, answering 503 over budget",
+    )
+    args = parser.parse_args()
+
+    workers = worker_count(args.workers)
+    options = {
+        "bind": args.bind,
+        "workers": workers,
+        "threads": args.threads,
+        # Threaded workers keep answering gunicorn's heartbeat while
+        # long-polls and SSE streams hold request threads.
+        "worker_class": "gthread" if args.threads > 1 else "sync",
+        "graceful_timeout": args.graceful_timeout,
+        "preload_app": not args.no_preload,
+        "accesslog": "-",
+    }
+    app_config = {
+        "PATIENT_SYNC_CHANGES": workers > 1,
+        "PATIENT_GROUP_COMMIT": args.group_commit,
+        "PATIENT_ADMISSION_CONTROL": args.admission_control,
+    }
+    PatientServer(options, app_config).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+# Group commit for the single-patient writes of PatientDB.
+#
+# SQLite has a single writer, and every commit pays for a WAL sync: under an
+# admission spike, each request thread would wait for the write lock, then
+# commit on its own. GroupCommitQueue instead lets the writes that arrive
+# together share one transaction. The first writer to find the queue idle
+# becomes the leader: it waits a short window for other writers, runs the
+# queued writes one after the other in one transaction, each in its own
+# SAVEPOINT, and commits once. Every caller then gets its own result, or its
+# own exception: a failed write is rolled back to its savepoint without
+# aborting the others. Writers that queue up during a commit are flushed by
+# the next leader, chosen among them, so there is no background thread to
+# manage across forks.
+
+import threading
+from contextlib import AbstractContextManager
+from typing import Any, Callable, List, Optional
+
+from metrics import GROUP_COMMIT_BATCH_SIZE
+
+
+class _QueuedWrite:
+    """A write waiting in the queue, and then its outcome."""
+
+    __slots__ = ("apply", "result", "error", "done", "leads")
+
+    def __init__(self, apply: Callable[[Any], Any]) -> None:
+        self.apply = apply
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.done = False
+        # Set on the write whose thread must flush the next batch.
+        self.leads = False
+
+
+class GroupCommitQueue:
+    """
+    Coalesces the writes of concurrent threads into shared transactions.
+    A write is a function of a connection, run inside the shared transaction;
+    submit() returns its result once the transaction has been committed.
+    """
+
+    def __init__(
+        self,
+        begin: Callable[[], AbstractContextManager],
+        max_batch: int,
+        window: float,
+    ) -> None:
+        """
+        Args:
+            begin: Opens a transaction and returns its connection, committing
+                it on exit (e.g. engine.begin).
+            max_batch: The most writes committed together.
+            window: Seconds a leader waits for more writes before flushing,
+                unless the batch is full first. 0 only groups the writes that
+                queued up during the previous commit.
+        """
+        self.begin = begin
+        self.max_batch = max_batch
+        self.window = window
+        self._condition = threading.Condition()
+        self._pending: List[_QueuedWrite] = []
+        self._leading = False
+
+    def submit(self, apply: Callable[[Any], Any]) -> Any:
+        """
+        Queues a write and waits until it is committed.
+        Args:
+            apply: Runs the write on the connection of the shared transaction.
+        Returns:
+            What apply returned.
+        Raises:
+            Whatever apply raised, or the error of the commit.
+        """
+        write = _QueuedWrite(apply)
+        with self._condition:
+            self._pending.append(write)
+            if self._leading:
+                # Lets a waiting leader flush early once the batch is full.
+                self._condition.notify_all()
+            else:
+                self._leading = True
+                write.leads = True
+            while not (write.done or write.leads):
+                self._condition.wait()
+        if not write.done:
+            self._lead()
+        if write.error is not None:
+            raise write.error
+        return write.result
+
+    def _lead(self) -> None:
+        """Flushes the next batch, then hands the lead to a queued writer, if any."""
+        with self._condition:
+            self._condition.wait_for(lambda: len(self._pending) >= self.max_batch, self.window)
+            batch = self._pending[: self.max_batch]
+            del self._pending[: self.max_batch]
+        try:
+            self._flush(batch)
+        except BaseException as e:
+            # Interrupted (KeyboardInterrupt, a worker timeout): the
+            # transaction was rolled back, so no write of the batch was committed.
+            interrupted = RuntimeError("The group commit was interrupted")
+            interrupted.__cause__ = e
+            for write in batch:
+                write.error = interrupted
+                write.result = None
+            raise
+        finally:
+            # Whatever happened, the writers of the batch must not wait
+            # forever, nor the queued ones for a lead never handed off.
+            with self._condition:
+                for write in batch:
+                    write.done = True
+                if self._pending:
+                    self._pending[0].leads = True
+                else:
+                    self._leading = False
+                self._condition.notify_all()
+
+    def _flush(self, batch: List[_QueuedWrite]) -> None:
+        """Runs a batch of writes in one transaction, one savepoint each."""
+        GROUP_COMMIT_BATCH_SIZE.observe(len(batch))
+        try:
+            with self.begin() as conn:
+                if conn.dialect.name == "sqlite":
+                    # pysqlite only opens a transaction at the first write, so
+                    # releasing the first savepoint would commit it: open it
+                    # now, taking the write lock for the whole batch.
+                    conn.exec_driver_sql("BEGIN IMMEDIATE")
+                for write in batch:
+                    try:
+                        with conn.begin_nested():
+                            write.result = write.apply(conn)
+                    except Exception as e:
+                        write.error = e
+        except Exception as e:
+            # Nothing was committed: every write of the batch failed.
+            for write in batch:
+                if write.error is None:
+                    write.error = e
+                    write.result = None
@@ -0,0 +1,23 @@
+import os
+import sys
+
+import pytest
+
+SRC_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src"))
+sys.path.insert(0, SRC_DIR)
+
+from patient_db_config import Storage  # noqa: E402
+
+
+@pytest.fixture
+def app_config(tmp_path):
+    """Settings giving an app its own database file."""
+    return {"PATIENT_DB_URL": f"sqlite:///{tmp_path / 'patient.db'}"}
+
+
+@pytest.fixture
+def storage(tmp_path):
+    """A Storage on a fresh database file, disposed of after the test."""
+    storage = Storage(f"sqlite:///{tmp_path / 'patient.db'}")
+    yield storage
+    storage.dispose()
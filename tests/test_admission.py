@@ -0,0 +1,174 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+import patient_handlers
+from admission import (
+    PRIORITY_BULK,
+    PRIORITY_CLINICAL,
+    PRIORITY_DEFAULT,
+    AdmissionGate,
+    AsyncAdmissionGate,
+)
+from api_controller import PatientAPIController
+from async_api_controller import AsyncPatientAPIController
+from metrics import ADMISSION_REJECTED, ADMISSION_STATE
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.005)
+
+
+def acquire_in_thread(gate, priority, outcomes):
+    thread = threading.Thread(target=lambda: outcomes.append((priority, gate.acquire(priority))))
+    thread.start()
+    return thread
+
+
+def test_a_full_queue_rejects_at_once():
+    gate = AdmissionGate("test", concurrency=1, queue_size=1, timeout=5)
+    assert gate.acquire()
+    outcomes = []
+    waiting = acquire_in_thread(gate, PRIORITY_DEFAULT, outcomes)
+    wait_until(lambda: gate._waiters)
+    rejected = ADMISSION_REJECTED.value(gate="test", priority="default", reason="queue_full")
+
+    assert not gate.acquire()
+    assert ADMISSION_REJECTED.value(gate="test", priority="default", reason="queue_full") == rejected + 1
+
+    gate.release()
+    waiting.join(5)
+    assert outcomes == [(PRIORITY_DEFAULT, True)]
+    gate.release()
+    assert gate.active == 0
+
+
+def test_a_waiter_gives_up_past_the_deadline():
+    gate = AdmissionGate("test", concurrency=1, queue_size=1, timeout=0.05)
+    assert gate.acquire()
+
+    assert not gate.acquire()
+
+    assert not gate._waiters
+    gate.release()
+    assert gate.active == 0
+
+
+def test_waiters_are_admitted_by_lane_then_arrival():
+    gate = AdmissionGate("test", concurrency=1, queue_size=3, timeout=5)
+    assert gate.acquire()
+    outcomes = []
+    threads = []
+    for count, priority in enumerate((PRIORITY_BULK, PRIORITY_DEFAULT, PRIORITY_CLINICAL), 1):
+        threads.append(acquire_in_thread(gate, priority, outcomes))
+        wait_until(lambda: len(gate._waiters) == count)
+
+    for expected in (PRIORITY_CLINICAL, PRIORITY_DEFAULT, PRIORITY_BULK):
+        gate.release()
+        wait_until(lambda: len(outcomes) == 3 - len(gate._waiters))
+        assert outcomes[-1] == (expected, True)
+    for thread in threads:
+        thread.join(5)
+
+
+def test_an_urgent_request_sheds_the_least_urgent_waiter():
+    gate = AdmissionGate("test", concurrency=1, queue_size=1, timeout=5)
+    assert gate.acquire()
+    outcomes = []
+    bulk = acquire_in_thread(gate, PRIORITY_BULK, outcomes)
+    wait_until(lambda: gate._waiters)
+
+    clinical = acquire_in_thread(gate, PRIORITY_CLINICAL, outcomes)
+    bulk.join(5)
+    assert outcomes == [(PRIORITY_BULK, False)]
+    assert ADMISSION_REJECTED.value(gate="test", priority="bulk", reason="shed") >= 1
+
+    gate.release()
+    clinical.join(5)
+    assert outcomes[-1] == (PRIORITY_CLINICAL, True)
+
+
+def test_async_gate_sheds_and_admits_by_lane():
+    async def scenario():
+        gate = AsyncAdmissionGate("test", concurrency=1, queue_size=1, timeout=5)
+        assert await gate.acquire()
+        bulk = asyncio.create_task(gate.acquire(PRIORITY_BULK))
+        await asyncio.sleep(0)
+        clinical = asyncio.create_task(gate.acquire(PRIORITY_CLINICAL))
+        assert await bulk is False
+        gate.release()
+        assert await clinical is True
+        gate.release()
+        return gate.active
+
+    assert asyncio.run(scenario()) == 0
+
+
+@pytest.fixture
+def controller(app_config, monkeypatch):
+    # One read slot and no queue: a second read is rejected at once.
+    monkeypatch.setattr(patient_handlers, "ADMISSION_READ_CONCURRENCY", 1)
+    monkeypatch.setattr(patient_handlers, "ADMISSION_QUEUE_SIZE", 0)
+    controller = PatientAPIController({**app_config, "PATIENT_ADMISSION_CONTROL": True})
+    yield controller
+    controller.close()
+
+
+def test_requests_over_budget_get_a_503(controller):
+    client = controller.app.test_client()
+    read_gate = controller.admission_gates["read"]
+    rejected = ADMISSION_REJECTED.value(gate="read", priority="bulk", reason="queue_full")
+    assert client.get("/patients").status_code == 200
+    assert read_gate.acquire()
+
+    response = client.get("/patients")
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+    assert ADMISSION_REJECTED.value(gate="read", priority="bulk", reason="queue_full") == rejected + 1
+    # Memory-only routes are not gated, and writes have their own budget.
+    assert client.get("/wards").status_code == 200
+    assert client.post("/patients/batch/checkout", json={"ids": ["missing"]}).status_code != 503
+    read_gate.release()
+    assert client.get("/patients").status_code == 200
+    assert read_gate.active == 0
+
+
+def active_reads():
+    """The active requests of every read gate exported in /metrics."""
+    return sorted(
+        value for _, labels, value in ADMISSION_STATE.samples()
+        if labels == {"gate": "read", "state": "active"}
+    )
+
+
+def test_each_app_exports_its_gates_until_closed(controller, tmp_path):
+    other = PatientAPIController(
+        {"PATIENT_DB_URL": f"sqlite:///{tmp_path / 'other.db'}", "PATIENT_ADMISSION_CONTROL": True}
+    )
+    assert controller.admission_gates["read"].acquire()
+
+    # A second application does not replace the gates of the first.
+    assert active_reads() == [0, 1]
+
+    other.close()
+    assert active_reads() == [1]
+    controller.admission_gates["read"].release()
+
+
+def test_async_app_stops_exporting_its_gates_after_serving(app_config):
+    controller = AsyncPatientAPIController({**app_config, "PATIENT_ADMISSION_CONTROL": True})
+    gates = len(active_reads())
+
+    async def serve():
+        async with controller.app.test_app():
+            assert len(active_reads()) == gates
+
+    asyncio.run(serve())
+
+    assert len(active_reads()) == gates - 1
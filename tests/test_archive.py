@@ -0,0 +1,78 @@
+import pytest
+
+from api_controller import PatientAPIController
+
+# A checkout cutoff after every checkout of the tests.
+FAR_FUTURE = "9999-12-31T00:00:00Z"
+
+
+@pytest.fixture
+def controller(app_config):
+    return PatientAPIController(app_config)
+
+
+def admit(client, name, room=11):
+    response = client.post(
+        "/patients",
+        json={"name": name, "gender": "Female", "age": 30, "ward": 1, "room": room, "doctor_name": "Carlo"},
+    )
+    assert response.status_code == 201
+    return response.get_json()
+
+
+def test_archive_moves_only_the_checked_out_patients(controller):
+    client = controller.app.test_client()
+    ann, bob, eve = admit(client, "Ann Lee"), admit(client, "Bob Ray"), admit(client, "Eve Roe")
+    client.put(f"/patients/{ann['id']}/checkout")
+    client.put(f"/patients/{bob['id']}/checkout")
+
+    assert controller.patient_db.archive_patients(FAR_FUTURE, batch_size=1) == 1
+    assert controller.patient_db.archive_patients(FAR_FUTURE, batch_size=10) == 1
+    assert controller.patient_db.archive_patients(FAR_FUTURE) == 0
+
+    live = client.get("/patients").get_json()
+    assert [patient["id"] for patient in live] == [eve["id"]]
+    listed = client.get("/patients?include_archived=true").get_json()
+    assert {patient["id"] for patient in listed} == {ann["id"], bob["id"], eve["id"]}
+
+
+def test_archive_keeps_the_patients_checked_out_recently(controller):
+    client = controller.app.test_client()
+    ann = admit(client, "Ann Lee")
+    client.put(f"/patients/{ann['id']}/checkout")
+
+    assert controller.patient_db.archive_checked_out(max_age_days=30, pause=0) == 0
+    assert client.get(f"/patients/{ann['id']}").status_code == 200
+
+
+def test_archived_patients_are_only_found_on_request(controller):
+    client = controller.app.test_client()
+    ann = admit(client, "Ann Lee")
+    client.put(f"/patients/{ann['id']}/checkout")
+    client.get(f"/patients/{ann['id']}")  # cached
+    listing = client.get("/patients")
+
+    controller.patient_db.archive_patients(FAR_FUTURE)
+
+    assert client.get(f"/patients/{ann['id']}").status_code == 404
+    archived = client.get(f"/patients/{ann['id']}?include_archived=true")
+    assert archived.status_code == 200
+    assert archived.get_json()["name"] == "Ann Lee"
+    assert client.get("/patients/search?search_name=Ann").status_code == 404
+    found = client.get("/patients/search?search_name=Ann&include_archived=true").get_json()
+    assert [patient["id"] for patient in found] == [ann["id"]]
+    # The listing changed, so its old ETag no longer matches.
+    revalidated = client.get("/patients", headers={"If-None-Match": listing.headers["ETag"]})
+    assert revalidated.status_code == 200
+
+
+def test_archive_is_logged_in_the_change_feed(controller):
+    client = controller.app.test_client()
+    ann = admit(client, "Ann Lee")
+    client.put(f"/patients/{ann['id']}/checkout")
+
+    controller.patient_db.archive_patients(FAR_FUTURE)
+
+    changes = client.get("/patients/changes?since=0").get_json()["changes"]
+    assert [change["operation"] for change in changes] == ["insert", "update", "archive"]
+    assert changes[-1]["patient_id"] == ann["id"]
@@ -0,0 +1,149 @@
+import asyncio
+
+import pytest
+
+from api_controller import create_app
+from async_api_controller import create_async_app
+
+
+@pytest.fixture
+def client(app_config):
+    return create_app(app_config).test_client()
+
+
+def admit(client, name, ward=1, room=11):
+    response = client.post(
+        "/patients",
+        json={"name": name, "gender": "Female", "age": 30, "ward": ward, "room": room, "doctor_name": "Carlo"},
+    )
+    assert response.status_code == 201
+    return response.get_json()
+
+
+def test_batch_update_reports_each_item(client):
+    ann, bob, eve = admit(client, "Ann Lee"), admit(client, "Bob Ray"), admit(client, "Eve Roe")
+
+    response = client.patch(
+        "/patients/batch",
+        json=[
+            {"id": ann["id"], "age": 41},
+            {"id": bob["id"], "age": 42, "version": 7},
+            {"id": "missing", "age": 43},
+            {"id": eve["id"], "age": -1},
+        ],
+    )
+
+    assert response.status_code == 207
+    body = response.get_json()
+    assert (body["updated"], body["failed"]) == (1, 3)
+    assert [(r["index"], r["status"]) for r in body["results"]] == [
+        (0, "updated"),
+        (1, "conflict"),
+        (2, "not_found"),
+        (3, "error"),
+    ]
+    assert body["results"][0]["version"] == 2
+    assert body["results"][1]["version"] == 1
+    assert client.get(f"/patients/{ann['id']}").get_json()["age"] == 41
+    assert client.get(f"/patients/{bob['id']}").get_json()["age"] == 30
+
+
+def test_batch_update_of_every_item_answers_200(client):
+    ann, bob = admit(client, "Ann Lee"), admit(client, "Bob Ray")
+
+    response = client.patch(
+        "/patients/batch",
+        json=[{"id": ann["id"], "doctor_name": "Lollo", "version": 1}, {"id": bob["id"], "doctor_name": "Lollo"}],
+    )
+
+    assert response.status_code == 200
+    assert response.get_json()["updated"] == 2
+
+
+@pytest.mark.parametrize("body", [[], {"id": "x"}, [{"id": str(n)} for n in range(1001)]])
+def test_batch_update_rejects_a_malformed_batch(client, body):
+    assert client.patch("/patients/batch", json=body).status_code == 400
+
+
+def test_batch_checkout(client):
+    ann, bob = admit(client, "Ann Lee"), admit(client, "Bob Ray")
+
+    response = client.post("/patients/batch/checkout", json={"ids": [ann["id"], "missing", bob["id"]]})
+
+    assert response.status_code == 207
+    results = response.get_json()["results"]
+    assert [(r["id"], r["status"]) for r in results] == [
+        (ann["id"], "checked_out"),
+        ("missing", "not_found"),
+        (bob["id"], "checked_out"),
+    ]
+    assert client.get(f"/patients/{ann['id']}").get_json()["checkout"] == results[0]["checkout_time"]
+    # Checked out patients no longer occupy their room.
+    assert client.get("/wards").get_json()["wards"][0]["patients"] == 0
+
+
+@pytest.mark.parametrize("body", [{}, {"ids": []}, {"ids": ["a", "a"]}, {"ids": [1]}])
+def test_batch_checkout_rejects_bad_ids(client, body):
+    assert client.post("/patients/batch/checkout", json=body).status_code == 400
+
+
+def test_transfer_moves_the_admitted_patients_of_a_ward(client):
+    ann, bob = admit(client, "Ann Lee", room=11), admit(client, "Bob Ray", room=12)
+    admit(client, "Eve Roe", ward=2, room=21)
+    client.put(f"/patients/{bob['id']}/checkout")
+
+    response = client.post("/wards/1/transfer", json={"ward": 3, "room": 33})
+
+    assert response.status_code == 200
+    assert response.get_json()["transferred"] == 1
+    patient = client.get(f"/patients/{ann['id']}").get_json()
+    assert (patient["ward"], patient["room"]) == (3, 33)
+    assert client.get(f"/patients/{bob['id']}").get_json()["ward"] == 1
+    wards = {ward["ward"]: ward for ward in client.get("/wards").get_json()["wards"]}
+    assert (wards[1]["patients"], wards[2]["patients"], wards[3]["patients"]) == (0, 1, 1)
+
+
+def test_transfer_maps_rooms_and_reports_patients_left_behind(client):
+    ann, bob = admit(client, "Ann Lee", room=11), admit(client, "Bob Ray", room=12)
+
+    response = client.post(
+        "/wards/1/transfer", json={"ward": 2, "rooms": {"11": 21}, "ids": [ann["id"], bob["id"]]}
+    )
+
+    assert response.status_code == 207
+    results = {result["id"]: result for result in response.get_json()["results"]}
+    assert (results[ann["id"]]["status"], results[ann["id"]]["room"]) == ("transferred", 21)
+    assert results[bob["id"]]["status"] == "not_found"
+    assert client.get(f"/patients/{bob['id']}").get_json()["room"] == 12
+
+
+def test_transfer_rejects_an_unknown_ward_and_a_bad_body(client):
+    assert client.post("/wards/9/transfer", json={"ward": 2, "room": 21}).status_code == 404
+    response = client.post("/wards/1/transfer", json={"ward": 7})
+    assert response.status_code == 400
+    assert response.get_json()["errors"] == ["ward must be one of: 1, 2, 3, 4", "Provide either room or rooms"]
+
+
+def test_async_batch_routes_match_the_flask_ones(app_config):
+    app = create_async_app(app_config)
+
+    async def run():
+        async with app.test_app():
+            client = app.test_client()
+            response = await client.post(
+                "/patients",
+                json={"name": "Ann Lee", "gender": "Female", "age": 30, "ward": 1, "room": 11, "doctor_name": "Carlo"},
+            )
+            ann = await response.get_json()
+            update = await client.patch(
+                "/patients/batch", json=[{"id": ann["id"], "age": 41}, {"id": "missing", "age": 42}]
+            )
+            transfer = await client.post("/wards/1/transfer", json={"ward": 2, "room": 21})
+            checkout = await client.post("/patients/batch/checkout", json={"ids": [ann["id"]]})
+            return [(r.status_code, await r.get_json()) for r in (update, transfer, checkout)]
+
+    (update_status, update), (transfer_status, transfer), (checkout_status, checkout) = asyncio.run(run())
+    assert update_status == 207
+    assert [r["status"] for r in update["results"]] == ["updated", "not_found"]
+    assert (transfer_status, transfer["results"][0]["room"]) == (200, 21)
+    assert (checkout_status, checkout["checked_out"]) == (200, 1)
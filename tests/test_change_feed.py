@@ -0,0 +1,100 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+import patient_handlers
+from api_controller import PatientAPIController
+from async_api_controller import AsyncPatientAPIController
+from patient_validation import build_new_patient
+
+
+def new_patient(name="Ann Lee"):
+    return build_new_patient(
+        {"name": name, "gender": "Female", "age": 30, "ward": 1, "room": 11, "doctor_name": "Carlo"}
+    )
+
+
+@pytest.fixture
+def controller(app_config):
+    return PatientAPIController(app_config)
+
+
+def test_long_poll_returns_a_write_committed_while_waiting(controller):
+    client = controller.app.test_client()
+    patient = new_patient()
+    timer = threading.Timer(0.2, controller.patient_db.insert_patient, [patient])
+    timer.start()
+
+    started = time.monotonic()
+    response = client.get("/patients/changes?since=0&wait=5")
+    timer.join()
+
+    assert time.monotonic() - started < 4
+    assert response.status_code == 200
+    changes = response.get_json()["changes"]
+    assert [(c["operation"], c["patient_id"]) for c in changes] == [("insert", patient["id"])]
+    assert response.get_json()["next_since"] == changes[-1]["seq"]
+
+
+def test_long_poll_times_out_with_no_changes(controller):
+    controller.patient_db.insert_patient(new_patient())
+    client = controller.app.test_client()
+
+    response = client.get("/patients/changes?since=1&wait=0.2")
+
+    assert response.status_code == 200
+    assert response.get_json() == {"changes": [], "next_since": 1}
+
+
+def test_bad_feed_arguments_are_rejected(controller):
+    client = controller.app.test_client()
+    assert client.get("/patients/changes?since=-1").status_code == 400
+    assert client.get("/patients/changes?wait=3600").status_code == 400
+
+
+def test_sse_stream_resumes_after_the_last_event_id(controller, monkeypatch):
+    monkeypatch.setattr(patient_handlers, "CHANGE_FEED_STREAM_SECONDS", 0.3)
+    monkeypatch.setattr(patient_handlers, "CHANGE_FEED_HEARTBEAT_SECONDS", 0.1)
+    client = controller.app.test_client()
+    first, second = new_patient("Ann Lee"), new_patient("Bob Ray")
+    controller.patient_db.insert_patient(first)
+    controller.patient_db.insert_patient(second)
+
+    response = client.get(
+        "/patients/changes", headers={"Accept": "text/event-stream", "Last-Event-ID": "1"}
+    )
+    body = response.get_data(as_text=True)
+
+    assert response.mimetype == "text/event-stream"
+    assert response.headers["Cache-Control"] == "no-cache"
+    assert body.startswith("retry: ")
+    assert first["id"] not in body
+    assert "id: 2\nevent: insert\ndata: " in body
+    assert second["id"] in body
+    assert body.endswith(": keep-alive\n\n")
+
+
+def test_async_long_poll_returns_a_write_committed_while_waiting(app_config):
+    controller = AsyncPatientAPIController(app_config)
+    patient = new_patient()
+
+    async def poll():
+        async with controller.app.test_app():
+            client = controller.app.test_client()
+
+            async def write():
+                await asyncio.sleep(0.2)
+                await controller.patient_db.insert_patient(patient)
+
+            writer = asyncio.create_task(write())
+            response = await client.get("/patients/changes?since=0&wait=5")
+            await writer
+            return await response.get_json()
+
+    started = time.monotonic()
+    page = asyncio.run(poll())
+
+    assert time.monotonic() - started < 4
+    assert [(c["operation"], c["patient_id"]) for c in page["changes"]] == [("insert", patient["id"])]
@@ -0,0 +1,84 @@
+import time
+
+from sqlalchemy import event
+from sqlalchemy.exc import OperationalError
+
+from api_controller import PatientAPIController
+from metrics import DB_ERRORS
+from patient_db import PatientDB
+from patient_db_config import Storage
+from patient_validation import build_new_patient
+
+
+def new_patient(name):
+    return build_new_patient(
+        {"name": name, "gender": "Female", "age": 30, "ward": 1, "room": 11, "doctor_name": "Carlo"}
+    )
+
+
+def count_statements(storage):
+    """Counts the statements run on both engines of a storage."""
+    statements = []
+    for engine in (storage.engine, storage.read_engine):
+        event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+    return statements
+
+
+def test_listing_revalidation_does_not_query_the_database(app_config):
+    controller = PatientAPIController(app_config)
+    try:
+        client = controller.app.test_client()
+        etag = client.get("/patients").headers["ETag"]
+        statements = count_statements(controller.patient_db.storage)
+
+        assert client.get("/patients", headers={"If-None-Match": etag}).status_code == 304
+
+        assert statements == []
+    finally:
+        controller.close()
+
+
+def test_listing_etag_follows_the_writes_of_other_processes(storage):
+    controller = PatientAPIController(
+        {"PATIENT_DB_URL": str(storage.engine.url), "PATIENT_SYNC_CHANGES": True}
+    )
+    # Another process serving the same database; its writes reach this one
+    # through the change follower.
+    other_process = PatientDB(storage=Storage(str(storage.engine.url)))
+    try:
+        client = controller.app.test_client()
+        etag = client.get("/patients").headers["ETag"]
+
+        other_process.insert_patient(new_patient("Ann Lee"))
+
+        deadline = time.monotonic() + 5
+        response = client.get("/patients", headers={"If-None-Match": etag})
+        while response.status_code == 304 and time.monotonic() < deadline:
+            time.sleep(0.05)
+            response = client.get("/patients", headers={"If-None-Match": etag})
+        assert response.status_code == 200
+        assert response.headers["ETag"] != etag
+        assert [patient["name"] for patient in response.get_json()] == ["Ann Lee"]
+    finally:
+        other_process.storage.dispose()
+        controller.close()
+
+
+def test_failed_delete_answers_500_without_the_database_error(app_config, monkeypatch):
+    controller = PatientAPIController(app_config)
+    try:
+        patient = new_patient("Ann Lee")
+        controller.patient_db.insert_patient(patient)
+
+        def fail(*args):
+            raise OperationalError("DELETE FROM patients", {}, Exception("disk I/O error"))
+
+        monkeypatch.setattr(controller.patient_db, "_delete_statement", fail)
+        errors = DB_ERRORS.value(operation="delete_patient")
+        response = controller.app.test_client().delete(f"/patients/{patient['id']}")
+
+        assert response.status_code == 500
+        assert response.get_json() == {"message": "Error deleting patient"}
+        assert DB_ERRORS.value(operation="delete_patient") == errors + 1
+    finally:
+        controller.close()
@@ -0,0 +1,95 @@
+import csv
+import gzip
+import io
+import json
+
+import pytest
+
+from api_controller import create_app
+from import_patients import import_file
+from patient_db import PatientDB
+from patient_db_config import Storage
+
+PATIENTS = [
+    {"name": "Ann Lee", "gender": "Female", "age": 30, "ward": 1, "room": 11, "doctor_name": "Carlo"},
+    {"name": "Bob Ray", "gender": "Male", "age": 52, "ward": 2, "room": 21, "doctor_name": "Lollo"},
+    {"name": "Eve, \"Jr\" Roe", "gender": "Female", "age": 7, "ward": 2, "room": 22, "doctor_name": "Alice"},
+]
+
+
+def by_id(patients):
+    return sorted(patients, key=lambda patient: patient["id"])
+
+
+@pytest.fixture
+def client(app_config):
+    client = create_app(app_config).test_client()
+    for patient in PATIENTS:
+        assert client.post("/patients", json=patient).status_code == 201
+    return client
+
+
+@pytest.fixture
+def empty_db(tmp_path):
+    storage = Storage(f"sqlite:///{tmp_path / 'imported.db'}")
+    yield PatientDB(storage=storage)
+    storage.dispose()
+
+
+def test_ndjson_export_lists_every_patient(client):
+    response = client.get("/patients/export")
+
+    assert response.status_code == 200
+    assert response.mimetype == "application/x-ndjson"
+    assert response.headers["Content-Disposition"] == 'attachment; filename="patients.ndjson"'
+    exported = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert by_id(exported) == by_id(client.get("/patients").get_json())
+
+
+def test_csv_export_applies_the_listing_filters(client):
+    response = client.get("/patients/export?format=csv&ward=2")
+
+    assert response.mimetype == "text/csv"
+    rows = list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+    assert sorted(row["name"] for row in rows) == ["Bob Ray", 'Eve, "Jr" Roe']
+    assert {row["ward"] for row in rows} == {"2"}
+
+
+def test_export_is_gzipped_on_request(client):
+    plain = client.get("/patients/export?format=csv").get_data()
+
+    response = client.get("/patients/export?format=csv", headers={"Accept-Encoding": "gzip"})
+
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert response.headers["Vary"] == "Accept-Encoding"
+    assert gzip.decompress(response.get_data()) == plain
+
+
+@pytest.mark.parametrize("query", ["format=xml", "ward=x"])
+def test_export_rejects_bad_arguments(client, query):
+    assert client.get(f"/patients/export?{query}").status_code == 400
+
+
+@pytest.mark.parametrize("export_format", ["csv", "ndjson"])
+def test_import_restores_an_export_with_its_ids(client, empty_db, tmp_path, export_format):
+    path = tmp_path / f"patients.{export_format}.gz"
+    response = client.get(f"/patients/export?format={export_format}", headers={"Accept-Encoding": "gzip"})
+    path.write_bytes(response.get_data())
+
+    assert import_file(empty_db, str(path), export_format, batch_size=2, keep_ids=True) == (3, 0)
+
+    assert by_id(empty_db.select_all_patients()) == by_id(client.get("/patients").get_json())
+
+
+def test_import_creates_new_patients_and_skips_invalid_records(client, empty_db, tmp_path, capsys):
+    path = tmp_path / "patients.ndjson"
+    exported = client.get("/patients/export").get_data(as_text=True)
+    path.write_text(exported + '{"name": "No Age"}\nnot json\n')
+
+    assert import_file(empty_db, str(path), "ndjson", batch_size=10) == (3, 2)
+
+    imported = empty_db.select_all_patients()
+    assert sorted(patient["name"] for patient in imported) == sorted(patient["name"] for patient in PATIENTS)
+    exported_ids = {json.loads(line)["id"] for line in exported.splitlines()}
+    assert not exported_ids & {patient["id"] for patient in imported}
+    assert "Record 4:" in capsys.readouterr().err
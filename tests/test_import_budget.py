@@ -0,0 +1,57 @@
+# Runs the import-time budget check of benchmarks/import_budget.py, and
+# checks that importing the modules that depend on SQLAlchemy creates no
+# engine: the database is only connected by the application factories.
+
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "benchmarks"))
+
+from import_budget import BUDGETS, SRC_DIR, measure  # noqa: E402
+
+# Records the engines created while a module is imported. SQLAlchemy is
+# imported first to wrap its factories, so this probe is not timed.
+ENGINE_PROBE = """
+import json
+import sqlalchemy
+import sqlalchemy.ext.asyncio
+
+calls = []
+
+def recording(name, create):
+    def wrapper(*args, **kwargs):
+        calls.append(name)
+        return create(*args, **kwargs)
+    return wrapper
+
+sqlalchemy.create_engine = recording("create_engine", sqlalchemy.create_engine)
+sqlalchemy.ext.asyncio.create_async_engine = recording(
+    "create_async_engine", sqlalchemy.ext.asyncio.create_async_engine
+)
+import {module}
+print(json.dumps(calls))
+"""
+
+
+@pytest.mark.parametrize("module,budget,forbidden", BUDGETS, ids=[module for module, _, _ in BUDGETS])
+def test_import_stays_within_budget(module, budget, forbidden):
+    result = measure(module, runs=3)
+    assert result["ms"] <= budget, f"importing {module} took {result['ms']:.0f} ms"
+    assert not [name for name in forbidden if name in result["modules"]]
+    assert result["files"] == []  # no patient.db, nor its -wal/-shm files
+
+
+@pytest.mark.parametrize("module", [module for module, _, forbidden in BUDGETS if "sqlalchemy" not in forbidden])
+def test_import_creates_no_engine(module, tmp_path):
+    env = dict(os.environ, PYTHONPATH=SRC_DIR, PATIENT_DB_FILE=str(tmp_path / "patient.db"))
+    env.pop("PATIENT_DB_URL", None)
+    output = subprocess.run(
+        [sys.executable, "-c", ENGINE_PROBE.format(module=module)],
+        cwd=tmp_path, env=env, capture_output=True, text=True, check=True,
+    ).stdout
+    assert json.loads(output.splitlines()[-1]) == []
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,40 @@
+import pytest
+
+from patient_db import PatientDB
+from patient_validation import build_new_patient, parse_patient_filters
+
+
+def admit(patient_db, name, checkin):
+    patient = build_new_patient(
+        {"name": name, "gender": "Female", "age": 30, "ward": 1, "room": 11, "doctor_name": "Carlo"}
+    )
+    patient["checkin"] = checkin
+    patient_db.insert_patient(patient)
+
+
+@pytest.mark.parametrize(
+    "args,expected",
+    [
+        ({"checkin_to": "2024-05-01"}, "2024-05-01T23:59:59Z"),
+        ({"checkin_from": "2024-05-01"}, "2024-05-01T00:00:00Z"),
+        ({"checkin_to": "2024-05-01T12:00:00"}, "2024-05-01T12:00:00Z"),
+        ({"checkout_to": "2024-05-01T12:00:00+02:00"}, "2024-05-01T10:00:00Z"),
+    ],
+)
+def test_timestamp_bounds_are_normalized(args, expected):
+    filters, error = parse_patient_filters(args)
+    assert error is None
+    assert list(filters.values()) == [expected]
+
+
+def test_a_date_alone_covers_the_whole_day(storage):
+    patient_db = PatientDB(storage=storage)
+    admit(patient_db, "Ann Lee", "2024-04-30T23:59:59Z")
+    admit(patient_db, "Bob Ray", "2024-05-01T00:00:00Z")
+    admit(patient_db, "Eve Roe", "2024-05-01T23:59:59Z")
+    admit(patient_db, "Joe Poe", "2024-05-02T00:00:00Z")
+    filters, _ = parse_patient_filters({"checkin_from": "2024-05-01", "checkin_to": "2024-05-01"})
+
+    patients = patient_db.select_all_patients(filters)
+
+    assert sorted(patient["name"] for patient in patients) == ["Bob Ray", "Eve Roe"]
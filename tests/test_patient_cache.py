@@ -0,0 +1,30 @@
+from patient_cache import LRUTTLCache
+from patient_db import PatientDB
+from patient_validation import build_new_patient
+
+
+def test_read_racing_a_write_does_not_cache_the_old_row(storage):
+    db = PatientDB(cache=LRUTTLCache(100, 60), storage=storage)
+    patient = build_new_patient(
+        {"name": "Ann Lee", "gender": "Female", "age": 30, "ward": 1, "room": 11, "doctor_name": "Carlo"}
+    )
+    db.insert_patient(patient)
+
+    row_to_dict = db._row_to_dict
+    racing = [True]
+
+    def write_after_the_select(row):
+        # A concurrent update commits once the row was read, before the
+        # read fills the cache.
+        if racing:
+            racing.pop()
+            db.update_patient_returning(patient["id"], {"age": 50})
+        return row_to_dict(row)
+
+    db._row_to_dict = write_after_the_select
+    assert db.select_patient(patient["id"])["age"] == 30
+    db._row_to_dict = row_to_dict
+
+    assert db.cache.get(patient["id"]) is None
+    assert db.select_patient(patient["id"])["age"] == 50
+    assert db.cache.get(patient["id"])["age"] == 50
@@ -0,0 +1,139 @@
+import asyncio
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import pytest
+import requests
+
+from api_controller import create_app
+from patient import Patient
+from patient_client import AsyncPatientClient, PatientClient
+
+PATIENT = {"id": "p1", "name": "Ann Lee"}
+
+
+@pytest.fixture
+def flaky_server():
+    """
+    A local HTTP server answering 503 to the first `failures` requests, then
+    200 with PATIENT. It records the method of every request it received.
+    """
+    state = {"failures": 2, "methods": []}
+
+    class Handler(BaseHTTPRequestHandler):
+        def _answer(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            self.rfile.read(length)
+            state["methods"].append(self.command)
+            if len(state["methods"]) <= state["failures"]:
+                status, body = 503, {"message": "busy"}
+            else:
+                status, body = 200, PATIENT
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        do_GET = do_POST = _answer
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    state["url"] = f"http://127.0.0.1:{server.server_port}"
+    yield state
+    server.shutdown()
+    server.server_close()
+
+
+def test_get_is_retried_on_a_retry_status(flaky_server):
+    with PatientClient(flaky_server["url"], backoff_factor=0) as client:
+        assert client.get_patient("p1") == PATIENT
+    assert flaky_server["methods"] == ["GET", "GET", "GET"]
+
+
+def test_get_gives_up_once_the_retries_are_spent(flaky_server):
+    with PatientClient(flaky_server["url"], retries=1, backoff_factor=0) as client:
+        with pytest.raises(requests.HTTPError):
+            client.get_patient("p1")
+    assert flaky_server["methods"] == ["GET", "GET"]
+
+
+def test_post_is_not_retried_on_a_retry_status(flaky_server):
+    with PatientClient(flaky_server["url"], backoff_factor=0) as client:
+        with pytest.raises(requests.HTTPError):
+            client.create_patient({"name": "Ann Lee"})
+    assert flaky_server["methods"] == ["POST"]
+
+
+
+def test_commit_to_db_returns_the_response_of_the_api(app_config):
+    client = PatientClient.for_app(create_app(app_config))
+    patient = Patient("Ann Lee", 42, "Female")
+    response = patient.commit_to_db(client)
+    assert response.status_code == 201
+    assert response.json()["name"] == "Ann Lee"
+
+    patient.age = -1
+    response = patient.commit_to_db(client)
+    assert response.status_code == 400
+
+def flaky_transport(failures, methods):
+    """An httpx transport answering 503 to the first `failures` requests."""
+
+    def handler(request):
+        methods.append(request.method)
+        if len(methods) <= failures:
+            return httpx.Response(503, json={"message": "busy"})
+        return httpx.Response(200, json=PATIENT)
+
+    return httpx.MockTransport(handler)
+
+
+def test_async_get_is_retried_on_a_retry_status():
+    methods = []
+
+    async def get():
+        client = AsyncPatientClient("http://api", backoff_factor=0, transport=flaky_transport(2, methods))
+        async with client:
+            return await client.get_patient("p1")
+
+    assert asyncio.run(get()) == PATIENT
+    assert methods == ["GET", "GET", "GET"]
+
+
+def test_async_post_is_not_retried_on_a_retry_status():
+    methods = []
+
+    async def create():
+        client = AsyncPatientClient("http://api", backoff_factor=0, transport=flaky_transport(2, methods))
+        async with client:
+            await client.create_patient({"name": "Ann Lee"})
+
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(create())
+    assert methods == ["POST"]
+
+
+def test_async_connection_errors_are_retried_for_post():
+    methods = []
+
+    def handler(request):
+        methods.append(request.method)
+        if len(methods) == 1:
+            raise httpx.ConnectError("refused", request=request)
+        return httpx.Response(201, json=PATIENT)
+
+    async def create():
+        client = AsyncPatientClient("http://api", backoff_factor=0, transport=httpx.MockTransport(handler))
+        async with client:
+            return await client.create_patient({"name": "Ann Lee"})
+
+    assert asyncio.run(create()) == PATIENT
+    assert methods == ["POST", "POST"]
@@ -0,0 +1,53 @@
+import pytest
+
+from patient_schema import NEW_PATIENT_SCHEMA, PATIENT_UPDATE_SCHEMA, ROOM_ASSIGNMENT_SCHEMA
+from api_controller import create_app
+from patient import Patient
+from patient_validation import parse_ward_transfer
+
+NEW_PATIENT = {"name": "Ann Lee", "gender": "Female", "age": 30, "ward": 1, "room": 11, "doctor_name": "Carlo"}
+
+
+def test_new_patient_is_valid():
+    assert NEW_PATIENT_SCHEMA.validate(NEW_PATIENT) == []
+
+
+@pytest.mark.parametrize("age", [True, False, 30.0, "30", 0])
+def test_age_must_be_a_positive_integer(age):
+    assert NEW_PATIENT_SCHEMA.validate(dict(NEW_PATIENT, age=age)) == ["Age must be a positive integer"]
+    assert PATIENT_UPDATE_SCHEMA.validate({"age": age}) == ["Age must be a positive integer"]
+
+
+@pytest.mark.parametrize("ward,room", [(1, "11"), ("1", 11), (True, 11), (1, 11.0)])
+def test_ward_and_room_must_be_integers(ward, room):
+    # A string room would be stored, and returned, as a string.
+    expected = ["Ward and room must be integers"]
+    assert NEW_PATIENT_SCHEMA.validate(dict(NEW_PATIENT, ward=ward, room=room)) == expected
+    assert PATIENT_UPDATE_SCHEMA.validate({"ward": ward, "room": room}) == expected
+    assert ROOM_ASSIGNMENT_SCHEMA.validate({"ward": ward, "room": room}) == expected
+
+
+def test_transfer_maps_the_room_keys_to_integers():
+    # JSON object keys are strings: only the destination rooms must be integers.
+    params, errors = parse_ward_transfer(1, {"ward": 2, "rooms": {"11": 21, "12": 22}})
+    assert errors == []
+    assert params["rooms"] == {11: 21, 12: 22}
+    _, errors = parse_ward_transfer(True, {"ward": 2, "rooms": {"11": 21}})
+    assert errors == ["Invalid room mapping: 11 -> 21"]
+
+
+@pytest.mark.parametrize(
+    "body", [{"ward": 2, "room": "21"}, {"ward": 2, "room": True}, {"ward": 2, "rooms": {"11": "21"}}]
+)
+def test_transfer_rooms_must_be_integers(app_config, body):
+    client = create_app(app_config).test_client()
+
+    response = client.post("/wards/1/transfer", json=body)
+
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize("age", [True, False, 30.0, "30", 0])
+def test_patient_age_must_be_a_positive_integer(age):
+    with pytest.raises(ValueError):
+        Patient("Ann Lee", age, "Female")
@@ -0,0 +1,92 @@
+# Checks that every GET /patients filter is served by an index search, for
+# the whole listing and for its keyset pages, with and without the archived
+# patients, by asking SQLite for the plan of the queries PatientDB builds.
+
+import pytest
+
+from patient_db import PatientDB
+
+FROM = "2024-01-01T00:00:00Z"
+TO = "2025-01-01T00:00:00Z"
+
+FILTERS = {
+    "ward": {"ward": 1},
+    "room": {"room": 11},
+    "ward_room": {"ward": 1, "room": 11},
+    "doctor_name": {"doctor_name": "Carlo"},
+    "doctor_name_active": {"doctor_name": "Carlo", "active": True},
+    "gender": {"gender": "Male"},
+    "active": {"active": True},
+    "checked_out": {"active": False},
+    "min_age": {"min_age": 30},
+    "max_age": {"max_age": 30},
+    "age_range": {"min_age": 30, "max_age": 40},
+    "checkin_from": {"checkin_from": FROM},
+    "checkin_to": {"checkin_to": TO},
+    "checkin_range": {"checkin_from": FROM, "checkin_to": TO},
+    "checkout_from": {"checkout_from": FROM},
+    "checkout_range": {"checkout_from": FROM, "checkout_to": TO},
+}
+# The filters whose index ends with id, so that their pages need no sort.
+ORDERED_BY_INDEX = ["room", "ward_room", "doctor_name_active"]
+
+STATEMENTS = {
+    "listing": lambda filters: PatientDB._filtered_statement(filters),
+    "page": lambda filters: PatientDB._page_statement(50, None, filters),
+    "next_page": lambda filters: PatientDB._page_statement(50, "8f0c", filters),
+}
+
+
+def query_plan(storage, stmt):
+    """Returns the detail lines of the SQLite query plan of a statement."""
+    sql = stmt.compile(storage.engine, compile_kwargs={"literal_binds": True})
+    with storage.engine.connect() as conn:
+        return [row[-1] for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}")]
+
+
+@pytest.mark.parametrize("statement", STATEMENTS)
+@pytest.mark.parametrize("name", FILTERS)
+def test_filter_searches_an_index(storage, name, statement):
+    plan = query_plan(storage, STATEMENTS[statement](FILTERS[name]))
+    assert plan[0].startswith("SEARCH patients USING INDEX ix_patients_"), plan
+    assert all(not line.startswith("SCAN") for line in plan), plan
+
+
+@pytest.mark.parametrize("statement", STATEMENTS)
+@pytest.mark.parametrize("name", FILTERS)
+def test_archived_listing_searches_an_index_of_both_tables(storage, name, statement):
+    plan = query_plan(storage, STATEMENTS[statement](dict(FILTERS[name], include_archived=True)))
+    for table_name in ("patients", "patients_archive"):
+        assert any(line.startswith(f"SEARCH {table_name} USING INDEX ix_{table_name}_") for line in plan), plan
+    # all_patients, the union of both searches, may still be sorted for a page.
+    assert all(not line.startswith("SCAN patients") for line in plan), plan
+
+
+@pytest.mark.parametrize("statement", ["page", "next_page"])
+@pytest.mark.parametrize("name", ORDERED_BY_INDEX)
+def test_page_is_read_in_index_order(storage, name, statement):
+    plan = query_plan(storage, STATEMENTS[statement](FILTERS[name]))
+    assert "USE TEMP B-TREE FOR ORDER BY" not in plan, plan
+
+
+def test_pages_of_a_range_filter_are_ordered_by_id(storage):
+    db = PatientDB(storage=storage)
+    for age in (35, 31, 38, 33):
+        db.insert_patient(
+            {
+                "id": f"id-{age}",
+                "name": "Ann Lee",
+                "gender": "Female",
+                "age": age,
+                "checkin": FROM,
+                "checkout": None,
+                "ward": 1,
+                "room": 11,
+                "doctor_name": "Carlo",
+            }
+        )
+    first = db.select_patients_page(2, None, {"min_age": 30})
+    second = db.select_patients_page(2, first["next_cursor"], {"min_age": 30})
+    ids = [patient["id"] for patient in first["patients"] + second["patients"]]
+    assert ids == ["id-31", "id-33", "id-35", "id-38"]
+    assert second["next_cursor"] is None
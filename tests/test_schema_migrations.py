@@ -0,0 +1,49 @@
+from config import INITIAL_ROW_VERSION
+from patient_db import PatientDB
+from patient_db_config import PATIENTS_TABLE_NAME, migrate_legacy_timestamps
+
+LEGACY_ROW = (
+    f"INSERT INTO {PATIENTS_TABLE_NAME} (id, name, age, gender, checkin, ward, room, doctor_name) "
+    "VALUES (?, 'Ann Lee', 30, 'Female', '17-10-2024 08:30:00', 1, 11, 'Carlo')"
+)
+
+
+def checkins(engine):
+    with engine.connect() as conn:
+        return dict(conn.exec_driver_sql(f"SELECT id, checkin FROM {PATIENTS_TABLE_NAME}").all())
+
+
+def test_legacy_timestamps_are_migrated_once(storage):
+    engine = storage.engine
+    with engine.begin() as conn:
+        # A database of a version predating the migration.
+        conn.exec_driver_sql("PRAGMA user_version = 0")
+        conn.exec_driver_sql(LEGACY_ROW, ("old",))
+
+    assert migrate_legacy_timestamps(engine) == 1
+    assert checkins(engine) == {"old": "2024-10-17T08:30:00Z"}
+
+    with engine.begin() as conn:
+        conn.exec_driver_sql(LEGACY_ROW, ("new",))
+    assert migrate_legacy_timestamps(engine) == 0
+    assert checkins(engine)["new"] == "17-10-2024 08:30:00"
+
+
+def test_migrated_rows_are_versioned_and_logged(storage):
+    engine = storage.engine
+    patient_db = PatientDB(storage=storage)
+    table_version = patient_db.table_version()
+    assert patient_db.sync_changes() == 0  # follows the log from here on
+    with engine.begin() as conn:
+        conn.exec_driver_sql("PRAGMA user_version = 0")
+        conn.exec_driver_sql(LEGACY_ROW, ("old",))
+
+    assert migrate_legacy_timestamps(engine) == 1
+
+    assert patient_db.select_patient("old")["version"] == INITIAL_ROW_VERSION + 1
+    changes = patient_db.select_changes()
+    assert [(change["patient_id"], change["operation"]) for change in changes] == [("old", "update")]
+    assert changes[0]["patient"]["checkin"] == "2024-10-17T08:30:00Z"
+    # A follower replays the rewrite, and sees the new table version.
+    assert patient_db.sync_changes() == 1
+    assert patient_db.table_version() == table_version + 1
@@ -0,0 +1,91 @@
+import pytest
+from sqlalchemy import text
+
+from api_controller import PatientAPIController
+
+# A checkout cutoff after every checkout of the tests.
+FAR_FUTURE = "9999-12-31T00:00:00Z"
+
+
+@pytest.fixture
+def controller(app_config):
+    return PatientAPIController(app_config)
+
+
+def admit(client, name, ward=1, room=11, doctor_name="Carlo"):
+    response = client.post(
+        "/patients",
+        json={"name": name, "gender": "Female", "age": 30, "ward": ward, "room": room, "doctor_name": doctor_name},
+    )
+    assert response.status_code == 201
+    return response.get_json()
+
+
+def ward_stats(client):
+    wards = client.get("/wards/stats").get_json()["wards"]
+    return {ward["ward"]: (ward["active_patients"], ward["checked_out_patients"]) for ward in wards}
+
+
+def doctor_stats(client):
+    doctors = client.get("/doctors/stats").get_json()["doctors"]
+    return {doctor["doctor_name"]: (doctor["active_patients"], doctor["checked_out_patients"]) for doctor in doctors}
+
+
+def test_stats_list_every_ward_and_doctor(controller):
+    client = controller.app.test_client()
+
+    assert ward_stats(client) == {1: (0, 0), 2: (0, 0), 3: (0, 0), 4: (0, 0)}
+    assert set(doctor_stats(client).values()) == {(0, 0)}
+
+
+def test_counters_follow_the_writes(controller):
+    client = controller.app.test_client()
+    ann, bob = admit(client, "Ann Lee"), admit(client, "Bob Ray", room=12)
+    eve = admit(client, "Eve Roe", ward=2, room=21, doctor_name="Lollo")
+
+    client.put(f"/patients/{ann['id']}/checkout")
+    client.put(f"/patients/{bob['id']}/doctor", json={"doctor_name": "Lollo"})
+    client.put(f"/patients/{eve['id']}/room", json={"ward": 3, "room": 31})
+
+    assert ward_stats(client) == {1: (1, 1), 2: (0, 0), 3: (1, 0), 4: (0, 0)}
+    assert (doctor_stats(client)["Carlo"], doctor_stats(client)["Lollo"]) == ((0, 1), (2, 0))
+
+    client.delete(f"/patients/{bob['id']}")
+
+    assert ward_stats(client)[1] == (0, 1)
+    assert controller.patient_db.check_stats() == []
+
+
+def test_counters_match_after_a_transfer_and_an_archive(controller):
+    client = controller.app.test_client()
+    ann, bob = admit(client, "Ann Lee"), admit(client, "Bob Ray", room=12)
+    admit(client, "Eve Roe", room=13)
+    client.put(f"/patients/{ann['id']}/checkout")
+    client.post("/patients/batch/checkout", json={"ids": [bob["id"]]})
+
+    assert client.post("/wards/1/transfer", json={"ward": 2, "room": 21}).status_code == 200
+    assert ward_stats(client)[1] == (0, 2)
+    assert ward_stats(client)[2] == (1, 0)
+
+    assert controller.patient_db.archive_patients(FAR_FUTURE, batch_size=10) == 2
+
+    assert ward_stats(client)[1] == (0, 0)
+    assert doctor_stats(client)["Carlo"] == (1, 0)
+    assert controller.patient_db.check_stats() == []
+
+
+def test_check_stats_reports_and_rebuild_fixes_a_wrong_counter(controller):
+    client = controller.app.test_client()
+    admit(client, "Ann Lee")
+    with controller.patient_db.storage.engine.begin() as conn:
+        conn.execute(text("UPDATE ward_stats SET active_patients = 5 WHERE ward = 1"))
+
+    mismatches = controller.patient_db.check_stats()
+
+    assert [(m["table"], m["key"], m["stored"], m["counted"]) for m in mismatches] == [
+        ("ward_stats", 1, {"active_patients": 5, "checked_out_patients": 0},
+         {"active_patients": 1, "checked_out_patients": 0}),
+    ]
+    controller.patient_db.rebuild_stats()
+    assert controller.patient_db.check_stats() == []
+    assert ward_stats(client)[1] == (1, 0)
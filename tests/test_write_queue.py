@@ -0,0 +1,151 @@
+import threading
+
+import pytest
+from sqlalchemy import Column, Integer, MetaData, String, Table, create_engine, insert, select
+from sqlalchemy.exc import IntegrityError
+
+from patient_db import PatientDB
+from patient_db_config import Storage
+from write_queue import GroupCommitQueue
+
+METADATA = MetaData()
+ITEMS = Table("items", METADATA, Column("id", Integer, primary_key=True), Column("name", String))
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'queue.db'}")
+    METADATA.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+def submit_together(queue, applies):
+    """Submits the writes from one thread each; returns their results or errors."""
+    outcomes = [None] * len(applies)
+
+    def submit(index):
+        try:
+            outcomes[index] = queue.submit(applies[index])
+        except Exception as e:
+            outcomes[index] = e
+
+    threads = [threading.Thread(target=submit, args=(index,)) for index in range(len(applies))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+    return outcomes
+
+
+def insert_item(item_id, name):
+    def apply(conn):
+        conn.execute(insert(ITEMS).values(id=item_id, name=name))
+        return item_id
+
+    return apply
+
+
+def test_a_single_write_is_committed(engine):
+    queue = GroupCommitQueue(engine.begin, max_batch=8, window=0)
+
+    assert queue.submit(insert_item(1, "a")) == 1
+
+    with engine.connect() as conn:
+        assert conn.execute(select(ITEMS.c.name)).scalars().all() == ["a"]
+
+
+def test_a_failed_write_only_rolls_back_its_savepoint(engine):
+    # The leader waits for the whole batch, so the three writes share one commit.
+    queue = GroupCommitQueue(engine.begin, max_batch=3, window=5)
+
+    outcomes = submit_together(
+        queue, [insert_item(1, "a"), insert_item(1, "duplicate"), insert_item(2, "b")]
+    )
+
+    assert sum(isinstance(outcome, IntegrityError) for outcome in outcomes) == 1
+    assert sorted(outcome for outcome in outcomes if isinstance(outcome, int)) == [1, 2]
+    with engine.connect() as conn:
+        assert len(conn.execute(select(ITEMS)).all()) == 2
+
+
+def test_a_failed_commit_fails_every_write_of_the_batch(engine):
+    def failing_begin():
+        raise RuntimeError("no connection")
+
+    queue = GroupCommitQueue(failing_begin, max_batch=2, window=5)
+
+    outcomes = submit_together(queue, [insert_item(1, "a"), insert_item(2, "b")])
+
+    assert [str(outcome) for outcome in outcomes] == ["no connection", "no connection"]
+
+
+def test_the_lead_passes_on_to_the_writes_queued_after_a_batch(engine):
+    queue = GroupCommitQueue(engine.begin, max_batch=2, window=0.05)
+
+    outcomes = submit_together(queue, [insert_item(index, str(index)) for index in range(7)])
+
+    assert sorted(outcomes) == list(range(7))
+
+
+class Interrupt(BaseException):
+    """Stands for a KeyboardInterrupt or a worker timeout raised in a write."""
+
+
+def test_an_interrupted_flush_fails_its_batch_and_releases_the_lead(engine):
+    queue = GroupCommitQueue(engine.begin, max_batch=2, window=0.5)
+    outcomes = {}
+
+    def interrupted(conn):
+        raise Interrupt()
+
+    def submit(name, apply):
+        try:
+            outcomes[name] = queue.submit(apply)
+        except BaseException as e:
+            outcomes[name] = e
+
+    threads = [
+        threading.Thread(target=submit, args=("interrupted", interrupted), daemon=True),
+        threading.Thread(target=submit, args=("insert", insert_item(1, "a")), daemon=True),
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+
+    # The leader's thread gets the interruption, the other writer an error.
+    assert sorted(type(outcome).__name__ for outcome in outcomes.values()) == ["Interrupt", "RuntimeError"]
+    later = threading.Thread(target=submit, args=("later", insert_item(2, "b")), daemon=True)
+    later.start()
+    later.join(10)
+    assert outcomes.get("later") == 2
+    with engine.connect() as conn:
+        assert conn.execute(select(ITEMS.c.id)).scalars().all() == [2]
+
+
+def test_patient_db_inserts_through_the_queue(tmp_path):
+    storage = Storage(f"sqlite:///{tmp_path / 'patient.db'}")
+    patient_db = PatientDB(
+        storage=storage, write_queue=GroupCommitQueue(lambda: storage.engine.begin(), 3, 5)
+    )
+    patients = [
+        {"id": patient_id, "name": "Ann Lee", "gender": "Female", "age": 30, "ward": 1, "room": 11,
+         "doctor_name": "Carlo", "checkin": "2024-05-01T08:00:00Z", "checkout": None}
+        for patient_id in ("p1", "p1", "p2")
+    ]
+    outcomes = [None] * 3
+
+    def insert(index):
+        outcomes[index] = patient_db.insert_patient(dict(patients[index]))
+
+    threads = [threading.Thread(target=insert, args=(index,)) for index in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+
+    assert sorted(outcomes, key=str) == [None, "p1", "p2"]
+    assert sorted(patient["id"] for patient in patient_db.select_all_patients()) == ["p1", "p2"]
+    assert patient_db.check_stats() == []
+    storage.dispose()